@@ -0,0 +1,706 @@
+import ast
+import contextlib
+import gc
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import uuid
+from decimal import Decimal
+from typing import Annotated, Any, Dict, List
+
+import duckdb
+import typer
+from boto3.dynamodb.types import TypeSerializer
+
+import dynamo_utils
+from dynamo_utils import ITEM_DECODERS
+
+BENCH_DIR = "data/bench"
+
+# The table with the index a recent window extract queries
+RECENT_TASKS_TABLE = "GforceTasks-notow4pikzczbpjg42gytvbuci-production"
+
+# Items per table for each task, roughly what production looks like
+TABLE_SHARES = {
+    "GforceTasks-notow4pikzczbpjg42gytvbuci-production": 1.0,
+    "GforceStore-notow4pikzczbpjg42gytvbuci-production": 0.1,
+    "GforceCallCycle-notow4pikzczbpjg42gytvbuci-production": 0.02,
+}
+
+# Distinct synthetic items per table, the stand-in cycles through them
+TEMPLATE_ITEMS = 1000
+SYNTHETIC_LIST_LENGTH = 2
+# Top level keys the stand-in makes unique for every item it serves
+UNIQUE_KEYS = ["id", "task_id", "call_id", "store_id"]
+
+# Strings the transforms parse
+TIMESTAMP_FIELDS = {"updatedAt", "createdAt", "created_date", "startDate", "endDate", "week_startDate"}
+
+# The big tables whose copy throughput the load benchmark reports
+LOAD_REPORT_TABLES = ["tasks", "task_rep_images", "task_questions"]
+
+app = typer.Typer()
+
+
+@app.callback()
+def main():
+    """Benchmarks for the extract, transform and load stages."""
+
+
+def load_scan_fixture(fixture: str) -> list:
+    """Load a recorded scan response, e.g. the output of `just aws_extract`.
+
+    The items are kept in DynamoDB-JSON (`{"S": ...}`, `{"N": ...}`), exactly
+    as the low-level client returns them.
+    """
+    with open(fixture) as f:
+        return json.load(f)["Items"]
+
+
+def encode_items(items: list) -> int:
+    """Encode items the way `save_table_data_batch` writes ndjson, returning the byte count."""
+
+    def decimal_default(obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        raise TypeError
+
+    return sum(len(json.dumps(item, default=decimal_default, separators=(",", ":"))) for item in items)
+
+
+# The pydantic models datamodel-codegen generated for each table (see the
+# schema-* recipes in the justfile, which have the store and call cycle
+# inputs swapped, hence the crossed file names)
+MODEL_FILES = {
+    "GforceTasks-notow4pikzczbpjg42gytvbuci-production": "models/tasks.py",
+    "GforceStore-notow4pikzczbpjg42gytvbuci-production": "models/call_cycles.py",
+    "GforceCallCycle-notow4pikzczbpjg42gytvbuci-production": "models/stores.py",
+}
+
+
+def read_model_classes(model_path: str) -> Dict[str, List[tuple]]:
+    """Read the classes of a generated models/*.py file without importing pydantic.
+
+    Returns `{class name: [(field name, annotation, required), ...]}`, where
+    the field name is the DynamoDB attribute (the `Field` alias if there is
+    one) and the annotation is left as an `ast` expression.
+    """
+    with open(model_path) as f:
+        tree = ast.parse(f.read(), model_path)
+
+    classes = {}
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        fields = []
+        for statement in node.body:
+            if not isinstance(statement, ast.AnnAssign) or not isinstance(statement.target, ast.Name):
+                continue
+            name = statement.target.id
+            default = statement.value
+            required = default is None
+            if isinstance(default, ast.Call) and getattr(default.func, "id", None) == "Field":
+                required = bool(default.args) and isinstance(default.args[0], ast.Constant) and default.args[0].value is Ellipsis
+                for keyword in default.keywords:
+                    if keyword.arg == "alias":
+                        name = keyword.value.value
+            fields.append((name, statement.annotation, required))
+        classes[node.name] = fields
+    return classes
+
+
+def synthetic_string(name: str, n: int) -> str:
+    if name == "id":
+        return str(uuid.UUID(int=n))
+    if name.endswith("ISO8601"):
+        return f"2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}"
+    if name in TIMESTAMP_FIELDS:
+        return f"2025-{n % 12 + 1:02d}-{n % 28 + 1:02d}T{n % 24:02d}:00:00.000Z"
+    if name == "key":
+        return f"public/{n}_{1_700_000_000_000 + n}.jpg"
+    if name.endswith("username"):
+        # A small pool of reps, like the real tables
+        return f"{name}_{n % 50}"
+    return f"{name}_{n}"
+
+
+def synthetic_value(annotation: ast.expr, name: str, classes: Dict[str, List[tuple]], n: int) -> Any:
+    """Make up a value for a field annotated `annotation` in the generated models."""
+    if isinstance(annotation, ast.Subscript):
+        container = annotation.value.id
+        if container == "Optional":
+            return synthetic_value(annotation.slice, name, classes, n)
+        if container == "Union":
+            return synthetic_value(annotation.slice.elts[0], name, classes, n)
+        if container == "List":
+            return [
+                synthetic_value(annotation.slice, name, classes, n * SYNTHETIC_LIST_LENGTH + i)
+                for i in range(SYNTHETIC_LIST_LENGTH)
+            ]
+        raise ValueError(f"Unsupported annotation {ast.unparse(annotation)}")
+
+    type_name = annotation.id
+    if type_name in classes:
+        return synthetic_item(classes, type_name, n)
+    if type_name == "str":
+        return synthetic_string(name, n)
+    if type_name == "float":
+        return 1 if name == "_version" else 1_700_000_000_000 + n
+    if type_name == "bool":
+        return n % 2 == 0
+    if type_name == "List":
+        return []
+    raise ValueError(f"Unsupported annotation {type_name}")
+
+
+def synthetic_item(classes: Dict[str, List[tuple]], class_name: str = "ModelItem", n: int = 0) -> Dict[str, Any]:
+    """Make up the `n`th item matching a class of the generated models, optional fields included."""
+    return {name: synthetic_value(annotation, name, classes, n) for name, annotation, _ in classes[class_name]}
+
+
+class LocalDynamoDB:
+    """In process stand-in for the parts of the DynamoDB client the extract uses.
+
+    Serves `item_counts[table]` synthetic items per table, generated from the
+    models/*.py files, paged like DynamoDB (1 MB pages) and split by scan
+    segment. `page_latency` seconds are slept per page to mimic the network.
+    The only filter expression understood is the incremental extract's
+    `_lastChangedAt >= :since`. `update` changes items as a client would.
+
+    The tasks table has the `RECENT_TASKS_INDEX` a recent window extract
+    queries, projecting `index_projection`.
+    """
+
+    def __init__(self, item_counts: Dict[str, int], page_latency: float = 0.0, index_projection: str = "ALL"):
+        self.item_counts = item_counts
+        self.page_latency = page_latency
+        self.index_projection = index_projection
+        self.templates = {}
+        self.item_bytes = {}
+        self.updates = {table_name: {} for table_name in item_counts}
+        serializer = TypeSerializer()
+        for table_name, count in item_counts.items():
+            classes = read_model_classes(MODEL_FILES[table_name])
+            items = [
+                {key: serializer.serialize(to_dynamo_types(value)) for key, value in synthetic_item(classes, n=n).items()}
+                for n in range(min(count, TEMPLATE_ITEMS))
+            ]
+            self.templates[table_name] = items
+            self.item_bytes[table_name] = sum(len(json.dumps(item)) for item in items) // max(len(items), 1)
+
+    def describe_table(self, TableName: str) -> Dict[str, Any]:
+        table = {
+            "TableName": TableName,
+            "ItemCount": self.item_counts[TableName],
+            "TableSizeBytes": self.item_counts[TableName] * self.item_bytes[TableName],
+            "ProvisionedThroughput": {"ReadCapacityUnits": 0},
+            "LatestStreamArn": f"arn:local:{TableName}/stream",
+            "StreamSpecification": {"StreamEnabled": True, "StreamViewType": "NEW_AND_OLD_IMAGES"},
+        }
+        if TableName == RECENT_TASKS_TABLE:
+            table["GlobalSecondaryIndexes"] = [{
+                "IndexName": dynamo_utils.RECENT_TASKS_INDEX,
+                "KeySchema": [
+                    {"AttributeName": "senior_rep_username", "KeyType": "HASH"},
+                    {"AttributeName": "taskDateISO8601", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": self.index_projection},
+            }]
+        return {"Table": table}
+
+    def item(self, table_name: str, position: int) -> Dict[str, Any]:
+        """The item at `position`, in DynamoDB-JSON."""
+        templates = self.templates[table_name]
+        item = dict(templates[position % len(templates)])
+        for key in UNIQUE_KEYS:
+            if key in item:
+                item[key] = {"S": synthetic_string(key, position)}
+        item.update(self.updates[table_name].get(position, {}))
+        return item
+
+    def update(self, table_name: str, position: int, attributes: Dict[str, Any]):
+        """Change the item at `position` (DynamoDB-JSON `attributes`), stamping `_lastChangedAt` with now."""
+        self.updates[table_name].setdefault(position, {}).update(
+            attributes, **{dynamo_utils.WATERMARK_FIELD: {"N": str(int(time.time() * 1000))}},
+        )
+
+    def scan(self, TableName: str, Segment: int = 0, TotalSegments: int = 1, ExclusiveStartKey=None, **kwargs):
+        if self.page_latency:
+            time.sleep(self.page_latency)
+
+        templates = self.templates[TableName]
+        page_size = max(1024 * 1024 // self.item_bytes[TableName], 1)
+        # Item positions Segment, Segment + TotalSegments, ... belong to this segment
+        position = int(ExclusiveStartKey["position"]["N"]) + TotalSegments if ExclusiveStartKey else Segment
+        positions = range(position, self.item_counts[TableName], TotalSegments)[:page_size]
+
+        items = [self.item(TableName, position) for position in positions]
+        scanned = len(items)
+        if "FilterExpression" in kwargs:
+            since = float(kwargs["ExpressionAttributeValues"][":since"]["N"])
+            items = [item for item in items if float(item[dynamo_utils.WATERMARK_FIELD]["N"]) >= since]
+
+        response = {
+            "Items": items,
+            "Count": len(items),
+            "ScannedCount": scanned,
+            "ConsumedCapacity": {"TableName": TableName, "CapacityUnits": scanned * self.item_bytes[TableName] / 8192},
+        }
+        if positions and positions[-1] + TotalSegments < self.item_counts[TableName]:
+            response["LastEvaluatedKey"] = {"position": {"N": str(positions[-1])}}
+        return response
+
+    def query(
+        self, TableName: str, IndexName: str, ExpressionAttributeValues: Dict[str, Any], ExclusiveStartKey=None,
+        **kwargs,
+    ):
+        """The tasks of one senior rep dated `:since` or later, off the recent tasks index.
+
+        Only the `KeyConditionExpression` `query_rep_tasks` sends is
+        understood. Items come out in position order rather than by date.
+        """
+        if self.page_latency:
+            time.sleep(self.page_latency)
+        if TableName != RECENT_TASKS_TABLE or IndexName != dynamo_utils.RECENT_TASKS_INDEX:
+            raise ValueError(f"{TableName} has no index {IndexName}")
+
+        username = ExpressionAttributeValues[":username"]["S"]
+        since = ExpressionAttributeValues[":since"]["S"]
+        templates = self.templates[TableName]
+        matching = [
+            n for n, template in enumerate(templates)
+            if template["senior_rep_username"]["S"] == username and template["taskDateISO8601"]["S"] >= since
+        ]
+        positions = [
+            position for start in range(0, self.item_counts[TableName], len(templates)) for n in matching
+            if (position := start + n) < self.item_counts[TableName]
+        ]
+        page_size = max(1024 * 1024 // self.item_bytes[TableName], 1)
+        first = int(ExclusiveStartKey["position"]["N"]) + 1 if ExclusiveStartKey else 0
+        page = positions[first:first + page_size]
+
+        items = [self.item(TableName, position) for position in page]
+        if self.index_projection != "ALL":
+            keys = ["id", "senior_rep_username", "taskDateISO8601"]
+            items = [{key: item[key] for key in keys} for item in items]
+        response = {
+            "Items": items,
+            "Count": len(items),
+            "ConsumedCapacity": {"TableName": TableName, "CapacityUnits": len(items) * self.item_bytes[TableName] / 8192},
+        }
+        if first + page_size < len(positions):
+            response["LastEvaluatedKey"] = {"position": {"N": str(first + len(page) - 1)}}
+        return response
+
+
+class LocalDynamoDBStreams:
+    """In process stand-in for the parts of the DynamoDB Streams client `StreamConsumer` uses.
+
+    Each table's `records` are split over two shards, a closed parent and
+    its open child, so the consumer has to finish one before the other.
+    """
+
+    def __init__(self, records: Dict[str, List[Dict[str, Any]]]):
+        self.shards = {}
+        for table_name, table_records in records.items():
+            half = len(table_records) // 2
+            self.shards[f"arn:local:{table_name}/stream"] = {
+                "shard-0000": (None, table_records[:half], True),
+                "shard-0001": ("shard-0000", table_records[half:], False),
+            }
+
+    def describe_stream(self, StreamArn: str, **kwargs) -> Dict[str, Any]:
+        shards = [
+            {"ShardId": shard_id, **({"ParentShardId": parent} if parent else {})}
+            for shard_id, (parent, _, _) in self.shards[StreamArn].items()
+        ]
+        return {"StreamDescription": {"StreamArn": StreamArn, "Shards": shards}}
+
+    def get_shard_iterator(self, StreamArn: str, ShardId: str, ShardIteratorType: str, SequenceNumber=None):
+        records = self.shards[StreamArn][ShardId][1]
+        position = 0
+        if ShardIteratorType == "AFTER_SEQUENCE_NUMBER":
+            position = next(
+                index + 1 for index, record in enumerate(records)
+                if record["dynamodb"]["SequenceNumber"] == SequenceNumber
+            )
+        return {"ShardIterator": json.dumps([StreamArn, ShardId, position])}
+
+    def get_records(self, ShardIterator: str, Limit: int = 1000) -> Dict[str, Any]:
+        stream_arn, shard_id, position = json.loads(ShardIterator)
+        _, records, closed = self.shards[stream_arn][shard_id]
+        page = records[position:position + Limit]
+        position += len(page)
+        response = {"Records": page}
+        if position < len(records) or not closed:
+            response["NextShardIterator"] = json.dumps([stream_arn, shard_id, position])
+        return response
+
+
+def synthetic_stream_records(stand_in: LocalDynamoDB, events: int) -> Dict[str, List[Dict[str, Any]]]:
+    """Stream records for `events` changes spread over the tables like the items are.
+
+    Mostly MODIFYs of existing items, with a tenth each of INSERTs of new items
+    and REMOVEs.
+    """
+    records = {}
+    sequence = itertools.count(1)
+    total = sum(stand_in.item_counts.values())
+    for table_name, count in stand_in.item_counts.items():
+        table_records = records[table_name] = []
+        for n in range(max(events * count // total, 1)):
+            event_name = "INSERT" if n % 10 == 1 else "REMOVE" if n % 10 == 2 else "MODIFY"
+            position = count + n if event_name == "INSERT" else n * 7 % count
+            item = stand_in.item(table_name, position)
+            item["updatedAt"] = {"S": f"2026-01-01T00:00:{n % 60:02d}.000Z"}
+            change = {"Keys": {"id": item["id"]}, "SequenceNumber": f"{next(sequence):021d}"}
+            if event_name == "REMOVE":
+                change["OldImage"] = item
+            else:
+                change["NewImage"] = item
+            table_records.append({"eventName": event_name, "dynamodb": change})
+    return records
+
+
+def to_dynamo_types(value: Any) -> Any:
+    """Floats become `Decimal` and empty strings are dropped, as the TypeSerializer wants."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: to_dynamo_types(field) for key, field in value.items()}
+    if isinstance(value, list):
+        return [to_dynamo_types(element) for element in value]
+    return value
+
+
+@app.command()
+def pipeline(
+    rows: Annotated[List[int], typer.Option("--rows", help="Task items per run, repeat for several sizes")] = [10_000, 100_000, 1_000_000],
+    max_workers: int = 8,
+    raw_format: str = "ndjson",
+    page_latency: Annotated[float, typer.Option(help="Seconds slept per scan page")] = 0.0,
+    load: Annotated[bool, typer.Option("--load", help="Also time the load (REPLACES the tables in the configured Postgres)")] = False,
+    load_workers: Annotated[int, typer.Option(help="Tables copied to Postgres at once")] = dynamo_utils.LOAD_WORKERS,
+    in_memory: Annotated[
+        bool, typer.Option("--in-memory", help="Scan straight into the transform's DuckDB as Arrow, no raw files")
+    ] = False,
+    work_dir: str = BENCH_DIR,
+    verbose: bool = False,
+):
+    """Time the extract, transform and load stages on synthetic data served by `LocalDynamoDB`.
+
+    With --in-memory the extract and transform are a single stage.
+    """
+    results = []
+    for row_count in rows:
+        item_counts = {table_name: max(int(row_count * share), 1) for table_name, share in TABLE_SHARES.items()}
+        run_dir = os.path.join(work_dir, str(row_count))
+        raw_dir = os.path.join(run_dir, "raw")
+        duckdb_path = os.path.join(run_dir, "all.duckdb")
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+        stand_in = LocalDynamoDB(item_counts, page_latency=page_latency)
+        dynamo_utils.dynamodb_client = lambda: stand_in
+
+        result = {"rows": row_count, "items": sum(item_counts.values())}
+        print(f"{row_count:,} tasks ({result['items']:,} items across {len(item_counts)} tables)")
+        quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+        with quiet:
+            if in_memory:
+                start = time.perf_counter()
+                dynamo_utils.run_sql_transforms(
+                    output_dir=None, duckdb_path=duckdb_path, changes_dir=os.path.join(run_dir, "changes"),
+                    profile_dir=os.path.join(run_dir, "profiles"),
+                    load_raw=lambda conn, profiler: dynamo_utils.extract_to_duckdb(
+                        conn, list(item_counts), raw_dir, profiler=profiler, max_workers=max_workers,
+                    ),
+                )
+                result["extract+transform"] = time.perf_counter() - start
+            else:
+                start = time.perf_counter()
+                dynamo_utils.dump_tables_data(
+                    list(item_counts), max_workers=max_workers, output_dir=raw_dir, raw_format=raw_format,
+                )
+                result["extract"] = time.perf_counter() - start
+
+                start = time.perf_counter()
+                dynamo_utils.run_sql_transforms(
+                    raw_data_dir=raw_dir, output_dir=None, duckdb_path=duckdb_path,
+                    changes_dir=os.path.join(run_dir, "changes"), profile_dir=os.path.join(run_dir, "profiles"),
+                )
+                result["transform"] = time.perf_counter() - start
+
+            if load:
+                start = time.perf_counter()
+                dynamo_utils.load_to_postgres(
+                    duckdb_path, profile_dir=os.path.join(run_dir, "profiles"), max_workers=load_workers,
+                )
+                result["load"] = time.perf_counter() - start
+                with open(os.path.join(run_dir, "profiles", "load.json")) as f:
+                    result["load_rows_per_second"] = {
+                        statement["tables"][0].removesuffix(dynamo_utils.SHADOW_SUFFIX): statement["rows_per_second"]
+                        for statement in json.load(f)["statements"]
+                        if statement["tables"]
+                        and statement["tables"][0].removesuffix(dynamo_utils.SHADOW_SUFFIX) in LOAD_REPORT_TABLES
+                        and statement.get("rows_per_second")
+                    }
+
+        for stage in ["extract", "transform", "extract+transform", "load"]:
+            if stage in result:
+                print(f"  {stage:>17}: {result[stage]:8.2f}s  {result['items'] / result[stage]:10,.0f} items/sec")
+        for table_name, rows_per_second in result.get("load_rows_per_second", {}).items():
+            print(f"  {table_name:>26}: {rows_per_second:10,.0f} rows/sec")
+        results.append(result)
+
+    os.makedirs(work_dir, exist_ok=True)
+    results_path = os.path.join(work_dir, "results.json")
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {results_path}")
+
+
+@app.command()
+def transform(
+    raw_dir: Annotated[str, typer.Argument(help="Raw files to transform, e.g. data/bench/100000/raw from `pipeline`")],
+    runs: int = 3,
+    workers: Annotated[int, typer.Option(help="Concurrent statements, 1 to time the SQL on its own")] = dynamo_utils.TRANSFORM_WORKERS,
+    work_dir: str = BENCH_DIR,
+):
+    """Time a full transform of `raw_dir` per SQL file, best of `runs`, and count the scans of `tasks_raw`."""
+    statements = dynamo_utils.sql_file_statements(duckdb.connect(), "transform/normalize_tasks.sql")
+    scans = sum("tasks_raw" in statement["reads"] for statement in statements)
+    print(f"normalize_tasks.sql: {len(statements)} statements, {scans} of them scan tasks_raw")
+
+    run_dir = os.path.join(work_dir, "transform")
+    best = {}
+    for _ in range(runs):
+        shutil.rmtree(run_dir, ignore_errors=True)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            dynamo_utils.run_sql_transforms(
+                raw_data_dir=raw_dir, output_dir=None, duckdb_path=os.path.join(run_dir, "all.duckdb"),
+                changes_dir=None, profile_dir=run_dir, max_workers=workers,
+            )
+        seconds = {"total": time.perf_counter() - start}
+        with open(os.path.join(run_dir, "transform.json")) as f:
+            for statement in json.load(f)["statements"]:
+                sql_file = statement["name"].split(" #")[0]
+                seconds[sql_file] = seconds.get(sql_file, 0.0) + statement["seconds"]
+        best = {name: min(value, best.get(name, value)) for name, value in seconds.items()}
+
+    for name, value in best.items():
+        print(f"  {name:>26}: {value:7.2f}s")
+
+
+@app.command()
+def stream(
+    rows: Annotated[int, typer.Option(help="Task items in the `pipeline` run to apply the changes to")] = 10_000,
+    events: Annotated[int, typer.Option(help="Stream records to replay")] = 1000,
+    batch_records: int = 1000,
+    load: Annotated[bool, typer.Option("--load", help="Also upsert into the configured Postgres")] = False,
+    work_dir: str = BENCH_DIR,
+):
+    """Replay synthetic stream records onto a `pipeline --rows ROWS` run and time each micro-batch."""
+    run_dir = os.path.join(work_dir, str(rows))
+    stream_dir = os.path.join(work_dir, "stream")
+    shutil.rmtree(stream_dir, ignore_errors=True)
+    os.makedirs(stream_dir)
+    duckdb_path = os.path.join(stream_dir, "all.duckdb")
+    shutil.copy(os.path.join(run_dir, "all.duckdb"), duckdb_path)
+
+    item_counts = {table_name: max(int(rows * share), 1) for table_name, share in TABLE_SHARES.items()}
+    stand_in = LocalDynamoDB(item_counts)
+    dynamo_utils.dynamodb_client = lambda: stand_in
+    records = synthetic_stream_records(stand_in, events)
+    consumer = dynamo_utils.StreamConsumer(
+        list(item_counts), os.path.join(stream_dir, "checkpoint.json"), client=LocalDynamoDBStreams(records),
+    )
+
+    applied = 0
+    start = time.perf_counter()
+    while True:
+        batch = consumer.poll(max_records=batch_records, max_seconds=0)
+        if not batch:
+            break
+        batch_start = time.perf_counter()
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            dynamo_utils.apply_stream_records(
+                batch, os.path.join(stream_dir, "delta"), duckdb_path, load_mode="upsert" if load else None,
+                changes_dir=None, profile_dir=stream_dir,
+            )
+        consumer.commit()
+        applied += len(batch)
+        print(f"  {len(batch):,} records applied in {time.perf_counter() - batch_start:.2f}s")
+
+    seconds = time.perf_counter() - start
+    print(f"{applied:,} stream records in {seconds:.2f}s ({applied / seconds:,.0f} records/sec)")
+
+
+@app.command()
+def recent(
+    rows: Annotated[int, typer.Option(help="Task items in the `pipeline` run to merge the window into")] = 10_000,
+    recent_days: Annotated[int, typer.Option(help="Days of tasks to query (the synthetic tasks are dated 2025)")] = 400,
+    max_workers: int = 8,
+    index_projection: Annotated[
+        str, typer.Option(help="What the stand-in's index projects, ALL or KEYS_ONLY (which the extract refuses)")
+    ] = "ALL",
+    work_dir: str = BENCH_DIR,
+):
+    """Query a recent window of tasks off the index and merge it into a copy of a `pipeline --rows ROWS` run.
+
+    The stand-in serves the same items the pipeline scanned, so the merge
+    must leave every table as it was; that is checked on the row hashes.
+    """
+    run_dir = os.path.join(work_dir, str(rows))
+    recent_dir = os.path.join(work_dir, "recent")
+    shutil.rmtree(recent_dir, ignore_errors=True)
+    os.makedirs(recent_dir)
+    duckdb_path = os.path.join(recent_dir, "all.duckdb")
+    shutil.copy(os.path.join(run_dir, "all.duckdb"), duckdb_path)
+
+    item_counts = {table_name: max(int(rows * share), 1) for table_name, share in TABLE_SHARES.items()}
+    stand_in = LocalDynamoDB(item_counts, index_projection=index_projection)
+    dynamo_utils.dynamodb_client = lambda: stand_in
+
+    def table_hashes() -> Dict[str, tuple]:
+        with duckdb.connect(duckdb_path, read_only=True) as conn:
+            return {
+                table_name: conn.execute(
+                    f"SELECT COUNT(*), bit_xor(row_hash)::VARCHAR FROM sync.{table_name}_pending"
+                ).fetchone()
+                for table_name in dynamo_utils.POSTGRES_PRIMARY_KEYS
+            }
+
+    before = table_hashes()
+    usernames = dynamo_utils.senior_rep_usernames(duckdb_path, recent_days)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        items = dynamo_utils.dump_recent_tasks(
+            RECENT_TASKS_TABLE, usernames, recent_days, max_workers=max_workers,
+            output_dir=os.path.join(recent_dir, "delta"), raw_format="ndjson",
+        )
+    extract_seconds = time.perf_counter() - start
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        dynamo_utils.run_sql_transforms(
+            raw_data_dir=os.path.join(recent_dir, "delta"), output_dir=None, duckdb_path=duckdb_path,
+            incremental=True, changes_dir=None, profile_dir=recent_dir,
+        )
+    transform_seconds = time.perf_counter() - start - extract_seconds
+
+    changed = [table_name for table_name, hashes in table_hashes().items() if hashes != before[table_name]]
+    print(
+        f"{items:,} of {item_counts[RECENT_TASKS_TABLE]:,} tasks from {len(usernames)} reps queried in "
+        f"{extract_seconds:.2f}s, merged in {transform_seconds:.2f}s"
+    )
+    if changed:
+        print(f"Merging the window changed {', '.join(changed)}, which should have been left as they were")
+        raise typer.Exit(code=1)
+    print("Every table is as the scan left it")
+
+
+@app.command("out-of-core")
+def out_of_core(
+    rows: Annotated[List[int], typer.Option("--rows", help="Task items per run, repeat for several sizes")] = [1_000_000],
+    memory_limit: Annotated[str, typer.Option(help="DuckDB memory limit for the transform")] = "1GB",
+    chunk_files: Annotated[
+        int, typer.Option(help="Raw batch files per table per chunk, 0 to transform everything at once")
+    ] = dynamo_utils.TRANSFORM_CHUNK_FILES,
+    raw_format: str = "ndjson.zst",
+    max_workers: int = 8,
+    work_dir: str = BENCH_DIR,
+):
+    """Time a chunked transform under a DuckDB memory limit and measure the process's peak resident memory.
+
+    The raw files are generated from `LocalDynamoDB` once per size and kept
+    in <work_dir>/out_of_core/<rows>/raw. The transform runs in a child
+    process so its peak RSS is its own.
+    """
+    results = []
+    for row_count in rows:
+        item_counts = {table_name: max(int(row_count * share), 1) for table_name, share in TABLE_SHARES.items()}
+        run_dir = os.path.join(work_dir, "out_of_core", str(row_count))
+        raw_dir = os.path.join(run_dir, "raw")
+        if not os.path.exists(os.path.join(raw_dir, "done")):
+            print(f"Generating raw files for {row_count:,} tasks in {raw_dir}...")
+            shutil.rmtree(raw_dir, ignore_errors=True)
+            stand_in = LocalDynamoDB(item_counts)
+            dynamo_utils.dynamodb_client = lambda: stand_in
+            with contextlib.redirect_stdout(open(os.devnull, "w")):
+                dynamo_utils.dump_tables_data(
+                    list(item_counts), max_workers=max_workers, output_dir=raw_dir, raw_format=raw_format,
+                )
+            open(os.path.join(raw_dir, "done"), "w").close()
+
+        duckdb_path = os.path.join(run_dir, "all.duckdb")
+        for path in [duckdb_path, f"{duckdb_path}.wal"]:
+            if os.path.exists(path):
+                os.remove(path)
+        options = {
+            "raw_data_dir": raw_dir, "output_dir": None, "duckdb_path": duckdb_path, "changes_dir": None,
+            "profile_dir": run_dir, "chunk_files": chunk_files or None, "memory_limit": memory_limit,
+            "temp_dir": os.path.join(run_dir, "spill"),
+        }
+        start = time.perf_counter()
+        child = subprocess.Popen(
+            [sys.executable, "-c", "import json, sys, dynamo_utils; dynamo_utils.run_sql_transforms(**json.loads(sys.argv[1]))",
+             json.dumps(options)],
+            stdout=subprocess.DEVNULL,
+        )
+        _, status, usage = os.wait4(child.pid, 0)
+        child.returncode = os.waitstatus_to_exitcode(status)
+        result = {
+            "rows": row_count, "items": sum(item_counts.values()), "memory_limit": memory_limit,
+            "chunk_files": chunk_files, "seconds": time.perf_counter() - start,
+            # ru_maxrss is in KB on Linux
+            "peak_rss_mb": usage.ru_maxrss / 1024, "exit_code": child.returncode,
+        }
+        results.append(result)
+        outcome = "done" if child.returncode == 0 else f"FAILED (exit code {child.returncode})"
+        print(
+            f"{row_count:,} tasks, {memory_limit} limit, {chunk_files or 'all'} files per chunk: {outcome} in "
+            f"{result['seconds']:.1f}s, peak RSS {result['peak_rss_mb']:,.0f} MB"
+        )
+
+    results_path = os.path.join(work_dir, "out_of_core", "results.json")
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {results_path}")
+
+
+@app.command()
+def decode(fixture: str, repeat: int = 5):
+    """CPU time per 10K items to decode (and decode + encode) a recorded scan, for each decoder."""
+    items = load_scan_fixture(fixture)
+    print(f"{len(items):,} items from {fixture}")
+
+    # Like timeit, keep the garbage collector (which walks the whole fixture) out of the timings
+    gc.disable()
+
+    for name, decode_item in ITEM_DECODERS.items():
+        decode_times, total_times = [], []
+        for _ in range(repeat):
+            start = time.process_time()
+            decoded = [decode_item(item) for item in items]
+            decoded_at = time.process_time()
+            encode_items(decoded)
+            finished = time.process_time()
+            decode_times.append(decoded_at - start)
+            total_times.append(finished - start)
+            del decoded
+            gc.collect()
+
+        per_10k = 10_000 / len(items)
+        print(
+            f"  {name:>6}: decode {min(decode_times) * per_10k * 1000:7.1f} ms/10K items, "
+            f"decode + encode {min(total_times) * per_10k * 1000:7.1f} ms/10K items"
+        )
+
+
+if __name__ == "__main__":
+    app()
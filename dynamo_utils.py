@@ -1,12 +1,62 @@
 from pathlib import Path
+import base64
 import boto3
+import contextlib
+import datetime
 import duckdb
+import fcntl
+import glob
+import gzip
+import hashlib
+import itertools
 import json
+import math
 import os
+import queue
+import random
+import re
+import shutil
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from typing import List, Dict, Any
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import BotoCoreError, ClientError
+
+
+# Amplify DataStore stamps every item with this (epoch milliseconds) on each write
+WATERMARK_FIELD = "_lastChangedAt"
+
+# An incremental extract's next watermark is its start time less this much (milliseconds),
+# for clock skew and writes still landing as the scan starts
+WATERMARK_OVERLAP = 5 * 60 * 1000
+
+# Raw batch formats `extract` can write, all of which DuckDB's read_json reads natively.
+# ndjson.zst needs the optional `zstandard` package.
+RAW_FORMATS = ["json", "ndjson", "ndjson.gz", "ndjson.zst"]
+
+# Roughly how much of a table each scan segment should cover. A segment reads
+# ~1 MB per page, so this keeps each segment busy for a few dozen pages.
+SEGMENT_TARGET_BYTES = 32 * 1024 * 1024
+
+# Errors DynamoDB raises when a scan reads faster than the table allows
+THROTTLING_ERRORS = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded"}
+SCAN_MAX_RETRIES = 8
+SCAN_BACKOFF_BASE = 0.5
+SCAN_BACKOFF_MAX = 30.0
+
+# A full extract writes its batches to a run directory of its own under the
+# raw data dir (runs/<run id>/), and only once every segment is done is the
+# run published, by swapping the raw data dir's manifest for the run's. The
+# transform reads the files the published manifest lists. The newest
+# RAW_KEEP_RUNS published runs are kept.
+RAW_RUNS_DIR = "runs"
+RAW_MANIFEST = "manifest.json"
+RAW_KEEP_RUNS = 3
+
+# Tasks GSI a recent window extract queries instead of scanning (see docs/indexes.org)
+RECENT_TASKS_INDEX = "bySeniorRepUsername"
+RECENT_WINDOW_DAYS = 14
 
 
 def print_table_indexes(table_names):
@@ -50,130 +100,908 @@ def print_table_indexes(table_names):
             print(f"Error describing table {table_name}: {e}")
 
 
-def scan_table_segment(
-    table_name: str, segment: int, total_segments: int, batch_size: int, 
-    save_callback, batch_lock, shared_state
-) -> int:
-    """Scan a segment of a DynamoDB table and save batches immediately."""
-    dynamodb = boto3.resource("dynamodb")
-    table = dynamodb.Table(table_name)
+def decode_attribute(value: Dict[str, Any]) -> Any:
+    """Decode one DynamoDB-JSON typed attribute (`{"S": ...}`, `{"N": ...}`, ...) into plain JSON types.
+
+    Numbers become floats straight from their string form, which is what the
+    raw files have always held, without going through `Decimal`. Sets become
+    lists and binary becomes base64 text so every item can be written as JSON.
+    """
+    # Membership tests on the one-key dict are much cheaper than unpacking
+    # it, ordered by how often each type turns up in our tables
+    if "S" in value:
+        return value["S"]
+    if "M" in value:
+        return {key: decode_attribute(field) for key, field in value["M"].items()}
+    if "N" in value:
+        return float(value["N"])
+    if "L" in value:
+        return [decode_attribute(element) for element in value["L"]]
+    if "BOOL" in value:
+        return value["BOOL"]
+    if "NULL" in value:
+        return None
+    if "SS" in value:
+        return list(value["SS"])
+    if "NS" in value:
+        return [float(number) for number in value["NS"]]
+    if "B" in value:
+        return base64.b64encode(value["B"]).decode()
+    if "BS" in value:
+        return [base64.b64encode(element).decode() for element in value["BS"]]
+    raise ValueError(f"Unknown DynamoDB attribute type {value!r}")
+
+
+def decode_item(item: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode a low-level client item with `decode_attribute`."""
+    return {key: decode_attribute(value) for key, value in item.items()}
+
+
+_deserializer = TypeDeserializer()
+
+
+def deserialize_item(item: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Decode a low-level client item the way `boto3.resource` does (numbers become `Decimal`)."""
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+# How scanned items are decoded: `fast` is the default, `boto3` matches the
+# old resource based path and is kept for benchmarking (see bench.py)
+ITEM_DECODERS = {"fast": decode_item, "boto3": deserialize_item}
+
+
+def dynamodb_client():
+    """Low-level DynamoDB client used by the extract (bench.py swaps in a local stand-in)."""
+    return boto3.client("dynamodb")
+
+
+def plan_table_scan(table_name: str, max_segments: int) -> Dict[str, Any]:
+    """Choose the number of scan segments for a table from its size.
 
-    segment_items = 0
+    `describe_table` only refreshes the size every ~6 hours, which is plenty
+    for sizing segments. Also returns the provisioned read capacity (0 for
+    on-demand tables).
+    """
+    dynamodb = dynamodb_client()
+    table = dynamodb.describe_table(TableName=table_name)["Table"]
+
+    size_bytes = table.get("TableSizeBytes", 0)
+    segments = min(max(math.ceil(size_bytes / SEGMENT_TARGET_BYTES), 1), max_segments)
+
+    return {
+        "segments": segments,
+        "item_count": table.get("ItemCount", 0),
+        "size_bytes": size_bytes,
+        "read_capacity": table.get("ProvisionedThroughput", {}).get("ReadCapacityUnits", 0),
+    }
+
+
+class ScanThrottle:
+    """Pace the scan segments of a table against a read capacity budget.
+
+    Each page reports the capacity it consumed. Once the segments have used
+    more than `read_capacity` units per second on average they wait until they
+    are back under it. A throttling error pauses every segment with
+    exponential backoff, and without a budget one is derived from the rate
+    that got throttled.
+    """
+
+    def __init__(self, read_capacity: float | None = None):
+        self.read_capacity = read_capacity or None
+        self.consumed = 0.0
+        self.throttled = 0
+        self._started = time.monotonic()
+        self._backoff = 0.0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the table is under budget and no backoff is pending."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                delay = self._paused_until - now
+                if self.read_capacity:
+                    delay = max(delay, self.consumed / self.read_capacity - (now - self._started))
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    def record(self, response: Dict[str, Any]):
+        """Account for the capacity a successful page consumed."""
+        capacity = response.get("ConsumedCapacity", {}).get("CapacityUnits", 0)
+        with self._lock:
+            self.consumed += float(capacity)
+            self._backoff = 0.0
+
+    def throttle(self):
+        """Back every segment off after a throttling error."""
+        with self._lock:
+            self.throttled += 1
+            elapsed = time.monotonic() - self._started
+            if self.read_capacity is None and self.consumed > 0 and elapsed > 0:
+                self.read_capacity = 0.8 * self.consumed / elapsed
+                print(f"  Throttled, pacing scan to {self.read_capacity:.0f} RCU/s")
+            self._backoff = min(max(self._backoff * 2, SCAN_BACKOFF_BASE), SCAN_BACKOFF_MAX)
+            self._paused_until = max(self._paused_until, time.monotonic() + self._backoff * random.uniform(0.5, 1))
+
+
+class ScanCheckpoint:
+    """Manifest of how far each scan segment has got, so an interrupted extract can resume.
+
+    A segment's position only moves once the batch holding every item before
+    it is on disk, so resuming from it neither skips nor repeats items.
+    """
+
+    def __init__(self, path: str | None, tables: Dict[str, Any] | None = None):
+        self.path = path
+        self.tables = tables or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "ScanCheckpoint":
+        if not os.path.exists(path):
+            print(f"No checkpoint at {path}, starting a fresh scan")
+            return cls(path)
+        with open(path, "r") as f:
+            return cls(path, json.load(f)["tables"])
+
+    def start_table(self, table_name: str, segments: int, since: float | None):
+        with self._lock:
+            self.tables[table_name] = {
+                "segments": segments,
+                "since": since,
+                "next_since": None if since is None else time.time() * 1000 - WATERMARK_OVERLAP,
+                "next_batch": 0,
+                "batches": [],
+                "segment_state": {
+                    str(segment): {"last_key": None, "done": False, "items": 0}
+                    for segment in range(segments)
+                },
+            }
+            self._save()
+
+    def segment(self, table_name: str, segment: int) -> Dict[str, Any]:
+        return self.tables[table_name]["segment_state"][str(segment)]
+
+    def record(
+        self, table_name: str, segment: int, batch_num: int | None, output_file: str | None,
+        last_key: Dict[str, Any] | None, done: bool, items: int,
+    ):
+        """Advance a segment once the batch ending at `last_key` has been written."""
+        with self._lock:
+            table = self.tables[table_name]
+            if output_file is not None:
+                table["batches"].append(output_file)
+                table["next_batch"] = max(table["next_batch"], batch_num + 1)
+            table["segment_state"][str(segment)] = {"last_key": last_key, "done": done, "items": items}
+            self._save()
+
+    def _save(self):
+        if self.path is None:
+            # Nothing to resume from (see `dump_tables_data`'s writer_factory)
+            return
+
+        # Convert Decimal types to float for JSON serialization
+        def decimal_default(obj):
+            if hasattr(obj, "__float__"):
+                return float(obj)
+            raise TypeError
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"tables": self.tables}, f, default=decimal_default, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class BatchWriter:
+    """Write batches from many scan segments on a single background thread.
+
+    Segments hand over full batches through a bounded queue, so scanning
+    carries on while the previous batch is serialised, and a slow disk pushes
+    back on the scanners instead of filling memory.
+
+    One thread per table keeps up with the scan in the `ndjson` formats,
+    which use the C JSON encoder. More writer threads wouldn't help, the
+    encoding holds the GIL.
+    """
+
+    def __init__(
+        self, table_name: str, output_dir: str = None, max_pending: int = 4, raw_format: str = "ndjson",
+        first_batch: int = 0,
+    ):
+        self.table_name = table_name
+        self.output_dir = output_dir
+        self.raw_format = raw_format
+        self.batches_written = 0
+        self.error = None
+        self._batch_nums = itertools.count(first_batch)
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name=f"writer-{table_name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, items: List[Dict[str, Any]], on_written=None):
+        """Queue a batch for writing, blocking while the queue is full.
+
+        `on_written(batch_num, output_file)` is called once the batch is on
+        disk (`output_file` is None for an empty batch, which is not written).
+        Batches are written in the order they were submitted.
+        """
+        if self.error is not None:
+            raise RuntimeError(f"Batch writer for {self.table_name} failed") from self.error
+        batch_num = next(self._batch_nums) if items else None
+        self._queue.put((batch_num, items, on_written))
+
+    def close(self):
+        """Flush the queued batches and stop the writer thread."""
+        self._queue.put(None)
+        self._thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Batch writer for {self.table_name} failed") from self.error
+
+    def write(self, batch_num: int, items: List[Dict[str, Any]]) -> str | None:
+        """Write one batch, returning the file it went to."""
+        return save_table_data_batch(self.table_name, items, batch_num, self.output_dir, self.raw_format)
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if self.error is not None:
+                # Keep draining so submitters never block on a dead writer
+                continue
+            batch_num, items, on_written = job
+            try:
+                output_file = None
+                if items:
+                    output_file = self.write(batch_num, items)
+                    self.batches_written += 1
+                if on_written is not None:
+                    on_written(batch_num, output_file)
+            except Exception as e:
+                self.error = e
+
+
+def scan_table_segment(
+    table_name: str, segment: int, total_segments: int, batch_size: int,
+    writer: BatchWriter, since: float | None = None, throttle: ScanThrottle | None = None,
+    checkpoint: ScanCheckpoint | None = None, decoder: str = "fast",
+) -> Dict[str, Any]:
+    """Scan a segment of a DynamoDB table, handing full batches to the writer.
+
+    Uses the low-level client and decodes the typed attribute maps with one
+    of the `ITEM_DECODERS`, rather than letting `boto3.resource` build
+    `Decimal`s that are converted back to floats for the JSON files.
+
+    Each segment buffers its own batch, so segments never wait on each other.
+    Pages are paced by the table's `throttle`. Failed pages are retried with
+    backoff, and once the retries run out the error is raised rather than
+    returning a partial count.
+
+    With a `checkpoint` the segment starts from its recorded position and
+    records each batch it writes (batches are cut on page boundaries for this).
+
+    When `since` is given only items changed at or after that watermark are
+    returned. The whole table is still read (there is no index on the
+    timestamp, see docs/indexes.org), but the filter runs server side.
+    """
+    dynamodb = dynamodb_client()
+    decode = ITEM_DECODERS[decoder]
+
+    if throttle is None:
+        throttle = ScanThrottle()
+
+    result = {"items": 0}
+    scan_kwargs = {
+        "TableName": table_name,
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+    if since:
+        scan_kwargs["FilterExpression"] = "#changed_at >= :since"
+        scan_kwargs["ExpressionAttributeNames"] = {"#changed_at": WATERMARK_FIELD}
+        scan_kwargs["ExpressionAttributeValues"] = {":since": {"N": repr(since)}}
+    if checkpoint is not None:
+        state = checkpoint.segment(table_name, segment)
+        result["items"] = state["items"]
+        if state["last_key"] is not None:
+            scan_kwargs["ExclusiveStartKey"] = state["last_key"]
+
+    current_batch = []
     scan_count = 0
-    scan_kwargs = {"Segment": segment, "TotalSegments": total_segments}
+    retries = 0
+
+    def flush(done: bool):
+        nonlocal current_batch
+        on_written = None
+        if checkpoint is not None:
+            position = {
+                "last_key": None if done else scan_kwargs.get("ExclusiveStartKey"),
+                "done": done,
+                "items": result["items"],
+            }
+
+            def on_written(batch_num, output_file):
+                checkpoint.record(table_name, segment, batch_num, output_file, **position)
+
+        if current_batch or on_written is not None:
+            writer.submit(current_batch, on_written)
+        current_batch = []
 
     try:
         while True:
-            response = table.scan(**scan_kwargs)
-            batch_items = response["Items"]
-            
-            # Process items immediately and save batches as we go
-            with batch_lock:
-                for item in batch_items:
-                    shared_state['current_batch'].append(item)
-                    shared_state['total_items'] += 1
-                    segment_items += 1
-                    
-                    if len(shared_state['current_batch']) >= batch_size:
-                        save_callback()
-            
+            throttle.wait()
+            try:
+                response = dynamodb.scan(**scan_kwargs)
+            except (ClientError, BotoCoreError) as e:
+                if retries >= SCAN_MAX_RETRIES:
+                    raise
+                retries += 1
+                if isinstance(e, ClientError) and e.response["Error"]["Code"] in THROTTLING_ERRORS:
+                    throttle.throttle()
+                else:
+                    delay = min(SCAN_BACKOFF_BASE * 2 ** retries, SCAN_BACKOFF_MAX) * random.uniform(0.5, 1)
+                    print(f"  {table_name} segment {segment}: {e}, retrying in {delay:.1f}s ({retries}/{SCAN_MAX_RETRIES})")
+                    time.sleep(delay)
+                continue
+
+            retries = 0
+            throttle.record(response)
+            batch_items = [decode(item) for item in response["Items"]]
+            current_batch.extend(batch_items)
+            result["items"] += len(batch_items)
             scan_count += 1
 
             # Progress indicator every 10 scans (roughly every 10MB of data)
             if scan_count % 10 == 0:
-                print(f"  Segment {segment}: {segment_items:,} items ({scan_count} scans)")
+                print(f"  {table_name} segment {segment}: {result['items']:,} items ({scan_count} scans)")
 
             if "LastEvaluatedKey" not in response:
                 break
 
             scan_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
 
+            if len(current_batch) >= batch_size:
+                flush(done=False)
+
     except Exception as e:
         print(f"Error scanning segment {segment} of table {table_name}: {e}")
+        # Keep what was scanned, the checkpoint resumes right after it
+        flush(done=False)
+        raise
+
+    # Save any remaining items in the segment's final batch
+    flush(done=True)
+
+    return result
+
+
+def dump_tables_data(
+    table_names: List[str], max_workers: int = 8, batch_size: int = 1000, output_dir: str = None,
+    since: Dict[str, float] | None = None, raw_format: str = "ndjson", read_capacity: float | None = None,
+    resume: bool = False, decoder: str = "fast", writer_factory=None,
+) -> Dict[str, int]:
+    """Dump several DynamoDB tables at once, sharing one pool of `max_workers` scan workers.
+
+    Each table is split into segments sized from the table (see
+    `plan_table_scan`). The biggest segments are queued first, so the long
+    task scan starts straight away and the small tables fill in the gaps
+    between its segments. Scans are paced per table to `read_capacity` RCU/s,
+    defaulting to the table's provisioned capacity.
+
+    Progress is checkpointed to `checkpoint.json` in `output_dir`. If any
+    segment fails the rest still finish and an error is raised afterwards;
+    `resume` then carries on from the checkpoint instead of starting over.
 
-    return segment_items
+    Passing `since` (a watermark per table) makes this an incremental dump:
+    only items whose `_lastChangedAt` is at or after the table's watermark are
+    saved, and the next watermark is recorded as pending in `output_dir` (see
+    `commit_watermarks`). That's when the scan started, less
+    `WATERMARK_OVERLAP`, rather than the highest `_lastChangedAt` seen: a
+    scan isn't a snapshot, and an item changed behind it would be older than
+    items it reaches later. Items changed during the overlap come again in the
+    next delta, which merges them by key.
 
+    `writer_factory(table_name, max_pending)` makes the writer each table's
+    batches go to instead of a `BatchWriter` (see `extract_to_duckdb`). What
+    it writes can't be resumed from, so there's no checkpoint then.
 
-# TODO this should be 1000 ish, set to 10 for testing
-def dump_table_data(table_name: str, max_workers: int = 4, batch_size: int = 1000, output_dir: str = None) -> int:
-    """Efficiently dump all data from a DynamoDB table using parallel scanning and batch saving."""
+    Returns the number of items saved per table.
+    """
     start_time = time.time()
-    print(f"Starting parallel scan of table: {table_name} ({max_workers} segments, batch size: {batch_size})")
-
-    # Use parallel scanning for better performance
-    total_segments = max_workers
-    completed_segments = 0
-    batch_num = 0
-    batch_lock = threading.Lock()
-    
-    # Shared state for all segments
-    shared_state = {
-        'current_batch': [],
-        'total_items': 0
-    }
 
-    def save_current_batch():
-        nonlocal batch_num
-        if shared_state['current_batch']:
-            save_table_data_batch(table_name, shared_state['current_batch'].copy(), batch_num, output_dir)
-            batch_num += 1
-            shared_state['current_batch'].clear()
+    checkpoint_path = os.path.join(output_dir or "data/raw", "checkpoint.json")
+    if writer_factory is not None:
+        if resume:
+            raise ValueError("Only an extract to raw files can be resumed")
+        checkpoint_path = None
+    checkpoint = ScanCheckpoint.load(checkpoint_path) if resume else ScanCheckpoint(checkpoint_path)
+
+    scans = {}
+    for table_name in table_names:
+        # More segments than workers is fine, it lets the small tables slot in between them
+        plan = plan_table_scan(table_name, max_segments=max_workers * 4)
+        if table_name not in checkpoint.tables:
+            table_since = since.get(table_name, 0) if since is not None else None
+            checkpoint.start_table(table_name, plan["segments"], table_since)
+            print(
+                f"Planned {plan['segments']} segments for {table_name}: "
+                f"{plan['item_count']:,} items, {plan['size_bytes'] / 1024 / 1024:.1f} MB"
+            )
+
+        state = checkpoint.tables[table_name]
+        done = [s for s in state["segment_state"].values() if s["done"]]
+        scans[table_name] = {
+            **plan,
+            "segments": state["segments"],
+            "since": state["since"],
+            "throttle": ScanThrottle(plan["read_capacity"] if read_capacity is None else read_capacity),
+            "writer": BatchWriter(
+                table_name, output_dir, max_pending=state["segments"], raw_format=raw_format,
+                first_batch=state["next_batch"],
+            ) if writer_factory is None else writer_factory(table_name, state["segments"]),
+            "pending": [int(s) for s, seg_state in state["segment_state"].items() if not seg_state["done"]],
+            "completed": len(done),
+            "failed": 0,
+            "items": sum(s["items"] for s in done),
+            # Checkpoints from before next_since keep their old watermark
+            "next_since": state.get("next_since", state["since"]),
+        }
+        if resume and done:
+            print(f"Resuming {table_name}: {len(done)}/{state['segments']} segments already done")
+        if state["since"] is not None:
+            print(f"Incremental scan of {table_name}: only items with {WATERMARK_FIELD} >= {state['since']:.0f}")
+
+    # Longest segments first, then the largest table
+    jobs = sorted(
+        ((table_name, segment) for table_name, scan in scans.items() for segment in scan["pending"]),
+        key=lambda job: (scans[job[0]]["size_bytes"] / scans[job[0]]["segments"], scans[job[0]]["size_bytes"]),
+        reverse=True,
+    )
+    print(f"Starting parallel scan of {len(scans)} tables ({len(jobs)} segments, {max_workers} workers, batch size: {batch_size})")
+
+    for table_name, scan in scans.items():
+        if not scan["pending"]:
+            finish_table_dump(table_name, scan, time.time() - start_time, output_dir)
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # Submit scan tasks for each segment
         future_to_segment = {
             executor.submit(
-                scan_table_segment, table_name, segment, total_segments, 
-                batch_size, save_current_batch, batch_lock, shared_state
-            ): segment
-            for segment in range(total_segments)
+                scan_table_segment, table_name, segment, scans[table_name]["segments"],
+                batch_size, scans[table_name]["writer"], scans[table_name]["since"], scans[table_name]["throttle"],
+                checkpoint, decoder,
+            ): (table_name, segment)
+            for table_name, segment in jobs
         }
 
         # Collect results as they complete
         for future in as_completed(future_to_segment):
-            segment = future_to_segment[future]
+            table_name, segment = future_to_segment[future]
+            scan = scans[table_name]
+            scan["completed"] += 1
             try:
-                segment_items = future.result()
-                completed_segments += 1
+                result = future.result()
+                scan["items"] += result["items"]
                 elapsed = time.time() - start_time
-                items_per_sec = shared_state['total_items'] / elapsed if elapsed > 0 else 0
+                items_per_sec = scan["items"] / elapsed if elapsed > 0 else 0
 
                 print(
-                    f"✓ Segment {segment} complete: {segment_items:,} items | "
-                    f"Progress: {completed_segments}/{total_segments} | "
-                    f"Total: {shared_state['total_items']:,} items | "
+                    f"✓ {table_name} segment {segment} complete: {result['items']:,} items | "
+                    f"Progress: {scan['completed']}/{scan['segments']} | "
+                    f"Total: {scan['items']:,} items | "
                     f"Rate: {items_per_sec:.0f} items/sec"
                 )
 
             except Exception as e:
-                print(f"✗ Segment {segment} failed: {e}")
+                scan["failed"] += 1
+                print(f"✗ {table_name} segment {segment} failed: {e}")
+
+            if scan["completed"] == scan["segments"]:
+                finish_table_dump(table_name, scan, time.time() - start_time, output_dir)
+
+    failed_segments = sum(scan["failed"] for scan in scans.values())
+    if failed_segments and checkpoint_path is None:
+        raise RuntimeError(f"{failed_segments} scan segment(s) failed")
+    if failed_segments:
+        raise RuntimeError(
+            f"{failed_segments} scan segment(s) failed, rerun with --resume to continue from {checkpoint_path}"
+        )
+
+    return {table_name: scan["items"] for table_name, scan in scans.items()}
+
+
+def finish_table_dump(table_name: str, scan: Dict[str, Any], elapsed: float, output_dir: str = None):
+    """Flush a table's writer once all its segments are done and report on it."""
+    scan["writer"].close()
+    avg_rate = scan["items"] / elapsed if elapsed > 0 else 0
 
-        # Save any remaining items in the final batch
-        with batch_lock:
-            save_current_batch()
+    print(
+        f"📊 Scan of {table_name} completed in {elapsed:.1f}s | "
+        f"Total: {scan['items']:,} items | "
+        f"Batches saved: {scan['writer'].batches_written} | "
+        f"Average rate: {avg_rate:.0f} items/sec | "
+        f"Consumed: {scan['throttle'].consumed:.0f} RCU, throttled {scan['throttle'].throttled} times"
+    )
+
+    if scan["since"] is not None:
+        if scan["failed"]:
+            # Keep the old watermark so the next run picks up what this one missed
+            print(f"Not advancing watermark for {table_name}: {scan['failed']} segment(s) failed")
+        else:
+            save_pending_watermark(table_name, float(scan["next_since"]), output_dir)
+
+
+def dump_table_data(
+    table_name: str, max_workers: int = 4, batch_size: int = 1000, output_dir: str = None,
+    since: float | None = None, raw_format: str = "ndjson", read_capacity: float | None = None,
+) -> int:
+    """Efficiently dump all data from a DynamoDB table using parallel scanning and batch saving.
+
+    See `dump_tables_data`, which this runs for a single table.
+    """
+    return dump_tables_data(
+        [table_name], max_workers, batch_size, output_dir,
+        None if since is None else {table_name: since}, raw_format, read_capacity,
+    )[table_name]
+
+
+def recent_window_start(window_days: int) -> str:
+    """ISO date a recent window of `window_days` days starts on (task dates are compared as text)."""
+    return (datetime.date.today() - datetime.timedelta(days=window_days)).isoformat()
+
+
+def senior_rep_usernames(duckdb_path: str, window_days: int = RECENT_WINDOW_DAYS) -> List[str]:
+    """Senior rep usernames to query the tasks index for, from the last transform.
+
+    The stores table names the reps that are assigned stores. Reps that only
+    show up on tasks in the window are added too, so a rep moving off
+    their last store doesn't drop out of the window straight away.
+    """
+    if not os.path.exists(duckdb_path):
+        raise FileNotFoundError(f"{duckdb_path} not found, run a full extract and transform first")
+    with duckdb.connect(duckdb_path, read_only=True) as conn:
+        queries, params = [], []
+        if table_exists(conn, "stores"):
+            queries.append("SELECT senior_rep_username FROM stores")
+        if table_exists(conn, "tasks"):
+            queries.append("SELECT senior_rep_username FROM tasks WHERE taskDate >= CAST(? AS DATE)")
+            params.append(recent_window_start(window_days))
+        if not queries:
+            raise RuntimeError(f"No stores table in {duckdb_path}, run a full extract and transform first")
+        rows = conn.execute(f"""
+            SELECT DISTINCT senior_rep_username FROM ({' UNION ALL '.join(queries)})
+            WHERE senior_rep_username IS NOT NULL AND senior_rep_username <> ''
+            ORDER BY senior_rep_username
+        """, params).fetchall()
+    return [username for (username,) in rows]
+
+
+def query_rep_tasks(
+    table_name: str, username: str, since: str, batch_size: int, writer: BatchWriter,
+    throttle: ScanThrottle, decoder: str = "fast",
+) -> int:
+    """Query one senior rep's tasks dated `since` or later off the `RECENT_TASKS_INDEX`.
+
+    Pages are paced and retried like a scan segment (see `scan_table_segment`),
+    full batches are handed to the writer. Returns the number of items read.
+    """
+    dynamodb = dynamodb_client()
+    decode = ITEM_DECODERS[decoder]
+    query_kwargs = {
+        "TableName": table_name,
+        "IndexName": RECENT_TASKS_INDEX,
+        "KeyConditionExpression": "senior_rep_username = :username AND taskDateISO8601 >= :since",
+        "ExpressionAttributeValues": {":username": {"S": username}, ":since": {"S": since}},
+        "ReturnConsumedCapacity": "TOTAL",
+    }
+
+    items = 0
+    current_batch = []
+    retries = 0
+    while True:
+        throttle.wait()
+        try:
+            response = dynamodb.query(**query_kwargs)
+        except (ClientError, BotoCoreError) as e:
+            if retries >= SCAN_MAX_RETRIES:
+                raise
+            retries += 1
+            if isinstance(e, ClientError) and e.response["Error"]["Code"] in THROTTLING_ERRORS:
+                throttle.throttle()
+            else:
+                delay = min(SCAN_BACKOFF_BASE * 2 ** retries, SCAN_BACKOFF_MAX) * random.uniform(0.5, 1)
+                print(f"  {table_name} {username}: {e}, retrying in {delay:.1f}s ({retries}/{SCAN_MAX_RETRIES})")
+                time.sleep(delay)
+            continue
+
+        retries = 0
+        throttle.record(response)
+        current_batch.extend(decode(item) for item in response["Items"])
+        items += len(response["Items"])
+
+        if "LastEvaluatedKey" not in response:
+            break
+        query_kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        if len(current_batch) >= batch_size:
+            writer.submit(current_batch)
+            current_batch = []
+
+    if current_batch:
+        writer.submit(current_batch)
+    return items
+
+
+def index_projection(table_name: str, index_name: str) -> str:
+    """What a global secondary index projects: ALL, KEYS_ONLY or INCLUDE."""
+    table = dynamodb_client().describe_table(TableName=table_name)["Table"]
+    for index in table.get("GlobalSecondaryIndexes", []):
+        if index["IndexName"] == index_name:
+            return index["Projection"]["ProjectionType"]
+    raise RuntimeError(f"{table_name} has no {index_name} index")
+
+
+def dump_recent_tasks(
+    table_name: str, usernames: List[str], window_days: int = RECENT_WINDOW_DAYS, max_workers: int = 8,
+    batch_size: int = 1000, output_dir: str = None, raw_format: str = "ndjson", read_capacity: float | None = None,
+    decoder: str = "fast",
+) -> int:
+    """Dump the tasks dated in the last `window_days` days (or later) by querying the tasks index per rep.
+
+    Rather than scanning the whole tasks table, each senior rep's tasks are
+    read off `RECENT_TASKS_INDEX` with a range condition on the task date,
+    `max_workers` reps at a time. The result is a delta like an incremental
+    extract's, to be merged by an incremental transform. Tasks outside the
+    window or of reps not in `usernames` are not seen, so a full (or
+    incremental) extract still has to run every so often.
+
+    The index has to project every attribute: the items replace whole tasks,
+    so partial ones (KEYS_ONLY or INCLUDE) would blank the rest of their
+    columns. Raises before querying if it doesn't, and once every query is
+    done if any of them failed. Returns the number of items saved.
+    """
+    start_time = time.time()
+    projection = index_projection(table_name, RECENT_TASKS_INDEX)
+    if projection != "ALL":
+        raise RuntimeError(
+            f"{RECENT_TASKS_INDEX} of {table_name} projects {projection}, not ALL, so its items would "
+            f"overwrite whole tasks with partial ones; extract without --recent-days"
+        )
+    since = recent_window_start(window_days)
+    throttle = ScanThrottle(read_capacity)
+    writer = BatchWriter(table_name, output_dir, max_pending=max_workers, raw_format=raw_format)
+    print(
+        f"Querying {RECENT_TASKS_INDEX} of {table_name} for the tasks of {len(usernames)} reps "
+        f"dated {since} or later ({max_workers} workers)"
+    )
 
-    elapsed_total = time.time() - start_time
-    avg_rate = shared_state['total_items'] / elapsed_total if elapsed_total > 0 else 0
+    total_items = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        future_to_username = {
+            executor.submit(query_rep_tasks, table_name, username, since, batch_size, writer, throttle, decoder): username
+            for username in usernames
+        }
+        for future in as_completed(future_to_username):
+            username = future_to_username[future]
+            try:
+                total_items += future.result()
+            except Exception as e:
+                failed.append(username)
+                print(f"✗ {table_name} query for {username} failed: {e}")
+    writer.close()
 
+    elapsed = time.time() - start_time
     print(
-        f"📊 Scan completed in {elapsed_total:.1f}s | "
-        f"Total: {shared_state['total_items']:,} items | "
-        f"Batches saved: {batch_num} | "
-        f"Average rate: {avg_rate:.0f} items/sec"
+        f"📊 Recent window of {table_name} completed in {elapsed:.1f}s | "
+        f"Total: {total_items:,} items | "
+        f"Batches saved: {writer.batches_written} | "
+        f"Consumed: {throttle.consumed:.0f} RCU, throttled {throttle.throttled} times"
     )
+    if failed:
+        raise RuntimeError(f"{len(failed)} of {len(usernames)} rep queries failed on {table_name}")
+    return total_items
+
+
+def load_watermarks(watermarks_path: str) -> Dict[str, float]:
+    """Load the per-table `_lastChangedAt` watermarks, if any."""
+    if not os.path.exists(watermarks_path):
+        return {}
+    with open(watermarks_path, "r") as f:
+        return json.load(f)
+
+
+def save_pending_watermark(table_name: str, watermark: float, output_dir: str = None):
+    """Record a table's next watermark next to the delta batches it belongs to.
+
+    The mark only becomes the committed watermark once the delta has been
+    transformed, so a failed transform re-extracts the same changes next time.
+    """
+    if output_dir is None:
+        output_dir = "data/raw"
+
+    os.makedirs(output_dir, exist_ok=True)
+    pending_path = os.path.join(output_dir, "watermarks.json")
+    pending = load_watermarks(pending_path)
+    pending[table_name] = watermark
+
+    with open(pending_path, "w") as f:
+        json.dump(pending, f, indent=2)
+
+
+def commit_watermarks(delta_dir: str, watermarks_path: str):
+    """Promote the pending watermarks written by an incremental extract."""
+    pending = load_watermarks(os.path.join(delta_dir, "watermarks.json"))
+    if not pending:
+        return
+
+    watermarks = load_watermarks(watermarks_path)
+    watermarks.update(pending)
+
+    tmp_path = f"{watermarks_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(tmp_path, watermarks_path)
+    print(f"Committed watermarks for {len(pending)} tables to {watermarks_path}")
+
+
+def clear_raw_batches(output_dir: str):
+    """Remove batch files (and pending watermarks) left over from a previous delta."""
+    if not os.path.isdir(output_dir):
+        return
+    for pattern in [*(f"*.{raw_format}" for raw_format in RAW_FORMATS), "*.tmp"]:
+        for path in Path(output_dir).glob(pattern):
+            path.unlink()
+
+
+def new_raw_run(raw_data_dir: str) -> str:
+    """Create the directory a full extract writes its batches (and checkpoint) to, named for when it started."""
+    run_id = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    run_dir = os.path.join(raw_data_dir, RAW_RUNS_DIR, run_id)
+    os.makedirs(run_dir)
+    return run_dir
+
+
+def raw_runs(raw_data_dir: str) -> List[str]:
+    """The ids of the extract runs in `raw_data_dir`, oldest first."""
+    runs_dir = os.path.join(raw_data_dir, RAW_RUNS_DIR)
+    if not os.path.isdir(runs_dir):
+        return []
+    return sorted(entry.name for entry in os.scandir(runs_dir) if entry.is_dir())
+
+
+def load_raw_manifest(directory: str) -> Dict[str, Any] | None:
+    """The manifest of a published run, from `directory` (the raw data dir or a run's), if any."""
+    manifest_path = os.path.join(directory, RAW_MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def unpublished_raw_run(raw_data_dir: str) -> str:
+    """The newest run started after the published one that never finished, for `--resume` to carry on with."""
+    published = load_raw_manifest(raw_data_dir) or {}
+    runs = [
+        run_id for run_id in raw_runs(raw_data_dir)
+        if run_id > published.get("run", "") and load_raw_manifest(os.path.join(raw_data_dir, RAW_RUNS_DIR, run_id)) is None
+    ]
+    if not runs:
+        raise FileNotFoundError(f"No unfinished extract in {os.path.join(raw_data_dir, RAW_RUNS_DIR)} to resume")
+    return os.path.join(raw_data_dir, RAW_RUNS_DIR, runs[-1])
+
+
+def publish_raw_run(raw_data_dir: str, run_dir: str, totals: Dict[str, int] | None = None) -> Dict[str, Any]:
+    """Make a finished run the raw snapshot the transform reads.
+
+    The run's manifest (its files, relative to `raw_data_dir`, and item
+    counts per table) is saved in the run directory, then swapped in as the
+    manifest of `raw_data_dir` with `os.replace`. A transform sees either the
+    old snapshot or the whole new one, never a mix.
+    """
+    run_id = os.path.basename(os.path.normpath(run_dir))
+    manifest = {
+        "run": run_id,
+        "published_at": time.time(),
+        "tables": {
+            table_pattern: {
+                "files": [os.path.relpath(path, raw_data_dir) for path in glob_raw_files(run_dir, table_pattern)],
+                "items": (totals or {}).get(table_pattern),
+            }
+            for table_pattern in RAW_TABLE_VIEWS
+        },
+    }
+    for directory in (run_dir, raw_data_dir):
+        tmp_path = os.path.join(directory, f"{RAW_MANIFEST}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(directory, RAW_MANIFEST))
+    files = sum(len(table["files"]) for table in manifest["tables"].values())
+    print(f"Published raw run {run_id} ({files} files) to {os.path.join(raw_data_dir, RAW_MANIFEST)}")
+    return manifest
+
+
+def prune_raw_runs(raw_data_dir: str, keep: int = RAW_KEEP_RUNS) -> List[str]:
+    """Delete the runs older than the `keep` newest published ones, returning their ids.
 
-    return shared_state['total_items']
+    An unfinished run is deleted too once a newer one is published, as there's
+    no resuming it then. The published run is always kept.
+    """
+    published = load_raw_manifest(raw_data_dir)
+    if published is None:
+        return []
+    runs = raw_runs(raw_data_dir)
+    finished = [
+        run_id for run_id in runs if load_raw_manifest(os.path.join(raw_data_dir, RAW_RUNS_DIR, run_id)) is not None
+    ]
+    kept = set(finished[-keep:]) | {published["run"]}
+    pruned = [run_id for run_id in runs if run_id not in kept and run_id < published["run"]]
+    for run_id in pruned:
+        shutil.rmtree(os.path.join(raw_data_dir, RAW_RUNS_DIR, run_id))
+    if pruned:
+        print(f"Pruned {len(pruned)} old raw run(s), keeping {len(kept)}")
+    return pruned
+
+
+def raw_batch_files(raw_data_dir: str, table_name: str) -> List[str]:
+    """List the raw files for a table, in any of the `RAW_FORMATS`.
+
+    Once a run has been published to `raw_data_dir` (see `publish_raw_run`)
+    only the files its manifest lists are read, whatever else is lying
+    around; a directory without a manifest (e.g. the delta) is globbed.
+    """
+    manifest = load_raw_manifest(raw_data_dir)
+    if manifest is None:
+        return glob_raw_files(raw_data_dir, table_name)
+    table = manifest["tables"].get(table_name, {"files": []})
+    return [os.path.join(raw_data_dir, path) for path in table["files"]]
+
+
+def glob_raw_files(raw_data_dir: str, table_name: str) -> List[str]:
+    """Every raw file for a table in `raw_data_dir`, in any of the `RAW_FORMATS`."""
+    files = []
+    for raw_format in RAW_FORMATS:
+        files.extend(glob.glob(os.path.join(raw_data_dir, f"{table_name}*.{raw_format}")))
+    return sorted(files)
+
+
+def open_raw_file(path: str, raw_format: str):
+    """Open a raw batch file for writing text, compressed according to its format."""
+    if raw_format == "ndjson.gz":
+        # Level 1 keeps compression well ahead of the scan
+        return gzip.open(path, "wt", compresslevel=1)
+    if raw_format == "ndjson.zst":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise RuntimeError("The ndjson.zst raw format needs the zstandard package (uv sync --extra zstd)") from e
+        return zstandard.open(path, "wt")
+    return open(path, "w")
 
 
 def save_table_data_batch(
-    table_name: str, items: List[Dict[str, Any]], batch_num: int, output_dir: str = None
+    table_name: str, items: List[Dict[str, Any]], batch_num: int, output_dir: str = None,
+    raw_format: str = "ndjson",
 ):
-    """Save a batch of table data to a JSON file."""
+    """Save a batch of table data to a JSON file.
+
+    `json` writes a pretty printed array, the `ndjson*` formats write one
+    compact item per line (optionally compressed).
+    """
     if output_dir is None:
         output_dir = "data/raw"
 
+    if raw_format not in RAW_FORMATS:
+        raise ValueError(f"Unknown raw format {raw_format!r}, expected one of {RAW_FORMATS}")
+
     os.makedirs(output_dir, exist_ok=True)
-    output_file = os.path.join(output_dir, f"{table_name}_batch_{batch_num:04d}.json")
+    output_file = os.path.join(output_dir, f"{table_name}_batch_{batch_num:04d}.{raw_format}")
 
     # Convert Decimal types to float for JSON serialization
     def decimal_default(obj):
@@ -181,10 +1009,19 @@ def save_table_data_batch(
             return float(obj)
         raise TypeError
 
-    with open(output_file, "w") as f:
-        json.dump(items, f, default=decimal_default, indent=2)
+    # Write to a temporary name first so a crash never leaves a truncated batch behind
+    tmp_file = f"{output_file}.tmp"
+    with open_raw_file(tmp_file, raw_format) as f:
+        if raw_format == "json":
+            json.dump(items, f, default=decimal_default, indent=2)
+        else:
+            for item in items:
+                f.write(json.dumps(item, default=decimal_default, separators=(",", ":")))
+                f.write("\n")
+    os.replace(tmp_file, output_file)
 
     print(f"Saved batch {batch_num}: {len(items)} items to {output_file}")
+    return output_file
 
 
 def save_table_data(
@@ -211,31 +1048,402 @@ def save_table_data(
     print(f"Saved {len(items)} items to {output_file}")
 
 
-def load_json_data(conn, raw_data_dir: str):
-    """Load raw JSON files into DuckDB tables using glob patterns."""
-    # Define table patterns for the three main tables (with correct hyphens)
-    table_patterns = {
-        "GforceStore-notow4pikzczbpjg42gytvbuci-production": "stores_raw",
-        "GforceTasks-notow4pikzczbpjg42gytvbuci-production": "tasks_raw", 
-        "GforceCallCycle-notow4pikzczbpjg42gytvbuci-production": "call_cycles_raw"
+class SqlProfiler:
+    """Per-statement wall time and rows affected for one stage (`transform` or `load`).
+
+    With `explain` the DuckDB profiler is switched on and each statement's
+    `EXPLAIN ANALYZE` tree is kept too. `save` writes the run's report as
+    `<stage>.json` and, for the node exporter textfile collector,
+    `<stage>.prom`. Safe to share between the DAG's worker threads.
+    """
+
+    def __init__(self, stage: str, explain: bool = False):
+        self.stage = stage
+        self.explain = explain
+        self.started_at = time.time()
+        self.statements = []
+        self.lock = threading.Lock()
+
+    def execute(self, cursor, sql: str, name: str, tables=(), parameters=None) -> Dict[str, Any]:
+        """Run one statement on `cursor`, record and print its timing, and return the record."""
+        record = {"name": name, "tables": sorted(tables), "seconds": 0.0, "rows": None, "status": "done"}
+        if self.explain:
+            cursor.execute("SET enable_profiling = 'no_output'")
+
+        start_time = time.time()
+        try:
+            result = cursor.execute(sql, parameters).fetchall()
+            # INSERT, DELETE, UPDATE and CREATE TABLE AS return the rows affected
+            if len(result) == 1 and len(result[0]) == 1 and type(result[0][0]) is int:
+                record["rows"] = result[0][0]
+        except Exception:
+            record["status"] = "failed"
+            raise
+        finally:
+            record["seconds"] = time.time() - start_time
+            if self.explain:
+                record["plan"] = cursor.get_profiling_information(format="query_tree")
+            with self.lock:
+                self.statements.append(record)
+
+        rows = ""
+        if record["rows"] is not None:
+            record["rows_per_second"] = record["rows"] / record["seconds"] if record["seconds"] else None
+            rows = f", {record['rows']:,} rows"
+            if record["rows_per_second"]:
+                rows += f" ({record['rows_per_second']:,.0f}/s)"
+        print(f"  {name} ({', '.join(record['tables']) or '-'}): {record['seconds']:.2f}s{rows}")
+        return record
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "started_at": self.started_at,
+            "seconds": time.time() - self.started_at,
+            "statements": self.statements,
+        }
+
+    def save(self, report_dir: str = "data/profiles"):
+        """Write `<stage>.json` and `<stage>.prom` into `report_dir`, replacing the previous run's."""
+        report = self.report()
+        os.makedirs(report_dir, exist_ok=True)
+
+        json_path = os.path.join(report_dir, f"{self.stage}.json")
+        with open(f"{json_path}.tmp", "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(f"{json_path}.tmp", json_path)
+
+        def labels(statement):
+            name = statement["name"].replace("\\", "\\\\").replace('"', '\\"')
+            return f'stage="{self.stage}",statement="{name}"'
+
+        lines = [
+            "# HELP dynamo_sync_stage_seconds Wall time of the last run of the stage.",
+            "# TYPE dynamo_sync_stage_seconds gauge",
+            f'dynamo_sync_stage_seconds{{stage="{self.stage}"}} {report["seconds"]:.3f}',
+            "# HELP dynamo_sync_stage_last_run_timestamp_seconds Start of the last run of the stage.",
+            "# TYPE dynamo_sync_stage_last_run_timestamp_seconds gauge",
+            f'dynamo_sync_stage_last_run_timestamp_seconds{{stage="{self.stage}"}} {report["started_at"]:.0f}',
+            "# HELP dynamo_sync_statement_seconds Wall time of each SQL statement in the last run.",
+            "# TYPE dynamo_sync_statement_seconds gauge",
+        ]
+        lines += [f"dynamo_sync_statement_seconds{{{labels(st)}}} {st['seconds']:.3f}" for st in report["statements"]]
+        lines += [
+            "# HELP dynamo_sync_statement_rows Rows affected by each SQL statement in the last run.",
+            "# TYPE dynamo_sync_statement_rows gauge",
+        ]
+        lines += [
+            f"dynamo_sync_statement_rows{{{labels(st)}}} {st['rows']}"
+            for st in report["statements"] if st["rows"] is not None
+        ]
+
+        prom_path = os.path.join(report_dir, f"{self.stage}.prom")
+        with open(f"{prom_path}.tmp", "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(f"{prom_path}.tmp", prom_path)
+        print(f"Saved {self.stage} profile to {json_path} and {prom_path}")
+
+
+# Raw view each DynamoDB table's files are loaded into
+RAW_TABLE_VIEWS = {
+    "GforceStore-notow4pikzczbpjg42gytvbuci-production": "stores_raw",
+    "GforceTasks-notow4pikzczbpjg42gytvbuci-production": "tasks_raw",
+    "GforceCallCycle-notow4pikzczbpjg42gytvbuci-production": "call_cycles_raw",
+}
+
+# Declared raw schema: models/raw.sql names each raw table after the
+# DynamoDB table it mirrors, which isn't quite the view name we load into
+RAW_SCHEMA_PATH = "models/raw.sql"
+RAW_SCHEMA_TABLES = {
+    "stores_raw": "stores_raw",
+    "tasks_raw": "task_raw",
+    "call_cycles_raw": "call_cycle_raw",
+}
+
+# How many raw files (newest first) to infer types from when checking for drift
+DRIFT_SAMPLE_FILES = 3
+
+
+def read_raw_schema(schema_path: str = RAW_SCHEMA_PATH) -> Dict[str, Dict[str, Any]]:
+    """Column types declared in `schema_path`, as `{view name: {column: DuckDBPyType}}`."""
+    if not os.path.exists(schema_path):
+        return {}
+    schema_conn = duckdb.connect()
+    try:
+        with open(schema_path) as f:
+            schema_conn.execute(f.read())
+        schema = {}
+        for view_name, table_name in RAW_SCHEMA_TABLES.items():
+            if table_exists(schema_conn, table_name):
+                relation = schema_conn.table(table_name)
+                schema[view_name] = dict(zip(relation.columns, relation.types))
+        return schema
+    finally:
+        schema_conn.close()
+
+
+def schema_drift(conn, declared: Dict[str, Any], inferred: Dict[str, Any], path: str = "") -> List[str]:
+    """Attributes in `inferred` that are new, or whose type no longer fits `declared`.
+
+    Structs and lists are compared field by field. An inferred type is fine if
+    it casts implicitly to the declared one, if the declared one is VARCHAR
+    (the JSON reader keeps the text of any scalar), or if it's JSON because
+    the sample only had nulls for it (or mixed types, which we can't tell apart).
+    """
+    drift = []
+    for name, inferred_type in inferred.items():
+        column = f"{path}.{name}" if path else name
+        declared_type = declared.get(name)
+        if declared_type is None:
+            drift.append(f"new {column} {inferred_type}")
+            continue
+
+        inferred_id, declared_id = inferred_type.id, declared_type.id
+        if inferred_id in ("null", "json") or str(inferred_type) == "JSON":
+            continue
+        if inferred_id == "map" and declared_id == "struct":
+            # Only ever saw empty objects
+            continue
+        if inferred_id == declared_id == "struct":
+            drift.extend(schema_drift(conn, dict(declared_type.children), dict(inferred_type.children), column))
+        elif inferred_id == declared_id == "list":
+            drift.extend(schema_drift(
+                conn, {"[]": declared_type.children[0][1]}, {"[]": inferred_type.children[0][1]}, column
+            ))
+        elif declared_id == "varchar" and inferred_id not in ("struct", "list", "map"):
+            continue
+        elif not conn.execute(
+            f"SELECT can_cast_implicitly(NULL::{inferred_type}, NULL::{declared_type})"
+        ).fetchone()[0]:
+            drift.append(f"changed {column} {declared_type} -> {inferred_type}")
+    return drift
+
+
+def check_schema_drift(conn, files: List[str], declared: Dict[str, Any], sample_files: int | None = DRIFT_SAMPLE_FILES) -> List[str]:
+    """Infer the schema of (the newest few of) `files` and diff it against `declared`."""
+    if sample_files:
+        files = sorted(files, key=os.path.getmtime)[-sample_files:]
+    description = conn.execute(
+        "SELECT * FROM read_json_auto(?, union_by_name=true, ignore_errors=true) LIMIT 0", [files]
+    ).description
+    return schema_drift(conn, declared, {column[0]: column[1] for column in description})
+
+
+def report_schema_drift(raw_data_dir: str, schema_path: str = RAW_SCHEMA_PATH) -> Dict[str, List[str]]:
+    """Check every raw file in `raw_data_dir` against `schema_path`, returning the drift per view."""
+    raw_schema = read_raw_schema(schema_path)
+    conn = duckdb.connect()
+    try:
+        report = {}
+        for table_pattern, view_name in RAW_TABLE_VIEWS.items():
+            files = raw_batch_files(raw_data_dir, table_pattern)
+            if not files:
+                continue
+            if view_name not in raw_schema:
+                report[view_name] = [f"not declared in {schema_path}"]
+                continue
+            report[view_name] = check_schema_drift(conn, files, raw_schema[view_name], sample_files=None)
+            for drift in report[view_name]:
+                print(f"Schema drift in {view_name}: {drift}")
+            print(f"{view_name}: {len(files)} files, {len(report[view_name])} drifted attributes")
+        return report
+    finally:
+        conn.close()
+
+
+# Columns a raw row can't become a transformed row without: the keys of the
+# tables it's normalised into. Rows missing one are dropped to the rejects,
+# nothing downstream can hold them so that never deletes anything.
+RAW_KEY_COLUMNS = {
+    "stores_raw": ["id"],
+    "tasks_raw": ["id"],
+    "call_cycles_raw": ["id", "call_id"],
+}
+
+# Columns whose absence is recorded in the rejects, the row is still kept
+RAW_EXPECTED_COLUMNS = {view_name: [WATERMARK_FIELD] for view_name in RAW_KEY_COLUMNS}
+
+# Columns the transforms CAST (rather than TRY_CAST) that aren't typed in the
+# raw schema, a value that doesn't parse would fail the whole statement
+RAW_CAST_COLUMNS = {
+    "tasks_raw": {"updatedAt": "TIMESTAMP"},
+}
+
+# Column of an in-memory raw table holding the values that didn't cast (see `ArrowBatchWriter`)
+CAST_ERRORS_COLUMN = "_cast_errors"
+
+
+def typed_scalar_columns(declared: Dict[str, Any]) -> Dict[str, str]:
+    """Declared top level scalar columns that aren't text, whose values `read_json` may fail to cast."""
+    return {
+        column: str(column_type) for column, column_type in declared.items()
+        if column_type.id not in ("varchar", "list", "struct")
     }
-    
-    for table_pattern, view_name in table_patterns.items():
-        # Use glob pattern to match both single files and batch files
-        glob_pattern = os.path.join(raw_data_dir, f"{table_pattern}*.json")
-        
-        print(f"Loading {view_name} from pattern: {glob_pattern}")
-        
+
+
+def cast_check(column: str, column_type: str, table: str | None = None) -> str:
+    """SQL naming `column` if its (text) value isn't NULL but doesn't cast to `column_type`."""
+    value = f'{table}."{column}"' if table else f'"{column}"'
+    return f"""CASE WHEN {value} IS NOT NULL AND TRY_CAST({value} AS {column_type}) IS NULL
+        THEN '{column} is not a {column_type}' END"""
+
+
+def validate_raw_table(
+    conn, raw_table: str, view_name: str, declared: Dict[str, Any], files: List[str] | None = None,
+    profiler: SqlProfiler | None = None, append: bool = False, cast_errors_column: bool = False,
+) -> int:
+    """Check the raw rows before the transforms see them, recording every problem in `<name>_rejects`.
+
+    A row missing one of its `RAW_KEY_COLUMNS`, or a line that isn't a JSON
+    object (`read_json` makes every column NULL), can't become a row of any
+    table, so it's dropped. Anything else is recorded but the row is kept,
+    its bad values NULL, so a reject never turns into a delete downstream:
+
+    - a value that isn't of its type in models/raw.sql (`declared`), which
+      `read_json` left NULL.
+      Those columns are read again as text from the `files` the table was
+      read from (much cheaper than the full read), or with
+      `cast_errors_column` taken from the column the in-memory etl fills.
+    - a `RAW_CAST_COLUMNS` value that doesn't parse, set to NULL here.
+    - a missing `RAW_EXPECTED_COLUMNS`.
+
+    Only top level columns are checked, all of it set based; the pydantic
+    models in models/*.py play no part. The rejects
+    table (the row as JSON, the reasons, whether it was dropped and when) is
+    replaced unless `append`. Returns the number of rows dropped.
+    """
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+    rejects_table = f"{view_name.removesuffix('_raw')}_rejects"
+    if not append:
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE {rejects_table} (
+                id VARCHAR, reason VARCHAR, dropped BOOLEAN, item JSON, rejected_at TIMESTAMP
+            )
+        """)
+
+    cast_errors = "(SELECT NULL::VARCHAR AS id, NULL::VARCHAR AS reason WHERE false)"
+    casts = typed_scalar_columns(declared) if files and not cast_errors_column else {}
+    if casts:
+        cast_errors = f"{raw_table}_cast_errors"
+        profiler.execute(conn, f"""
+            CREATE OR REPLACE TEMP TABLE {cast_errors} AS
+            SELECT id, reason FROM (
+                SELECT id, concat_ws('; ', {', '.join(cast_check(column, column_type) for column, column_type in casts.items())}) AS reason
+                FROM read_json(?, columns=?, ignore_errors=true)
+            )
+            WHERE reason <> ''
+        """, f"validate {view_name} types", [], [files, {"id": "VARCHAR", **{column: "VARCHAR" for column in casts}}])
+    cast_reason = f'raw."{CAST_ERRORS_COLUMN}"' if cast_errors_column else "cast_errors.reason"
+
+    def missing(column: str) -> str:
+        return f"""CASE WHEN raw."{column}" IS NULL THEN 'missing {column}' END"""
+
+    all_null = " AND ".join(f'raw."{column}" IS NULL' for column in declared)
+    key_checks = [missing(column) for column in RAW_KEY_COLUMNS.get(view_name, []) if column in declared]
+    drop_reason = f"CASE WHEN {all_null} THEN 'not a JSON object' ELSE concat_ws('; ', {', '.join(key_checks) or 'NULL'}) END"
+    # A value that didn't cast is NULL too, so it's only missing if it wasn't there as text either
+    keep_checks = [cast_reason] + [
+        f"""CASE WHEN coalesce({cast_reason}, '') NOT LIKE '%{column} is not a %' THEN {missing(column)} END"""
+        for column in RAW_EXPECTED_COLUMNS.get(view_name, []) if column in declared
+    ] + [
+        cast_check(column, column_type, "raw")
+        for column, column_type in RAW_CAST_COLUMNS.get(view_name, {}).items() if column in declared
+    ]
+    keep_reason = f"CASE WHEN {all_null} THEN NULL ELSE concat_ws('; ', {', '.join(keep_checks)}) END"
+    item = "struct_pack(" + ", ".join(f'"{column}" := raw."{column}"' for column in declared) + ")"
+
+    record = profiler.execute(conn, f"""
+        INSERT INTO {rejects_table}
+        SELECT id, concat_ws('; ', nullif(drop_reason, ''), nullif(keep_reason, '')), drop_reason <> '',
+            to_json(item), current_localtimestamp()
+        FROM (
+            SELECT {item} AS item, CAST(raw.id AS VARCHAR) AS id, {drop_reason} AS drop_reason, {keep_reason} AS keep_reason
+            FROM {raw_table} AS raw
+            {'' if cast_errors_column else f'LEFT JOIN {cast_errors} AS cast_errors ON CAST(raw.id AS VARCHAR) = cast_errors.id'}
+        )
+        WHERE drop_reason <> '' OR keep_reason <> ''
+    """, f"validate {view_name}", [rejects_table])
+    dropped = 0
+    if record["rows"]:
+        dropped = conn.execute(f"DELETE FROM {raw_table} AS raw WHERE {drop_reason} <> ''").fetchone()[0]
+        for column, column_type in RAW_CAST_COLUMNS.get(view_name, {}).items():
+            if column in declared:
+                conn.execute(f"""
+                    UPDATE {raw_table} SET "{column}" = NULL
+                    WHERE "{column}" IS NOT NULL AND TRY_CAST("{column}" AS {column_type}) IS NULL
+                """)
+        print(
+            f"{record['rows']:,} rows of {view_name} failed validation, {dropped:,} of them dropped, "
+            f"see {rejects_table}"
+        )
+    if casts:
+        conn.execute(f"DROP TABLE {cast_errors}")
+    return dropped
+
+
+def load_json_data(
+    conn,
+    raw_data_dir: str,
+    profiler: SqlProfiler | None = None,
+    schema_path: str = RAW_SCHEMA_PATH,
+    drift_check: bool = True,
+    chunk: Dict[str, List[str]] | None = None,
+    append_rejects: bool = False,
+):
+    """Load raw JSON files (in any of the `RAW_FORMATS`) into DuckDB tables.
+
+    Tables declared in `schema_path` are read with those column types rather
+    than re-inferring them from every file on every run; anything new or
+    changed in the newest files is reported as schema drift (and otherwise
+    ignored until models/raw.sql is updated). Undeclared tables still go
+    through `read_json_auto`.
+
+    Declared tables are validated before the transforms see them (see
+    `validate_raw_table`), `append_rejects` adding to the rejects of an
+    earlier chunk.
+
+    With a `chunk` (see `raw_file_chunks`) only its files are read, and the
+    tables it has none of are left empty.
+    """
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+    raw_schema = read_raw_schema(schema_path)
+
+    for table_pattern, view_name in RAW_TABLE_VIEWS.items():
+        # Match both single files and batch files, whatever format they were written in
+        files = raw_batch_files(raw_data_dir, table_pattern) if chunk is None else chunk[table_pattern]
+        if chunk is not None and not files:
+            conn.execute(f"CREATE OR REPLACE VIEW {view_name} AS SELECT NULL as placeholder WHERE FALSE")
+            continue
+
+        print(f"Loading {view_name} from {len(files)} files matching: {os.path.join(raw_data_dir, table_pattern)}*")
+
         try:
-            # Create table using glob pattern (replace hyphens with underscores for SQL table name)
+            if not files:
+                raise FileNotFoundError(f"No raw files found for {table_pattern}")
+
+            # Create table from the file list (replace hyphens with underscores for SQL table name)
             table_name = table_pattern.replace('-', '_')
-            conn.execute(f"""
-                CREATE OR REPLACE TABLE {table_name} AS
-                SELECT * FROM read_json_auto('{glob_pattern}', union_by_name=true, ignore_errors=true)
-            """)
-            
-            row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-            print(f"Loaded {row_count:,} rows into {view_name}")
+            declared = raw_schema.get(view_name)
+            if declared:
+                if drift_check:
+                    for drift in check_schema_drift(conn, files, declared):
+                        print(f"Schema drift in {view_name}: {drift}")
+                columns = {column: str(column_type) for column, column_type in declared.items()}
+                record = profiler.execute(conn, f"""
+                    CREATE OR REPLACE TABLE {table_name} AS
+                    SELECT * FROM read_json(?, columns=?, ignore_errors=true)
+                """, f"read {view_name}", [table_name], [files, columns])
+            else:
+                record = profiler.execute(conn, f"""
+                    CREATE OR REPLACE TABLE {table_name} AS
+                    SELECT * FROM read_json_auto(?, union_by_name=true, ignore_errors=true)
+                """, f"read {view_name}", [table_name], [files])
+
+            print(f"Loaded {record['rows']:,} rows into {view_name}")
+            if declared:
+                validate_raw_table(conn, table_name, view_name, declared, files, profiler, append_rejects)
             
             # Create simplified alias view
             conn.execute(f"CREATE OR REPLACE VIEW {view_name} AS SELECT * FROM {table_name}")
@@ -246,63 +1454,657 @@ def load_json_data(conn, raw_data_dir: str):
             conn.execute(f"CREATE OR REPLACE VIEW {view_name} AS SELECT NULL as placeholder WHERE FALSE")
 
 
-def execute_sql_models(conn, models_dir: str, transform_dir: str = "transform"):
-    """Execute SQL model files and transform files in order."""
+def import_pyarrow():
+    """Import the optional `pyarrow` package, which only the in-memory etl needs."""
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise RuntimeError("The in-memory etl needs the pyarrow package (uv sync --extra arrow)") from e
+    return pyarrow
+
+
+def arrow_type(pa, column_type):
+    """Arrow type scanned values are converted to for a declared raw column type.
+
+    Structs and lists keep their shape. Booleans and numbers keep their type,
+    every other scalar (VARCHAR, but also DATE, UUID and JSON) goes over as a
+    string, and DuckDB casts it to the declared type on insert.
+    """
+    if column_type.id == "struct":
+        return pa.struct([(name, arrow_type(pa, child)) for name, child in column_type.children])
+    if column_type.id == "list":
+        return pa.list_(arrow_type(pa, column_type.children[0][1]))
+    if column_type.id == "boolean":
+        return pa.bool_()
+    if column_type.id in ("double", "float", "decimal"):
+        return pa.float64()
+    if column_type.id in ("bigint", "integer", "smallint", "tinyint"):
+        return pa.int64()
+    return pa.string()
+
+
+def coerce_arrow_value(pa, value: Any, value_type) -> Any:
+    """Coerce a decoded value to `value_type`, or None where it can't be.
+
+    Only used on batches the plain conversion rejected. Mismatches are
+    handled roughly like `read_json` does: numbers and nested values are
+    serialised where a string is declared, numeric strings are parsed, and
+    anything else becomes NULL.
+    """
+    if value is None:
+        return None
+    if pa.types.is_struct(value_type):
+        if not isinstance(value, dict):
+            return None
+        return {field.name: coerce_arrow_value(pa, value.get(field.name), field.type) for field in value_type}
+    if pa.types.is_list(value_type):
+        if not isinstance(value, list):
+            return None
+        return [coerce_arrow_value(pa, element, value_type.value_type) for element in value]
+    if pa.types.is_string(value_type):
+        return value if isinstance(value, str) else json.dumps(value, default=float)
+    if pa.types.is_boolean(value_type):
+        return value if isinstance(value, bool) else None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if pa.types.is_integer(value_type) else number
+
+
+class ArrowBatchWriter(BatchWriter):
+    """Stream scanned batches straight into a raw DuckDB table as Arrow record batches.
+
+    Each batch is converted to the table's declared column types (see
+    `arrow_type`). The writer thread runs a single `INSERT` through its own
+    cursor, reading a `RecordBatchReader` fed from the queue, so DuckDB
+    appends the table in bulk like it would from files, tables fill in
+    parallel and nothing is parsed back from JSON. With `archive` the
+    batches are saved to `output_dir` as well.
+
+    A top level value that doesn't convert, or doesn't cast on insert, is
+    left NULL like `read_json` would, and named in the raw table's
+    `CAST_ERRORS_COLUMN` for `validate_raw_table` to record.
+    """
+
+    def __init__(
+        self, table_name: str, conn, raw_table: str, declared: Dict[str, Any], output_dir: str = None,
+        max_pending: int = 4, raw_format: str = "ndjson", archive: bool = False,
+    ):
+        pa = import_pyarrow()
+        self.pa = pa
+        self.raw_table = raw_table
+        self.archive = archive
+        self.declared = declared
+        self.coerced_batches = 0
+        self.schema = pa.schema(
+            [(column, arrow_type(pa, column_type)) for column, column_type in declared.items()]
+            + [(CAST_ERRORS_COLUMN, pa.string())]
+        )
+        # JSON values are serialised up front, they are dicts and lists rather than strings
+        self.json_columns = {
+            column: column_type.id == "list" for column, column_type in declared.items()
+            if str(column_type) in ("JSON", "JSON[]")
+        }
+        casts = ", ".join(
+            f'TRY_CAST("{column}" AS {column_type}) AS "{column}"' for column, column_type in declared.items()
+        )
+        # Scalars that go over as strings are only typed by the insert
+        checks = ", ".join(
+            [f'nullif("{CAST_ERRORS_COLUMN}", \'\')']
+            + [cast_check(column, column_type) for column, column_type in typed_scalar_columns(declared).items()
+               if pa.types.is_string(arrow_type(pa, declared[column]))]
+        )
+        self.insert_sql = (
+            f"INSERT INTO {raw_table} SELECT {casts}, nullif(concat_ws('; ', {checks}), '') FROM arrow_batches"
+        )
+        self.cursor = conn.cursor()
+        self._drained = False
+        super().__init__(table_name, output_dir, max_pending=max_pending, raw_format=raw_format)
+
+    def record_batch(self, items: List[Dict[str, Any]]):
+        """Convert decoded items to a record batch of the declared schema."""
+        pa = self.pa
+        for item in items:
+            for column, is_list in self.json_columns.items():
+                value = item.get(column)
+                if is_list and isinstance(value, list):
+                    item[column] = [json.dumps(element, default=float) for element in value]
+                elif value is not None:
+                    item[column] = json.dumps(value, default=float)
+        try:
+            return pa.RecordBatch.from_pylist(items, schema=self.schema)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            self.coerced_batches += 1
+            rows = []
+            for item in items:
+                row, errors = {}, []
+                for field in self.schema:
+                    if field.name == CAST_ERRORS_COLUMN:
+                        continue
+                    value = item.get(field.name)
+                    row[field.name] = coerce_arrow_value(pa, value, field.type)
+                    if value is not None and row[field.name] is None:
+                        errors.append(f"{field.name} is not a {self.declared[field.name]}")
+                row[CAST_ERRORS_COLUMN] = "; ".join(errors) or None
+                rows.append(row)
+            return pa.RecordBatch.from_pylist(rows, schema=self.schema)
+
+    def _batches(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                self._drained = True
+                return
+            batch_num, items, on_written = job
+            output_file = None
+            if items:
+                if self.archive:
+                    output_file = self.write(batch_num, items)
+                yield self.record_batch(items)
+                self.batches_written += 1
+            if on_written is not None:
+                on_written(batch_num, output_file)
+
+    def _run(self):
+        try:
+            self.cursor.register("arrow_batches", self.pa.RecordBatchReader.from_batches(self.schema, self._batches()))
+            self.cursor.execute(self.insert_sql)
+        except Exception as e:
+            self.error = e
+            # Keep draining so submitters never block on a dead writer
+            while not self._drained:
+                self._drained = self._queue.get() is None
+        finally:
+            self.cursor.close()
+
+    def close(self):
+        super().close()
+        if self.coerced_batches:
+            print(f"  {self.table_name}: {self.coerced_batches} batch(es) had values coerced to the declared types")
+
+
+def extract_to_duckdb(
+    conn, table_names: List[str], output_dir: str = None, archive: bool = False, raw_format: str = "ndjson",
+    profiler: SqlProfiler | None = None, schema_path: str = RAW_SCHEMA_PATH, **scan_options,
+) -> Dict[str, int]:
+    """Scan the DynamoDB tables straight into the raw DuckDB tables, without raw files in between.
+
+    The in-memory counterpart of `dump_tables_data` followed by
+    `load_json_data`, for `run_sql_transforms(load_raw=...)`. The raw tables
+    are created with the types declared in `schema_path` and every scan page
+    is appended to them as Arrow (see `ArrowBatchWriter`). Only a few batches
+    per table are ever held in Python, however big the tables are.
+
+    `archive` also saves the raw batch files to `output_dir`, where an
+    incremental run (`since`, see `dump_tables_data`) keeps its pending
+    watermarks either way. Schema drift is only checked on runs from files.
+
+    Returns the number of items per table.
+    """
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+    raw_schema = read_raw_schema(schema_path)
+
+    raw_tables = {}
+    for table_pattern, view_name in RAW_TABLE_VIEWS.items():
+        declared = raw_schema.get(view_name)
+        if not declared:
+            raise RuntimeError(f"{view_name} isn't declared in {schema_path}, the in-memory etl needs its types")
+        table_name = table_pattern.replace('-', '_')
+        columns = ", ".join(f'"{column}" {column_type}' for column, column_type in declared.items())
+        conn.execute(f'CREATE OR REPLACE TABLE {table_name} ({columns}, "{CAST_ERRORS_COLUMN}" VARCHAR)')
+        conn.execute(
+            f'CREATE OR REPLACE VIEW {view_name} AS SELECT * EXCLUDE ("{CAST_ERRORS_COLUMN}") FROM {table_name}'
+        )
+        raw_tables[table_pattern] = (table_name, declared)
+
+    def writer_factory(table_name: str, max_pending: int) -> ArrowBatchWriter:
+        raw_table, declared = raw_tables[table_name]
+        return ArrowBatchWriter(
+            table_name, conn, raw_table, declared, output_dir, max_pending=max_pending, raw_format=raw_format,
+            archive=archive,
+        )
+
+    start = time.perf_counter()
+    totals = dump_tables_data(
+        table_names, output_dir=output_dir, raw_format=raw_format, writer_factory=writer_factory, **scan_options,
+    )
+    for table_pattern, (table_name, declared) in raw_tables.items():
+        validate_raw_table(
+            conn, table_name, RAW_TABLE_VIEWS[table_pattern], declared, profiler=profiler, cast_errors_column=True,
+        )
+    seconds = time.perf_counter() - start
+    for table_pattern, view_name in RAW_TABLE_VIEWS.items():
+        if table_pattern in totals:
+            rows = totals[table_pattern]
+            with profiler.lock:
+                profiler.statements.append({
+                    "name": f"extract {view_name}", "tables": [raw_tables[table_pattern][0]], "seconds": seconds,
+                    "rows": rows, "status": "done", "rows_per_second": rows / seconds if seconds else None,
+                })
+            print(f"Loaded {rows:,} rows into {view_name}")
+    return totals
+
+
+# Raw view each transform file reads from
+TRANSFORM_SOURCES = {
+    "normalize_stores.sql": "stores_raw",
+    "normalize_call_cycles.sql": "call_cycles_raw",
+    "normalize_tasks.sql": "tasks_raw",
+}
+
+# Tables rebuilt from scratch on a full run, as (parent column, raw view column).
+# On an incremental run the rows of every changed parent are deleted first so
+# removed array entries don't linger. Task tables are left out, they are only
+# ever added to (see README).
+INCREMENTAL_REPLACED_TABLES = {
+    "stores_raw": {
+        "stores": ("id", "id"),
+        "store_visit_days": ("store_id", "id"),
+        "store_additional_reps": ("store_id", "id"),
+        "store_contacts": ("store_id", "id"),
+        "store_notes": ("store_id", "id"),
+        "store_sales_rep_notes": ("store_id", "id"),
+    },
+    "call_cycles_raw": {
+        "call_cycles": ("call_id", "call_id"),
+        "call_cycle_stores": ("call_id", "call_id"),
+    },
+}
+
+
+def table_exists(conn, table_name: str) -> bool:
+    """Check whether a table exists in the main DuckDB schema."""
+    return conn.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE database_name = current_database() "
+        "AND schema_name = 'main' AND table_name = ?",
+        [table_name],
+    ).fetchone()[0] > 0
+
+
+def has_raw_rows(conn, view_name: str) -> bool:
+    """Check whether a raw view loaded any rows (it is a placeholder when no files matched)."""
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {view_name}").fetchone()[0] > 0
+    except duckdb.Error:
+        return False
+
+
+def changed_parent_deletes(view_name: str) -> List[str]:
+    """SQL deleting the normalised rows belonging to every parent present in a delta raw view."""
+    return [
+        f"""
+            DELETE FROM {table_name}
+            WHERE {column} IN (SELECT CAST({raw_column} AS VARCHAR) FROM {view_name})
+        """
+        for table_name, (column, raw_column) in INCREMENTAL_REPLACED_TABLES.get(view_name, {}).items()
+    ]
+
+
+def delete_removed_parents(conn, removed: Dict[str, List[str]], profiler: SqlProfiler | None = None):
+    """Delete removed stores or call cycles, `{raw view: [raw id, ...]}`, and their normalised rows."""
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+    for view_name, raw_ids in removed.items():
+        for table_name, (column, _) in INCREMENTAL_REPLACED_TABLES[view_name].items():
+            profiler.execute(
+                conn, f"DELETE FROM {table_name} WHERE {column} IN (SELECT UNNEST(?::VARCHAR[]))",
+                f"delete removed {table_name}", [table_name], [raw_ids],
+            )
+
+
+# Concurrent statements in the transform, enough for the stores, call cycle
+# and task chains to run side by side
+TRANSFORM_WORKERS = 3
+
+# Batch files per raw table a chunked transform reads at once (see `raw_file_chunks`)
+TRANSFORM_CHUNK_FILES = 250
+
+
+def raw_file_chunks(raw_data_dir: str, chunk_files: int) -> List[Dict[str, List[str]]]:
+    """Split the raw batch files into chunks of at most `chunk_files` files per table.
+
+    Returns one `{table pattern: files}` per chunk. The first chunk has
+    files of every table, the later ones only of the tables with more than
+    that (in practice only tasks).
+    """
+    files = {table_pattern: raw_batch_files(raw_data_dir, table_pattern) for table_pattern in RAW_TABLE_VIEWS}
+    count = max(max(math.ceil(len(table_files) / chunk_files) for table_files in files.values()), 1)
+    return [
+        {
+            table_pattern: table_files[number * chunk_files:(number + 1) * chunk_files]
+            for table_pattern, table_files in files.items()
+        }
+        for number in range(count)
+    ]
+
+
+def limit_memory(conn, memory_limit: str | None = None, temp_dir: str | None = None):
+    """Cap DuckDB's buffer manager at `memory_limit`, spilling what doesn't fit to `temp_dir`.
+
+    `memory_limit` is a DuckDB size, e.g. '1GB'. It bounds what DuckDB
+    keeps in its buffers, not the process: Python, the JSON reader's own
+    allocations and the allocator's slack come on top (about 0.2 GB at
+    1GB, see the README), so leave headroom under a container's limit.
+    Insertion order isn't kept either, which otherwise holds back results
+    that could be streamed.
+    """
+    if memory_limit:
+        conn.execute(f"SET memory_limit = '{memory_limit}'")
+        conn.execute("SET preserve_insertion_order = false")
+    if temp_dir:
+        os.makedirs(temp_dir, exist_ok=True)
+        conn.execute(f"SET temp_directory = '{temp_dir}'")
+
+SQL_IDENTIFIER = r"([A-Za-z_][\w.]*)"
+SQL_WRITE_PATTERN = re.compile(
+    r"\b(?:INSERT(?:\s+OR\s+(?:REPLACE|IGNORE))?\s+INTO"
+    r"|CREATE(?:\s+OR\s+REPLACE)?\s+(?:TEMP(?:ORARY)?\s+)?TABLE(?:\s+IF\s+NOT\s+EXISTS)?"
+    r"|ALTER\s+TABLE|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|DELETE\s+FROM|UPDATE)\s+" + SQL_IDENTIFIER,
+    re.IGNORECASE,
+)
+SQL_READ_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+" + SQL_IDENTIFIER, re.IGNORECASE)
+
+
+def sql_statement(sql: str, name: str) -> Dict[str, Any]:
+    """Describe one SQL statement for `run_sql_dag`: the tables it writes and reads.
+
+    Found with regexes rather than the binder (the tables may not exist
+    yet). They err on the side of too many tables, e.g. CTE names, which
+    only costs some concurrency.
+    """
+    code = re.sub(r"--[^\n]*", "", sql)
+    writes = {table.lower() for table in SQL_WRITE_PATTERN.findall(code)}
+    reads = {table.lower() for table in SQL_READ_PATTERN.findall(code)} - writes
+    return {"name": name, "sql": sql, "writes": writes, "reads": reads}
+
+
+def sql_file_statements(conn, sql_path: str) -> List[Dict[str, Any]]:
+    """Split a SQL file into its statements (with DuckDB's parser), see `sql_statement`."""
+    with open(sql_path, "r") as f:
+        sql_content = f.read()
+    file_name = os.path.basename(sql_path)
+    return [
+        sql_statement(statement.query, f"{file_name} #{number}")
+        for number, statement in enumerate(conn.extract_statements(sql_content), start=1)
+    ]
+
+
+def run_sql_dag(
+    conn, statements: List[Dict[str, Any]], max_workers: int = TRANSFORM_WORKERS, profiler: SqlProfiler | None = None,
+) -> List[Dict[str, Any]]:
+    """Run SQL statements concurrently, keeping the order of those touching the same tables.
+
+    A statement waits for every earlier statement that writes a table it
+    reads or writes, or reads a table it writes. Everything else runs at
+    once, each worker thread on its own cursor of `conn`. A failed statement
+    is reported and the statements depending on it are skipped, the rest
+    carry on.
+
+    Statements are run and timed through `profiler` (a throwaway one if not
+    given). Returns the statements with their `status` and `seconds` (0 if
+    they failed or never ran).
+    """
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+
+    for index, statement in enumerate(statements):
+        touches = statement["reads"] | statement["writes"]
+        statement["depends_on"] = {
+            earlier for earlier in range(index)
+            if statements[earlier]["writes"] & touches or statements[earlier]["reads"] & statement["writes"]
+        }
+        statement["status"] = "pending"
+        statement["seconds"] = 0.0
+
+    local = threading.local()
+
+    def run(statement):
+        if not hasattr(local, "cursor"):
+            local.cursor = conn.cursor()
+        record = profiler.execute(local.cursor, statement["sql"], statement["name"], statement["writes"])
+        statement["seconds"] = record["seconds"]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while True:
+            for index, statement in enumerate(statements):
+                if statement["status"] != "pending":
+                    continue
+                depends_on = [statements[earlier]["status"] for earlier in statement["depends_on"]]
+                if any(status in ("failed", "skipped") for status in depends_on):
+                    statement["status"] = "skipped"
+                    print(f"  Skipped {statement['name']}: an earlier statement failed")
+                elif all(status == "done" for status in depends_on):
+                    statement["status"] = "running"
+                    running[executor.submit(run, statement)] = statement
+
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                statement = running.pop(future)
+                try:
+                    future.result()
+                    statement["status"] = "done"
+                except Exception as e:
+                    statement["status"] = "failed"
+                    print(f"Error in {statement['name']}: {e}")
+
+    return statements
+
+
+def execute_sql_models(
+    conn, models_dir: str, transform_dir: str = "transform", incremental: bool = False,
+    max_workers: int = TRANSFORM_WORKERS, profiler: SqlProfiler | None = None,
+):
+    """Execute the SQL model files and transform files as one statement DAG (see `run_sql_dag`).
+
+    The stores, call cycle and task statements touch different tables, so
+    their chains run side by side and finish in the shadow of the tasks.
+
+    An incremental run merges a delta into the existing tables: the model files
+    (which recreate the store and call cycle tables) are skipped and only the
+    transforms with changed rows are run.
+
+    Raises if any statement failed or was skipped, so nothing goes on to
+    export or diff half-built tables.
+    """
+    statements = []
 
-    # Run model files (create tables)
-    model_files = ["stores.sql", "call_cycles.sql", "tasks.sql"]
-    print("Creating tables...")
+    # Model files (create tables)
+    model_files = [] if incremental else ["stores.sql", "call_cycles.sql", "tasks.sql"]
     for sql_file in model_files:
         sql_path = os.path.join(models_dir, sql_file)
         if os.path.exists(sql_path):
-            with open(sql_path, "r") as f:
-                sql_content = f.read()
-            try:
-                conn.execute(sql_content)
-                print(f"Created tables from {sql_file}")
-            except Exception as e:
-                print(f"Error in {sql_file}: {e}")
+            statements.extend(sql_file_statements(conn, sql_path))
 
-    # Run transform files (normalize data)
+    # Transform files (normalize data)
     transform_files = [
         "normalize_stores.sql",
         "normalize_call_cycles.sql",
         "normalize_tasks.sql",
     ]
-    print("Normalizing data...")
     for sql_file in transform_files:
         sql_path = os.path.join(transform_dir, sql_file)
         if os.path.exists(sql_path):
-            with open(sql_path, "r") as f:
-                sql_content = f.read()
-            try:
-                conn.execute(sql_content)
-                print(f"Processed {sql_file}")
-            except Exception as e:
-                print(f"Error in {sql_file}: {e}")
+            view_name = TRANSFORM_SOURCES[sql_file]
+            if incremental and not has_raw_rows(conn, view_name):
+                print(f"Skipped {sql_file}: no changes")
+                continue
+            if incremental:
+                statements.extend(
+                    sql_statement(sql, f"{sql_file} delete changed #{number}")
+                    for number, sql in enumerate(changed_parent_deletes(view_name), start=1)
+                )
+            statements.extend(sql_file_statements(conn, sql_path))
+
+    print(f"Creating and normalizing tables ({len(statements)} statements, {max_workers} at a time)...")
+    start_time = time.time()
+    run_sql_dag(conn, statements, max_workers=max_workers, profiler=profiler)
+
+    statement_seconds = sum(statement["seconds"] for statement in statements)
+    failed = sum(statement["status"] != "done" for statement in statements)
+    print(
+        f"Ran {len(statements) - failed}/{len(statements)} statements in {time.time() - start_time:.2f}s "
+        f"({statement_seconds:.2f}s of statement time)"
+    )
+    failed = [statement["name"] for statement in statements if statement["status"] != "done"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} transform statements failed or were skipped: {', '.join(failed)}")
+
+
+def transformed_table_names(conn) -> List[str]:
+    """The transformed tables, leaving out the raw data tables and views and the rejects."""
+    return [
+        table_name for (table_name,) in conn.execute("SHOW TABLES").fetchall()
+        if not any(raw_table in table_name for raw_table in ["GforceTasks", "GforceStore", "GforceCallCycle"])
+        and not table_name.endswith(("_raw", "_rejects"))
+    ]
 
 
 def export_transformed_tables(conn, output_dir: str):
     """Export transformed tables to Parquet files."""
-    tables = conn.execute("SHOW TABLES").fetchall()
     exported_count = 0
 
-    for table_row in tables:
-        table_name = table_row[0]
+    for table_name in transformed_table_names(conn):
+        output_path = os.path.join(output_dir, f"{table_name}.parquet")
+        conn.execute(f"COPY {table_name} TO '{output_path}' (FORMAT PARQUET)")
+
+        row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+        if row_count > 0:
+            exported_count += 1
+            print(f"Exported {table_name}: {row_count:,} rows")
 
-        # Skip raw data tables and views
-        if (not any(raw_table in table_name for raw_table in ["GforceTasks", "GforceStore", "GforceCallCycle"])
-            and not table_name.endswith("_raw")):
+    print(f"Export completed: {exported_count} tables")
 
-            output_path = os.path.join(output_dir, f"{table_name}.parquet")
-            conn.execute(f"COPY {table_name} TO '{output_path}' (FORMAT PARQUET)")
 
-            row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-            if row_count > 0:
-                exported_count += 1
-                print(f"Exported {table_name}: {row_count:,} rows")
+EXPORT_MODES = ["files", "lake"]
 
-    print(f"Export completed: {exported_count} tables")
+# Hive partition column and the expression it's computed from, for the lake
+# tables worth pruning. Every other table is a single unpartitioned file.
+LAKE_PARTITIONS = {
+    "tasks": ("month", "strftime(taskDate, '%Y-%m')"),
+    "task_rep_images": ("month", "strftime(photo_datetime, '%Y-%m')"),
+}
+
+# Directory name DuckDB (and Hive) read back as a NULL partition value
+LAKE_NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def lake_partition_path(table_name: str, column: str | None, partition: str) -> str:
+    """Path of one partition's directory, relative to the lake."""
+    return os.path.join(table_name, f"{column}={partition}") if column else table_name
+
+
+def export_lake(conn, lake_dir: str = "data/lake", profiler: SqlProfiler | None = None):
+    """Export the transformed tables as a Hive-partitioned Parquet lake, rewriting only what changed.
+
+    Partitioned tables (`LAKE_PARTITIONS`) are laid out as
+    `<lake_dir>/<table>/<column>=<value>/data_0.parquet`, the rest as
+    `<lake_dir>/<table>/data_0.parquet`. Each partition's row count and
+    combined row hash are kept in `<lake_dir>/manifest.json`; a run only
+    rewrites partitions whose count or hash moved and drops the ones that are
+    now empty, so rows deleted or moved between partitions are handled too.
+
+    Rewritten partitions are written to `<lake_dir>/.staging` first and
+    swapped in by rename, and the manifest is replaced last.
+    """
+    if profiler is None:
+        profiler = SqlProfiler("transform")
+    manifest_path = os.path.join(lake_dir, "manifest.json")
+    manifest = {"tables": {}}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    staging_root = os.path.join(lake_dir, ".staging")
+    shutil.rmtree(staging_root, ignore_errors=True)
+    written_bytes = 0
+
+    for table_name in transformed_table_names(conn):
+        column, expression = LAKE_PARTITIONS.get(table_name, (None, None))
+        entry = manifest["tables"].get(table_name, {})
+        previous = entry.get("partitions", {})
+        if entry and entry.get("expression") != expression:
+            # Layout changed, start the table over
+            shutil.rmtree(os.path.join(lake_dir, table_name), ignore_errors=True)
+            previous = {}
+
+        partition_sql = f"COALESCE({expression}, '{LAKE_NULL_PARTITION}')" if column else "''"
+        current = {
+            partition: {"rows": rows, "hash": row_hash}
+            for partition, rows, row_hash in conn.execute(f"""
+                SELECT {partition_sql}, COUNT(*), bit_xor(hash({table_name}))::VARCHAR
+                FROM {table_name} GROUP BY ALL
+            """).fetchall()
+        }
+        touched = [
+            partition for partition, stats in current.items()
+            if {key: previous.get(partition, {}).get(key) for key in stats} != stats
+        ]
+        removed = [partition for partition in previous if partition not in current]
+
+        staging_dir = os.path.join(staging_root, table_name)
+        if touched and column:
+            # The partitioned COPY only creates staging_dir itself, not its parent
+            os.makedirs(staging_root, exist_ok=True)
+            values = ", ".join("'" + partition.replace("'", "''") + "'" for partition in touched)
+            profiler.execute(conn, f"""
+                COPY (
+                    SELECT *, {partition_sql} AS {column} FROM {table_name}
+                    WHERE {partition_sql} IN ({values})
+                ) TO '{staging_dir}' (FORMAT PARQUET, PARTITION_BY ({column}), WRITE_PARTITION_COLUMNS false)
+            """, f"lake {table_name}", [table_name])
+        elif touched:
+            os.makedirs(staging_dir)
+            profiler.execute(
+                conn, f"COPY {table_name} TO '{os.path.join(staging_dir, 'data_0.parquet')}' (FORMAT PARQUET)",
+                f"lake {table_name}", [table_name],
+            )
+
+        written_at = time.time()
+        for partition in touched + removed:
+            relative_path = lake_partition_path(table_name, column, partition)
+            target_dir = os.path.join(lake_dir, relative_path)
+            # Move the old partition aside rather than deleting it before the new one is in place
+            if os.path.exists(target_dir):
+                old_dir = os.path.join(staging_root, "old", relative_path)
+                os.makedirs(os.path.dirname(old_dir), exist_ok=True)
+                os.replace(target_dir, old_dir)
+            if partition in current:
+                new_dir = os.path.join(staging_dir, f"{column}={partition}") if column else staging_dir
+                os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+                os.replace(new_dir, target_dir)
+                current[partition]["path"] = relative_path
+                current[partition]["written_at"] = written_at
+                written_bytes += sum(
+                    os.path.getsize(os.path.join(target_dir, name)) for name in os.listdir(target_dir)
+                )
+        for partition in current:
+            if partition not in touched:
+                current[partition] = previous[partition]
+
+        manifest["tables"][table_name] = {"partition_by": column, "expression": expression, "partitions": current}
+        if touched or removed:
+            print(
+                f"Lake {table_name}: rewrote {len(touched)} of {len(current)} partitions, "
+                f"removed {len(removed)}"
+            )
+
+    for table_name in list(manifest["tables"]):
+        if not table_exists(conn, table_name):
+            shutil.rmtree(os.path.join(lake_dir, table_name), ignore_errors=True)
+            del manifest["tables"][table_name]
+
+    manifest["updated_at"] = time.time()
+    with open(f"{manifest_path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    shutil.rmtree(staging_root, ignore_errors=True)
+    print(f"Lake export completed: {written_bytes / 1024 / 1024:.1f} MB written to {lake_dir}")
 
 
 def sync_tables_to_postgres(conn):
@@ -353,18 +2155,386 @@ def run_sql_transforms(
     models_dir: str = "models",
     output_dir: str | None = "data/transformed",
     duckdb_path: str = "data/all.duckdb",
+    incremental: bool = False,
+    changes_dir: str | None = "data/changes",
+    explain: bool = False,
+    profile_dir: str | None = "data/profiles",
+    max_workers: int = TRANSFORM_WORKERS,
+    export_mode: str = "files",
+    lake_dir: str = "data/lake",
+    removed: Dict[str, List[str]] | None = None,
+    load_raw=None,
+    chunk_files: int | None = None,
+    memory_limit: str | None = None,
+    temp_dir: str | None = None,
 ):
-    """Run SQL transformations on raw JSON data using DuckDB."""
+    """Run SQL transformations on raw JSON data using DuckDB.
+
+    With `incremental` the raw data is a delta (see `dump_table_data`) that is
+    merged into the tables left by the previous run. `removed` lists the
+    ids of deleted stores and call cycles by raw view (see
+    `delete_removed_parents`).
+
+    `load_raw(conn, profiler)` fills the raw views instead of reading the
+    files in `raw_data_dir`, e.g. with `extract_to_duckdb`.
+
+    With `chunk_files` the raw files are read and normalised that many files
+    per table at a time (see `raw_file_chunks`): the first chunk as a full
+    run, the rest merged into it like incremental deltas, so the raw tables
+    never hold more than a chunk. `memory_limit` and `temp_dir` cap DuckDB's
+    memory and say where it spills (see `limit_memory`).
+
+    The tables are exported to `output_dir` as one Parquet file each, or with
+    `export_mode="lake"` into the partitioned lake in `lake_dir` (see
+    `export_lake`).
+
+    Finishes with the changeset since the last load (see `compute_changesets`),
+    which is returned.
+    The raw loads and every model/transform statement are profiled into
+    `profile_dir` (see `SqlProfiler`), with their plans if `explain`.
+    """
     print("Starting data transformation...")
 
     # Create directories
     duckdb_dir = os.path.dirname(duckdb_path)
     if duckdb_dir:
         os.makedirs(duckdb_dir, exist_ok=True)
+    if export_mode not in EXPORT_MODES:
+        raise ValueError(f"Unknown export mode {export_mode!r}, expected one of {EXPORT_MODES}")
+    if export_mode == "lake":
+        output_dir = lake_dir
     if output_dir:
         os.makedirs(output_dir, exist_ok=True)
 
-    # Connect to DuckDB
+    # Connect to DuckDB, the transform never touches Postgres (see `load_to_postgres`)
+    conn = duckdb.connect(duckdb_path)
+    limit_memory(conn, memory_limit, temp_dir)
+    profiler = SqlProfiler("transform", explain=explain)
+
+    try:
+        if incremental and not table_exists(conn, "stores"):
+            raise RuntimeError("Incremental transform needs existing tables, run a full transform first")
+
+        if load_raw is not None:
+            load_raw(conn, profiler)
+            execute_sql_models(conn, models_dir, incremental=incremental, max_workers=max_workers, profiler=profiler)
+        elif chunk_files:
+            chunks = raw_file_chunks(raw_data_dir, chunk_files)
+            for number, chunk in enumerate(chunks):
+                print(f"Chunk {number + 1}/{len(chunks)}: {sum(len(files) for files in chunk.values())} files")
+                load_json_data(
+                    conn, raw_data_dir, profiler=profiler, drift_check=number == 0, chunk=chunk,
+                    append_rejects=number > 0,
+                )
+                execute_sql_models(
+                    conn, models_dir, incremental=incremental or number > 0, max_workers=max_workers,
+                    profiler=profiler,
+                )
+        else:
+            load_json_data(conn, raw_data_dir, profiler=profiler)
+            execute_sql_models(conn, models_dir, incremental=incremental, max_workers=max_workers, profiler=profiler)
+        if removed:
+            delete_removed_parents(conn, removed, profiler)
+        if output_dir and export_mode == "lake":
+            export_lake(conn, output_dir, profiler=profiler)
+        elif output_dir:
+            export_transformed_tables(conn, output_dir)
+        changes = compute_changesets(conn, changes_dir)
+        print("Transformation completed successfully")
+        return changes
+
+    except Exception as e:
+        print(f"Transformation failed: {e}")
+        raise
+    finally:
+        conn.close()
+        if profile_dir:
+            profiler.save(profile_dir)
+
+
+LOAD_MODES = ["replace", "upsert"]
+
+# Primary key of every table load/load_tables.sql uploads, in the same order.
+# Keep the two in sync, the upsert load merges on these keys.
+POSTGRES_PRIMARY_KEYS = {
+    "call_cycles": ["call_id"],
+    "call_cycle_stores": ["call_id", "store_id"],
+    "store_visit_days": ["store_id", "name"],
+    "store_additional_reps": ["store_id", "rep_cover_username"],
+    "store_contacts": ["store_id", "email"],
+    "store_notes": ["store_id", "datetime"],
+    "store_sales_rep_notes": ["store_id", "datetime"],
+    "stores": ["id"],
+    "task_documents": ["task_uuid", "document"],
+    "task_call_cycles": ["task_uuid", "call_id"],
+    "task_photos": ["task_uuid", "photo_name"],
+    "task_rep_images_cannot_complete": ["task_uuid", "key"],
+    "task_comments": ["task_uuid", "comment"],
+    "task_questions": ["task_uuid", "question"],
+    "task_rep_images": ["task_uuid", "key"],
+    "tasks": ["id"],
+}
+
+
+def compute_changesets(conn, changes_dir: str | None = "data/changes"):
+    """Work out which rows of each loaded table changed since the last load, from row hashes.
+
+    `sync.<table>_hashes` holds the `hash()` of every row, by primary key, as
+    of the last successful load. The current hashes go to
+    `sync.<table>_pending` and one full outer join against them gives
+    `sync.<table>_changes`: the key of every inserted, updated or deleted row
+    and its `_change`. The load applies just those rows and then promotes the
+    pending hashes (`commit_row_hashes`), so a failed load is picked up again
+    by the next changeset.
+
+    With `changes_dir` each changeset is also exported as
+    `<changes_dir>/<table>.parquet`, with the row's columns (only the key for
+    deletes) for downstream consumers.
+
+    Returns `{table: {"insert": n, "update": n, "delete": n}}`.
+    """
+    conn.execute("CREATE SCHEMA IF NOT EXISTS sync")
+    changes = {}
+    if changes_dir:
+        os.makedirs(changes_dir, exist_ok=True)
+
+    for table_name, primary_key in POSTGRES_PRIMARY_KEYS.items():
+        if not table_exists(conn, table_name):
+            continue
+
+        key = ", ".join(primary_key)
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE sync.{table_name}_pending AS
+            SELECT {key}, hash({table_name}) AS row_hash FROM {table_name}
+        """)
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS sync.{table_name}_hashes AS
+            SELECT * FROM sync.{table_name}_pending LIMIT 0
+        """)
+        conn.execute(f"""
+            CREATE OR REPLACE TABLE sync.{table_name}_changes AS
+            SELECT
+                {key},
+                CASE
+                    WHEN committed.row_hash IS NULL THEN 'insert'
+                    WHEN pending.row_hash IS NULL THEN 'delete'
+                    ELSE 'update'
+                END AS _change
+            FROM sync.{table_name}_pending AS pending
+            FULL OUTER JOIN sync.{table_name}_hashes AS committed USING ({key})
+            WHERE pending.row_hash IS DISTINCT FROM committed.row_hash
+        """)
+
+        counts = dict(conn.execute(f"SELECT _change, COUNT(*) FROM sync.{table_name}_changes GROUP BY ALL").fetchall())
+        changes[table_name] = {change: counts.get(change, 0) for change in ("insert", "update", "delete")}
+        print(
+            f"Changes in {table_name}: {counts.get('insert', 0):,} inserted, "
+            f"{counts.get('update', 0):,} updated, {counts.get('delete', 0):,} deleted"
+        )
+
+        if changes_dir:
+            output_path = os.path.join(changes_dir, f"{table_name}.parquet")
+            conn.execute(f"""
+                COPY (
+                    SELECT * FROM sync.{table_name}_changes LEFT JOIN {table_name} USING ({key})
+                ) TO '{output_path}' (FORMAT PARQUET)
+            """)
+    return changes
+
+
+def sync_table_exists(conn, table_name: str) -> bool:
+    """Check whether a table exists in the DuckDB `sync` schema."""
+    return conn.execute(
+        "SELECT COUNT(*) FROM duckdb_tables() WHERE database_name = current_database() "
+        "AND schema_name = 'sync' AND table_name = ?",
+        [table_name],
+    ).fetchone()[0] > 0
+
+
+def commit_row_hashes(conn):
+    """Record the pending row hashes as loaded, once Postgres has the rows (see `compute_changesets`)."""
+    for table_name in POSTGRES_PRIMARY_KEYS:
+        if not sync_table_exists(conn, f"{table_name}_pending"):
+            continue
+        conn.execute(f"CREATE OR REPLACE TABLE sync.{table_name}_hashes AS SELECT * FROM sync.{table_name}_pending")
+        conn.execute(f"DELETE FROM sync.{table_name}_changes")
+
+
+def postgres_table_exists(conn, table_name: str) -> bool:
+    """Whether `table_name` exists in the attached `postgres_db`."""
+    return conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE database_name = 'postgres_db' AND table_name = ?",
+        [table_name],
+    ).fetchone()[0] > 0
+
+
+def upsert_table_sql(table_name: str, primary_key: List[str], columns: List[str]) -> str:
+    """Postgres SQL that applies the staged changes to `table_name` and drops the stages.
+
+    `{table_name}__stage` holds the inserted and updated rows and
+    `{table_name}__deleted` the keys of deleted ones. It runs as a single
+    `postgres_execute` call, i.e. one transaction, so readers only ever see
+    the old or the new rows.
+    """
+    stage_name = f"{table_name}__stage"
+    deleted_name = f"{table_name}__deleted"
+    key = ", ".join(f'"{column}"' for column in primary_key)
+    updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in primary_key)
+    key_match = " AND ".join(f'deleted."{column}" = target."{column}"' for column in primary_key)
+
+    # Rows are still compared, on the first load every row is an insert.
+    # Compared as text, json columns have no equality operator
+    on_conflict = (
+        f"DO UPDATE SET {updates} WHERE ({table_name}.*)::text IS DISTINCT FROM (EXCLUDED.*)::text"
+        if updates else "DO NOTHING"
+    )
+    return f"""
+        INSERT INTO {table_name} SELECT * FROM {stage_name}
+        ON CONFLICT ({key}) {on_conflict};
+        DELETE FROM {table_name} AS target USING {deleted_name} AS deleted WHERE {key_match};
+        DROP TABLE {stage_name}, {deleted_name};
+    """
+
+
+def upsert_to_postgres(conn, profiler: SqlProfiler | None = None):
+    """Apply the changesets (see `compute_changesets`) to the existing Postgres tables instead of replacing them.
+
+    The changed rows of each table are copied into an unlogged
+    `<table>__stage` table shaped like the target and the deleted keys into
+    `<table>__deleted`, then merged on the primary key (see
+    `upsert_table_sql`). The targets keep their indexes and grants and never
+    disappear, and unchanged rows are not even sent. A column change upstream
+    needs a `replace` load first.
+    """
+    if profiler is None:
+        profiler = SqlProfiler("load")
+
+    for table_name, primary_key in POSTGRES_PRIMARY_KEYS.items():
+        start_time = time.time()
+        key = ", ".join(primary_key)
+        counts = dict(conn.execute(f"SELECT _change, COUNT(*) FROM sync.{table_name}_changes GROUP BY ALL").fetchall())
+        if not counts:
+            print(f"No changes for {table_name}")
+            continue
+
+        columns = [row[0] for row in conn.execute(f"DESCRIBE {table_name}").fetchall()]
+        profiler.execute(conn, f"""CALL postgres_execute('postgres_db', '
+            DROP TABLE IF EXISTS {table_name}__stage, {table_name}__deleted;
+            CREATE UNLOGGED TABLE {table_name}__stage (LIKE {table_name});
+            CREATE UNLOGGED TABLE {table_name}__deleted AS SELECT {key} FROM {table_name} WITH NO DATA
+        ')""", f"upsert {table_name} create stage", [f"{table_name}__stage", f"{table_name}__deleted"])
+        conn.execute("CALL pg_clear_cache()")
+        profiler.execute(conn, f"""
+            INSERT INTO postgres_db.{table_name}__stage BY NAME
+            SELECT {table_name}.* FROM {table_name}
+            JOIN sync.{table_name}_changes AS changes USING ({key})
+            WHERE changes._change <> 'delete'
+        """, f"upsert {table_name} copy changed", [f"{table_name}__stage"])
+        profiler.execute(conn, f"""
+            INSERT INTO postgres_db.{table_name}__deleted BY NAME
+            SELECT {key} FROM sync.{table_name}_changes WHERE _change = 'delete'
+        """, f"upsert {table_name} copy deleted", [f"{table_name}__deleted"])
+
+        merge_sql = upsert_table_sql(table_name, primary_key, columns).replace("'", "''")
+        profiler.execute(
+            conn, f"CALL postgres_execute('postgres_db', '{merge_sql}')", f"upsert {table_name} merge", [table_name],
+        )
+        print(
+            f"Upserted {table_name}: {counts.get('insert', 0):,} inserted, {counts.get('update', 0):,} updated, "
+            f"{counts.get('delete', 0):,} deleted in {time.time() - start_time:.2f}s"
+        )
+
+    conn.execute("CALL pg_clear_cache()")
+
+
+# Concurrent statements in a replace load, each on its own DuckDB cursor and
+# so its own pooled Postgres connection
+LOAD_WORKERS = 4
+
+POSTGRES_EXECUTE_PATTERN = re.compile(r"postgres_execute\(\s*'\w+'\s*,\s*'((?:[^']|'')*)'", re.IGNORECASE)
+POSTGRES_TABLE_PATTERN = re.compile(r"\b(?:ALTER\s+TABLE|ON)\s+" + SQL_IDENTIFIER, re.IGNORECASE)
+
+
+def load_statement(statement: Dict[str, Any], tables: set) -> Dict[str, Any]:
+    """Describe a load/load_tables.sql statement for `run_sql_dag` in terms of the Postgres tables it touches.
+
+    `postgres_db.<table>` and the DuckDB `<table>` it's copied from count as
+    the same table, and the SQL inside `postgres_execute` is looked into. A
+    statement naming no table (e.g. `pg_clear_cache()`) is made to write all
+    of `tables`, so it waits for everything before it and everything after
+    waits for it.
+    """
+    code = re.sub(r"--[^\n]*", "", statement["sql"])
+    writes = {table.split(".")[-1] for table in statement["writes"]}
+    for postgres_sql in POSTGRES_EXECUTE_PATTERN.findall(code):
+        writes |= {table.lower() for table in POSTGRES_TABLE_PATTERN.findall(postgres_sql.replace("''", "'"))}
+    if not writes:
+        writes = set(tables)
+    return {**statement, "writes": writes, "reads": set()}
+
+
+SHADOW_SUFFIX = "__shadow"
+
+
+def swap_shadow_tables_sql(tables: List[str], indexes: List[str]) -> str:
+    """Postgres SQL swapping every `<table>__shadow` in for `<table>`, for one `postgres_execute` call.
+
+    The current tables are renamed out of the way, the shadows renamed into
+    place and the old tables dropped, and then `indexes` (on the shadows)
+    lose their `__shadow` suffix, which also renames primary key
+    constraints. Sent as one string it runs as a single transaction, so
+    readers see either all of the old tables or all of the new ones.
+    """
+    statements = []
+    for table in tables:
+        statements += [
+            f"DROP TABLE IF EXISTS {table}__old",
+            f"ALTER TABLE IF EXISTS {table} RENAME TO {table}__old",
+            f"ALTER TABLE {table}{SHADOW_SUFFIX} RENAME TO {table}",
+        ]
+    statements += [f"DROP TABLE IF EXISTS {table}__old" for table in tables]
+    statements += [f"ALTER INDEX {index} RENAME TO {index.replace(SHADOW_SUFFIX, '')}" for index in indexes]
+    return ";\n".join(statements)
+
+
+def swap_shadow_tables(conn, tables: List[str], profiler: SqlProfiler | None = None):
+    """Swap the shadow tables a replace load built in for the live ones (see `swap_shadow_tables_sql`)."""
+    if profiler is None:
+        profiler = SqlProfiler("load")
+    shadows = ", ".join(f"''{table}{SHADOW_SUFFIX}''" for table in tables)
+    indexes = [row[0] for row in conn.execute(f"""
+        SELECT indexname FROM postgres_query('postgres_db', '
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename IN ({shadows})
+        ')
+    """).fetchall()]
+    swap_sql = swap_shadow_tables_sql(tables, indexes).replace("'", "''")
+    profiler.execute(conn, f"CALL postgres_execute('postgres_db', '{swap_sql}')", "swap shadow tables", tables)
+    conn.execute("CALL pg_clear_cache()")
+
+
+def load_to_postgres(
+    duckdb_path: str = "data/all.duckdb", load_sql_path: str = "load/load_tables.sql", mode: str = "replace",
+    explain: bool = False, profile_dir: str | None = "data/profiles", max_workers: int = LOAD_WORKERS,
+):
+    """Upload the transformed DuckDB tables to PostgreSQL.
+
+    `replace` rebuilds every table with `load_sql_path`, up to `max_workers`
+    statements at a time (see `load_statement`), so the big task tables copy
+    and index in parallel. The postgres extension streams each `CREATE TABLE
+    ... AS` to Postgres with binary `COPY ... FROM STDIN`. The tables are
+    built as shadows and swapped in together at the end
+    (`swap_shadow_tables`), a failed load leaves the live tables alone. `upsert` applies
+    the transform's changesets to the existing tables (see
+    `upsert_to_postgres`), falling back to `replace` while any of them is
+    missing, e.g. on the first load. Either way the row hashes are committed
+    afterwards. Each statement is profiled into `profile_dir` (see
+    `SqlProfiler`).
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unknown load mode {mode!r}, expected one of {LOAD_MODES}")
+
+    # Connect to DuckDB with PostgreSQL setup
     conn = duckdb.connect(duckdb_path)
 
     # Setup PostgreSQL connection
@@ -372,17 +2542,429 @@ def run_sql_transforms(
     conn.execute("INSTALL postgres")
     conn.execute("LOAD postgres")
     conn.execute("ATTACH '' AS postgres_db (TYPE postgres)")
+    profiler = SqlProfiler("load", explain=explain)
 
     try:
-        load_json_data(conn, raw_data_dir)
-        execute_sql_models(conn, models_dir)
-        if output_dir:
-            export_transformed_tables(conn, output_dir)
-        print("Transformation completed successfully")
-
+        if mode == "upsert":
+            missing = [table for table in POSTGRES_PRIMARY_KEYS if not postgres_table_exists(conn, table)]
+            if missing:
+                print(f"Tables missing from Postgres ({', '.join(missing)}), replacing all tables instead")
+                mode = "replace"
+            elif not all(sync_table_exists(conn, f"{table}_changes") for table in POSTGRES_PRIMARY_KEYS):
+                print("No changesets yet (the transform computes them), replacing all tables instead")
+                mode = "replace"
+
+        if mode == "upsert":
+            print("Upserting tables to PostgreSQL...")
+            upsert_to_postgres(conn, profiler)
+            commit_row_hashes(conn)
+            print("Load completed successfully")
+        # Execute load SQL file
+        elif os.path.exists(load_sql_path):
+            print(f"Loading tables to PostgreSQL ({max_workers} at a time)...")
+            start_time = time.time()
+            statements = sql_file_statements(conn, load_sql_path)
+            tables = set().union(*(statement["writes"] for statement in statements))
+            tables = {table.split(".")[-1] for table in tables}
+            statements = run_sql_dag(
+                conn, [load_statement(statement, tables) for statement in statements], max_workers, profiler,
+            )
+            failed = [statement["name"] for statement in statements if statement["status"] != "done"]
+            if failed:
+                raise RuntimeError(f"{len(failed)} load statements failed or were skipped: {', '.join(failed)}")
+            swap_shadow_tables(
+                conn, sorted(table[:-len(SHADOW_SUFFIX)] for table in tables if table.endswith(SHADOW_SUFFIX)), profiler,
+            )
+
+            elapsed = time.time() - start_time
+            rows = sum(record["rows"] or 0 for record in profiler.statements)
+            print(f"Copied {rows:,} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/s)")
+            commit_row_hashes(conn)
+            print("Load completed successfully")
+        else:
+            print(f"Load SQL file not found: {load_sql_path}")
     except Exception as e:
-        print(f"Transformation failed: {e}")
+        print(f"Load failed: {e}")
         raise
     finally:
         conn.close()
+        if profile_dir:
+            profiler.save(profile_dir)
+
+
+# Stage retries in `watch`: attempts per stage and the backoff between them
+STAGE_RETRIES = 3
+STAGE_BACKOFF_BASE = 30.0
+STAGE_BACKOFF_MAX = 600.0
+
+
+@contextlib.contextmanager
+def run_lock(lock_path: str = "data/etl.lock"):
+    """Hold an exclusive `flock` on `lock_path` while the block runs.
+
+    Yields False straight away (without waiting) if another process holds
+    it. The lock goes with the process, so a crashed run never leaves it
+    stuck.
+    """
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_with_retries(
+    name: str, stage, retries: int = STAGE_RETRIES,
+    backoff_base: float = STAGE_BACKOFF_BASE, backoff_max: float = STAGE_BACKOFF_MAX, retry_stage=None,
+):
+    """Call `stage()` up to `retries` times with exponential backoff, returning `(its result, attempts)`.
+
+    Attempts after the first call `retry_stage()` instead if given, e.g. an
+    extract resuming from the checkpoint the failed attempt left.
+    """
+    for attempt in range(1, retries + 1):
+        try:
+            return (stage if attempt == 1 or retry_stage is None else retry_stage)(), attempt
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = min(backoff_base * 2 ** (attempt - 1), backoff_max)
+            print(f"{name} failed ({e}), attempt {attempt}/{retries}, retrying in {delay:.0f}s")
+            time.sleep(delay)
+
+
+def profile_rows(profile_dir: str, stage: str) -> int | None:
+    """Rows affected by a stage's statements, from the report `SqlProfiler.save` left in `profile_dir`."""
+    report_path = os.path.join(profile_dir, f"{stage}.json")
+    if not os.path.exists(report_path):
+        return None
+    with open(report_path) as f:
+        return sum(statement["rows"] or 0 for statement in json.load(f)["statements"])
+
+
+def fingerprint(inputs: Any) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def sql_files_fingerprint(*sql_dirs: str) -> Dict[str, str]:
+    """Content hash of every .sql file in `sql_dirs`."""
+    hashes = {}
+    for sql_dir in sql_dirs:
+        for sql_path in sorted(glob.glob(os.path.join(sql_dir, "*.sql"))):
+            with open(sql_path, "rb") as f:
+                hashes[sql_path] = hashlib.sha256(f.read()).hexdigest()
+    return hashes
 
+
+def transform_fingerprint(
+    raw_data_dir: str, models_dir: str = "models", transform_dir: str = "transform", **options,
+) -> str:
+    """Fingerprint of what a transform reads: the raw files (path, size, mtime), the SQL and `options`."""
+    raw_files = []
+    for table_pattern in RAW_TABLE_VIEWS:
+        for path in raw_batch_files(raw_data_dir, table_pattern):
+            stat = os.stat(path)
+            raw_files.append([path, stat.st_size, stat.st_mtime_ns])
+    return fingerprint({"raw": raw_files, "sql": sql_files_fingerprint(models_dir, transform_dir), **options})
+
+
+def load_fingerprint(duckdb_path: str, load_sql_path: str = "load/load_tables.sql", **options) -> str | None:
+    """Fingerprint of what a load would push: every table's row hashes (from the transform), the load SQL and `options`.
+
+    None until the transform has computed row hashes for every table.
+    """
+    if not os.path.exists(duckdb_path):
+        return None
+    conn = duckdb.connect(duckdb_path, read_only=True)
+    try:
+        tables = {}
+        for table_name in POSTGRES_PRIMARY_KEYS:
+            if not sync_table_exists(conn, f"{table_name}_pending"):
+                return None
+            tables[table_name] = conn.execute(
+                f"SELECT COUNT(*), bit_xor(row_hash)::VARCHAR FROM sync.{table_name}_pending"
+            ).fetchone()
+    finally:
+        conn.close()
+    return fingerprint({"tables": tables, "sql": sql_files_fingerprint(os.path.dirname(load_sql_path)), **options})
+
+
+def stage_unchanged(cache_path: str, stage: str, stage_fingerprint: str | None) -> bool:
+    """Whether `stage` last completed with the same inputs (see `save_stage_fingerprint`)."""
+    if stage_fingerprint is None or not os.path.exists(cache_path):
+        return False
+    with open(cache_path) as f:
+        return json.load(f).get(stage, {}).get("fingerprint") == stage_fingerprint
+
+
+def save_stage_fingerprint(cache_path: str, stage: str, stage_fingerprint: str | None):
+    """Record the inputs `stage` just completed with, so an identical rerun can be skipped."""
+    if stage_fingerprint is None:
+        return
+    update_stage_cache(cache_path, stage, {"fingerprint": stage_fingerprint, "completed_at": time.time()})
+
+
+def forget_stage_fingerprint(cache_path: str, stage: str):
+    """Drop what `stage` last completed with before it runs again, so a run that fails part way is never skipped."""
+    update_stage_cache(cache_path, stage, None)
+
+
+def update_stage_cache(cache_path: str, stage: str, entry: Dict[str, Any] | None):
+    """Set (or with None remove) a stage's entry in the stage cache, atomically."""
+    cache = {}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            cache = json.load(f)
+    if entry is None:
+        if stage not in cache:
+            return
+        del cache[stage]
+    else:
+        cache[stage] = entry
+    directory = os.path.dirname(cache_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(f"{cache_path}.tmp", "w") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(f"{cache_path}.tmp", cache_path)
+
+
+# DynamoDB Streams: how many records to ask each shard for at a time, and how
+# long to sleep between polls once every shard is caught up
+STREAM_RECORDS_LIMIT = 1000
+STREAM_POLL_INTERVAL = 1.0
+# Seconds before a micro-batch is tried again, while another run holds the
+# etl lock or after applying it failed
+STREAM_RETRY_INTERVAL = 15.0
+
+
+def dynamodb_streams_client():
+    """Low-level DynamoDB Streams client used by `StreamConsumer` (bench.py swaps in a local stand-in)."""
+    return boto3.client("dynamodbstreams")
+
+
+class StreamCheckpoint:
+    """How far each shard of each table's stream has been applied, so a restarted consumer resumes there.
+
+    Positions are only saved once the batch holding the records up to them
+    has been transformed and loaded (see `StreamConsumer.commit`).
+    """
+
+    def __init__(self, path: str, tables: Dict[str, Any] | None = None):
+        self.path = path
+        self.tables = tables or {}
+
+    @classmethod
+    def load(cls, path: str) -> "StreamCheckpoint":
+        if not os.path.exists(path):
+            print(f"No stream checkpoint at {path}, reading the streams from their oldest records")
+            return cls(path)
+        with open(path, "r") as f:
+            return cls(path, json.load(f)["tables"])
+
+    def shards(self, table_name: str, stream_arn: str) -> Dict[str, Any]:
+        """The shard positions of a table's stream, reset if the table has a new stream."""
+        table = self.tables.get(table_name)
+        if table is None or table["stream_arn"] != stream_arn:
+            if table is not None:
+                print(f"{table_name} has a new stream, reading it from its oldest records")
+            table = self.tables[table_name] = {"stream_arn": stream_arn, "shards": {}}
+        return table["shards"]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"tables": self.tables}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class StreamConsumer:
+    """Read the DynamoDB Streams of a set of tables, in micro-batches.
+
+    Every shard is read from its checkpointed sequence number (or its oldest
+    record), a child shard only once its parent is finished so each item's
+    changes come out in order. `poll` gathers records until it has
+    `max_records` or `max_seconds` pass; `commit` then saves how far they go.
+    """
+
+    def __init__(self, table_names: List[str], checkpoint_path: str, client=None):
+        self.client = client or dynamodb_streams_client()
+        self.checkpoint = StreamCheckpoint.load(checkpoint_path)
+        self.streams = {table_name: self.stream_arn(table_name) for table_name in table_names}
+        self.iterators = {}
+        # Positions read but not committed yet, by (table, shard)
+        self.pending = {}
+
+    def stream_arn(self, table_name: str) -> str:
+        # A call cycle REMOVE only has its call_id in the old image, so NEW_IMAGE
+        # streams would lose deletes while their positions were still committed
+        table = dynamodb_client().describe_table(TableName=table_name)["Table"]
+        view_type = table.get("StreamSpecification", {}).get("StreamViewType")
+        if not table.get("LatestStreamArn") or view_type != "NEW_AND_OLD_IMAGES":
+            raise RuntimeError(f"{table_name} needs a stream with NEW_AND_OLD_IMAGES (has {view_type})")
+        return table["LatestStreamArn"]
+
+    def list_shards(self, stream_arn: str) -> List[Dict[str, Any]]:
+        shards, start = [], None
+        while True:
+            kwargs = {"StreamArn": stream_arn}
+            if start:
+                kwargs["ExclusiveStartShardId"] = start
+            description = self.client.describe_stream(**kwargs)["StreamDescription"]
+            shards.extend(description["Shards"])
+            start = description.get("LastEvaluatedShardId")
+            if not start:
+                return shards
+
+    def position(self, table_name: str, shard_id: str) -> Dict[str, Any]:
+        committed = self.checkpoint.shards(table_name, self.streams[table_name]).get(shard_id, {})
+        return self.pending.get((table_name, shard_id), committed)
+
+    def shard_iterator(self, table_name: str, shard_id: str) -> str | None:
+        stream_arn = self.streams[table_name]
+        sequence_number = self.position(table_name, shard_id).get("sequence_number")
+        if sequence_number:
+            try:
+                return self.client.get_shard_iterator(
+                    StreamArn=stream_arn, ShardId=shard_id,
+                    ShardIteratorType="AFTER_SEQUENCE_NUMBER", SequenceNumber=sequence_number,
+                )["ShardIterator"]
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "TrimmedDataAccessException":
+                    raise
+                print(f"Warning: {table_name} shard {shard_id} was trimmed past the checkpoint, changes were missed")
+        return self.client.get_shard_iterator(
+            StreamArn=stream_arn, ShardId=shard_id, ShardIteratorType="TRIM_HORIZON",
+        ).get("ShardIterator")
+
+    def read_shards(self, table_name: str, limit: int) -> List[Dict[str, Any]]:
+        """One round of `get_records` over the table's readable shards."""
+        records = []
+        shards = self.list_shards(self.streams[table_name])
+        shard_ids = {shard["ShardId"] for shard in shards}
+        for shard in shards:
+            shard_id = shard["ShardId"]
+            parent = shard.get("ParentShardId")
+            if self.position(table_name, shard_id).get("finished"):
+                continue
+            if parent in shard_ids and not self.position(table_name, parent).get("finished"):
+                continue
+            if len(records) >= limit:
+                break
+
+            key = (table_name, shard_id)
+            if key not in self.iterators:
+                self.iterators[key] = self.shard_iterator(table_name, shard_id)
+            if self.iterators[key] is None:
+                del self.iterators[key]
+                self.pending[key] = {**self.position(table_name, shard_id), "finished": True}
+                continue
+            try:
+                response = self.client.get_records(
+                    ShardIterator=self.iterators[key], Limit=min(STREAM_RECORDS_LIMIT, limit - len(records)),
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in {"ExpiredIteratorException", *THROTTLING_ERRORS}:
+                    raise
+                # Fetched again from the position next round
+                del self.iterators[key]
+                continue
+
+            position = dict(self.position(table_name, shard_id))
+            for record in response["Records"]:
+                records.append({**record, "table_name": table_name})
+                position["sequence_number"] = record["dynamodb"]["SequenceNumber"]
+            self.iterators[key] = response.get("NextShardIterator")
+            if self.iterators[key] is None:
+                position["finished"] = True
+                del self.iterators[key]
+            self.pending[key] = position
+        return records
+
+    def poll(self, max_records: int = 1000, max_seconds: float = 5.0) -> List[Dict[str, Any]]:
+        """Records from every table's stream, up to `max_records` or until `max_seconds` pass."""
+        deadline = time.monotonic() + max_seconds
+        records = []
+        while len(records) < max_records:
+            before = len(records)
+            for table_name in self.streams:
+                records.extend(self.read_shards(table_name, max_records - len(records)))
+            if time.monotonic() >= deadline:
+                break
+            if len(records) == before:
+                time.sleep(min(STREAM_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+        return records
+
+    def commit(self):
+        """Save the positions of everything `poll` returned, once it has been applied."""
+        for (table_name, shard_id), position in self.pending.items():
+            self.checkpoint.shards(table_name, self.streams[table_name])[shard_id] = position
+        self.checkpoint.save()
+        self.pending = {}
+
+
+def stream_record_key(record: Dict[str, Any]) -> str:
+    return json.dumps(record["dynamodb"]["Keys"], sort_keys=True)
+
+
+def apply_stream_records(
+    records: List[Dict[str, Any]],
+    stream_dir: str = "data/stream",
+    duckdb_path: str = "data/all.duckdb",
+    load_mode: str | None = "upsert",
+    changes_dir: str | None = "data/changes",
+    profile_dir: str | None = "data/profiles",
+):
+    """Merge a micro-batch of stream records into DuckDB with the incremental transform, then load it.
+
+    Only the last record for each item counts. INSERT and MODIFY images are
+    written to `stream_dir` as a delta, like `dump_table_data` does for an
+    incremental extract. REMOVE deletes a store or call cycle and its rows;
+    tasks are never deleted (see README), so their REMOVEs are ignored.
+    `load_mode` None skips the load.
+    """
+    latest = {}
+    for record in records:
+        latest[(record["table_name"], stream_record_key(record))] = record
+
+    clear_raw_batches(stream_dir)
+    items, removed, ignored = {}, {}, 0
+    for (table_name, _), record in latest.items():
+        if record["eventName"] != "REMOVE":
+            items.setdefault(table_name, []).append(decode_item(record["dynamodb"]["NewImage"]))
+            continue
+        view_name = RAW_TABLE_VIEWS.get(table_name)
+        if view_name not in INCREMENTAL_REPLACED_TABLES:
+            ignored += 1
+            continue
+        image = decode_item({**record["dynamodb"]["Keys"], **record["dynamodb"].get("OldImage", {})})
+        _, raw_column = next(iter(INCREMENTAL_REPLACED_TABLES[view_name].values()))
+        if raw_column not in image:
+            print(f"Warning: can't delete {table_name} item {image}, the stream has no {raw_column} for it")
+            continue
+        removed.setdefault(view_name, []).append(str(image[raw_column]))
+
+    for table_name, table_items in items.items():
+        save_table_data_batch(table_name, table_items, 0, output_dir=stream_dir, raw_format="ndjson")
+    print(
+        f"Applying {len(records):,} stream records: {sum(map(len, items.values())):,} items changed, "
+        f"{sum(map(len, removed.values())):,} removed, {ignored:,} task removals ignored"
+    )
+
+    run_sql_transforms(
+        raw_data_dir=stream_dir, output_dir=None, duckdb_path=duckdb_path, incremental=True,
+        changes_dir=changes_dir, profile_dir=profile_dir, removed=removed,
+    )
+    if load_mode:
+        load_to_postgres(duckdb_path, mode=load_mode, profile_dir=profile_dir)
@@ -0,0 +1,2 @@
+-- Roles load_tables.sql grants to, for the scratch benchmark database
+CREATE ROLE photo_downloader;
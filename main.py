@@ -1,8 +1,18 @@
+from enum import Enum
+import json
 import os
-from time import sleep
+from time import monotonic, sleep, time
+from typing import Annotated
 import typer
 from dotenv import load_dotenv
-from dynamo_utils import print_table_indexes, dump_table_data, save_table_data, run_sql_transforms, sync_tables_to_postgres
+from dynamo_utils import (
+    print_table_indexes, dump_tables_data, save_table_data, run_sql_transforms, sync_tables_to_postgres,
+    load_watermarks, commit_watermarks, clear_raw_batches, load_to_postgres, report_schema_drift, RAW_FORMATS, LOAD_MODES, EXPORT_MODES,
+    LOAD_WORKERS, StreamConsumer, apply_stream_records, STREAM_RETRY_INTERVAL, STAGE_RETRIES, STAGE_BACKOFF_BASE, STAGE_BACKOFF_MAX, run_lock, run_with_retries, profile_rows,
+    transform_fingerprint, load_fingerprint, stage_unchanged, save_stage_fingerprint, forget_stage_fingerprint, fingerprint, senior_rep_usernames,
+    dump_recent_tasks, RECENT_TASKS_INDEX, extract_to_duckdb, TRANSFORM_CHUNK_FILES, new_raw_run, unpublished_raw_run,
+    publish_raw_run, prune_raw_runs, RAW_KEEP_RUNS, RAW_RUNS_DIR,
+)
 
 load_dotenv()
 
@@ -10,7 +20,17 @@ app = typer.Typer()
 
 # Directory constants
 RAW_DATA_DIR = "data/raw"
+DELTA_DATA_DIR = "data/delta"
 DUCKDB_PATH = "data/all.duckdb"
+CHANGES_DATA_DIR = "data/changes"
+PROFILE_DIR = "data/profiles"
+LAKE_DATA_DIR = "data/lake"
+STREAM_DATA_DIR = "data/stream"
+STREAM_CHECKPOINT_PATH = "data/stream_checkpoint.json"
+LOCK_PATH = "data/etl.lock"
+WATCH_STATUS_PATH = "data/watch_status.json"
+STAGE_CACHE_PATH = "data/stage_cache.json"
+WATERMARKS_PATH = "data/watermarks.json"
 
 TABLE_DYNAMO_TASKS = "GforceTasks-notow4pikzczbpjg42gytvbuci-production"
 TABLE_DYNAMO_STORE = "GforceStore-notow4pikzczbpjg42gytvbuci-production"
@@ -18,64 +38,529 @@ TABLE_DYNAMO_CALLS = "GforceCallCycle-notow4pikzczbpjg42gytvbuci-production"
 dynamo_tables = [TABLE_DYNAMO_STORE, TABLE_DYNAMO_CALLS, TABLE_DYNAMO_TASKS]
 
 
+IncrementalOption = Annotated[
+    bool,
+    typer.Option(
+        "--incremental",
+        help=f"Only extract/transform items changed since the last watermark ({DELTA_DATA_DIR})",
+    ),
+]
+
+RawFormat = Enum("RawFormat", {raw_format: raw_format for raw_format in RAW_FORMATS}, type=str)
+RawFormatOption = Annotated[
+    RawFormat,
+    typer.Option(
+        "--raw-format",
+        help="Format of the raw batch files, ndjson variants are compact and faster to ingest",
+    ),
+]
+
+MaxWorkersOption = Annotated[
+    int,
+    typer.Option(
+        "--max-workers",
+        envvar="EXTRACT_MAX_WORKERS",
+        help="Scan workers shared by all tables, each table's segment count is sized from the table",
+    ),
+]
+
+ReadCapacityOption = Annotated[
+    float | None,
+    typer.Option(
+        "--read-capacity",
+        envvar="EXTRACT_READ_CAPACITY",
+        help="Read capacity units per second to pace each table scan to (default: the table's provisioned RCU)",
+    ),
+]
+
+ExplainOption = Annotated[
+    bool,
+    typer.Option("--explain", help=f"Keep each statement's EXPLAIN ANALYZE plan in the profile report ({PROFILE_DIR})"),
+]
+
+LoadMode = Enum("LoadMode", {mode: mode for mode in LOAD_MODES}, type=str)
+LoadModeOption = Annotated[
+    LoadMode,
+    typer.Option(
+        "--load-mode",
+        help="replace recreates the Postgres tables, upsert merges only the changed rows into them",
+    ),
+]
+
+ExportMode = Enum("ExportMode", {mode: mode for mode in EXPORT_MODES}, type=str)
+ExportModeOption = Annotated[
+    ExportMode,
+    typer.Option(
+        "--export",
+        help=f"files writes one Parquet file per table, lake a partitioned Parquet lake ({LAKE_DATA_DIR}) "
+        "that only rewrites changed partitions",
+    ),
+]
+
+RecentDaysOption = Annotated[
+    int | None,
+    typer.Option(
+        "--recent-days",
+        help=f"Only extract the tasks dated in the last N days (or later), queried per senior rep off "
+        f"{RECENT_TASKS_INDEX} into {DELTA_DATA_DIR}, instead of scanning the tables",
+    ),
+]
+
+ChunkFilesOption = Annotated[
+    int | None,
+    typer.Option(
+        "--chunk-files",
+        envvar="TRANSFORM_CHUNK_FILES",
+        help=f"Transform that many raw batch files per table at a time (e.g. {TRANSFORM_CHUNK_FILES}) "
+        "instead of all of them at once, so memory doesn't grow with the tables",
+    ),
+]
+
+MemoryLimitOption = Annotated[
+    str | None,
+    typer.Option(
+        "--memory-limit",
+        envvar="TRANSFORM_MEMORY_LIMIT",
+        help="Memory DuckDB's buffer manager may use in the transform, e.g. 1GB; the rest spills to disk "
+        "(default: 80% of RAM). The process peaks somewhat above it",
+    ),
+]
+
+TempDirOption = Annotated[
+    str | None,
+    typer.Option(
+        "--temp-dir",
+        envvar="TRANSFORM_TEMP_DIR",
+        help=f"Where DuckDB spills to (default: {DUCKDB_PATH}.tmp)",
+    ),
+]
+
+KeepRunsOption = Annotated[
+    int,
+    typer.Option(
+        "--keep-runs",
+        min=1,
+        envvar="EXTRACT_KEEP_RUNS",
+        help=f"Published full extracts to keep in {RAW_DATA_DIR}/{RAW_RUNS_DIR}, older ones are deleted",
+    ),
+]
+
+ForceOption = Annotated[
+    bool,
+    typer.Option("--force", help=f"Run the transform and load even if their inputs haven't changed ({STAGE_CACHE_PATH})"),
+]
+
+
 @app.command()
-def extract():
-    """Extract data from source."""
-    for table_name in dynamo_tables:
-        print(f"Extracting data from {table_name}...")
-        total_items = dump_table_data(table_name, max_workers=2)
-        print(f"Completed extraction for {table_name}: {total_items} items saved in batches\n")
+def extract(
+    incremental: IncrementalOption = False,
+    raw_format: RawFormatOption = RawFormat.ndjson,
+    max_workers: MaxWorkersOption = 8,
+    read_capacity: ReadCapacityOption = None,
+    resume: Annotated[
+        bool, typer.Option("--resume", help="Continue an interrupted extract from its checkpoint")
+    ] = False,
+    recent_days: RecentDaysOption = None,
+    keep_runs: KeepRunsOption = RAW_KEEP_RUNS,
+):
+    """Extract data from source.
+
+    A full extract writes to a run directory of its own in data/raw/runs and
+    is published for the transform once every table is done.
+    """
+    if recent_days is not None:
+        # The reps come from the last transform, so read them before anything else touches the delta
+        usernames = senior_rep_usernames(DUCKDB_PATH, recent_days)
+        clear_raw_batches(DELTA_DATA_DIR)
+        total_items = dump_recent_tasks(
+            TABLE_DYNAMO_TASKS, usernames, recent_days, max_workers=max_workers, output_dir=DELTA_DATA_DIR,
+            raw_format=raw_format.value, read_capacity=read_capacity,
+        )
+        print(f"Completed extraction of the last {recent_days} days of tasks: {total_items} items saved in batches")
+        print()
+        return {TABLE_DYNAMO_TASKS: total_items}
+
+    watermarks = {}
+    if incremental:
+        watermarks = load_watermarks(WATERMARKS_PATH)
+        if not resume:
+            clear_raw_batches(DELTA_DATA_DIR)
+        output_dir = DELTA_DATA_DIR
+    else:
+        output_dir = unpublished_raw_run(RAW_DATA_DIR) if resume else new_raw_run(RAW_DATA_DIR)
+
+    print(f"Extracting data from {len(dynamo_tables)} tables into {output_dir}...")
+    totals = dump_tables_data(
+        dynamo_tables,
+        max_workers=max_workers,
+        output_dir=output_dir,
+        since=watermarks if incremental else None,
+        raw_format=raw_format.value,
+        read_capacity=read_capacity,
+        resume=resume,
+    )
+    for table_name, total_items in totals.items():
+        print(f"Completed extraction for {table_name}: {total_items} items saved in batches")
+    if not incremental:
+        publish_raw_run(RAW_DATA_DIR, output_dir, totals)
+        prune_raw_runs(RAW_DATA_DIR, keep_runs)
+    print()
+    return totals
 
 
 @app.command()
-def transform():
-    """Transform the extracted data."""
-    run_sql_transforms(raw_data_dir=RAW_DATA_DIR, duckdb_path=DUCKDB_PATH)
+def transform(
+    incremental: IncrementalOption = False, explain: ExplainOption = False, export: ExportModeOption = ExportMode.files,
+    force: ForceOption = False, chunk_files: ChunkFilesOption = None, memory_limit: MemoryLimitOption = None,
+    temp_dir: TempDirOption = None,
+):
+    """Transform the extracted data, unless the raw files and SQL are the same as last time."""
+    raw_data_dir = DELTA_DATA_DIR if incremental else RAW_DATA_DIR
+    stage_fingerprint = transform_fingerprint(raw_data_dir, incremental=incremental, export=export.value)
+    unchanged = os.path.exists(DUCKDB_PATH) and stage_unchanged(STAGE_CACHE_PATH, "transform", stage_fingerprint)
+    if not force and unchanged:
+        print("Skipped transform: raw files and SQL unchanged since the last one (--force to run it anyway)")
+        return {}
+
+    forget_stage_fingerprint(STAGE_CACHE_PATH, "transform")
+    if incremental:
+        changes = run_sql_transforms(
+            raw_data_dir=DELTA_DATA_DIR, duckdb_path=DUCKDB_PATH, incremental=True, changes_dir=CHANGES_DATA_DIR,
+            explain=explain, profile_dir=PROFILE_DIR, export_mode=export.value, lake_dir=LAKE_DATA_DIR,
+            chunk_files=chunk_files, memory_limit=memory_limit, temp_dir=temp_dir,
+        )
+        commit_watermarks(DELTA_DATA_DIR, WATERMARKS_PATH)
+    else:
+        changes = run_sql_transforms(
+            raw_data_dir=RAW_DATA_DIR, duckdb_path=DUCKDB_PATH, changes_dir=CHANGES_DATA_DIR,
+            explain=explain, profile_dir=PROFILE_DIR, export_mode=export.value, lake_dir=LAKE_DATA_DIR,
+            chunk_files=chunk_files, memory_limit=memory_limit, temp_dir=temp_dir,
+        )
+    save_stage_fingerprint(STAGE_CACHE_PATH, "transform", stage_fingerprint)
+    return changes
 
 
 @app.command()
-def load():
-    """Load data into destination."""
-    import duckdb
-
-    # Connect to DuckDB with PostgreSQL setup
-    conn = duckdb.connect(DUCKDB_PATH)
-
-    # Setup PostgreSQL connection
-    # Requires environment variables: PGPASSWORD, PGHOST, PGPORT, PGUSER, PGDATABASE
-    conn.execute("INSTALL postgres")
-    conn.execute("LOAD postgres")
-    conn.execute("ATTACH '' AS postgres_db (TYPE postgres)")
-
-    try:
-        # Execute load SQL file
-        load_sql_path = "load/load_tables.sql"
-        if os.path.exists(load_sql_path):
-            print("Loading tables to PostgreSQL...")
-            with open(load_sql_path, "r") as f:
-                sql_content = f.read()
-            conn.execute(sql_content)
-            print("Load completed successfully")
+def load(
+    mode: Annotated[
+        LoadMode,
+        typer.Option("--mode", help="replace recreates the Postgres tables, upsert merges only the changed rows into them"),
+    ] = LoadMode.replace,
+    explain: ExplainOption = False,
+    workers: Annotated[
+        int,
+        typer.Option("--workers", envvar="LOAD_MAX_WORKERS", help="Tables copied to Postgres at once in a replace load"),
+    ] = LOAD_WORKERS,
+    force: ForceOption = False,
+):
+    """Load data into destination, unless the tables are the same as the last load pushed."""
+    stage_fingerprint = load_fingerprint(DUCKDB_PATH, mode=mode.value)
+    if not force and stage_unchanged(STAGE_CACHE_PATH, "load", stage_fingerprint):
+        print("Skipped load: the tables and load SQL are unchanged since the last load (--force to run it anyway)")
+        return
+
+    forget_stage_fingerprint(STAGE_CACHE_PATH, "load")
+    load_to_postgres(DUCKDB_PATH, mode=mode.value, explain=explain, profile_dir=PROFILE_DIR, max_workers=workers)
+    save_stage_fingerprint(STAGE_CACHE_PATH, "load", stage_fingerprint)
+
+@app.command()
+def etl(
+    incremental: IncrementalOption = False,
+    raw_format: RawFormatOption = RawFormat.ndjson,
+    max_workers: MaxWorkersOption = 8,
+    read_capacity: ReadCapacityOption = None,
+    load_mode: LoadModeOption = LoadMode.replace,
+    explain: ExplainOption = False,
+    export: ExportModeOption = ExportMode.files,
+    force: ForceOption = False,
+    recent_days: RecentDaysOption = None,
+    in_memory: Annotated[
+        bool,
+        typer.Option(
+            "--in-memory",
+            help="Scan straight into the transform's DuckDB as Arrow batches instead of through raw files "
+            "(needs pyarrow)",
+        ),
+    ] = False,
+    archive_raw: Annotated[
+        bool, typer.Option("--archive-raw", help="With --in-memory, still save the raw batch files")
+    ] = False,
+    chunk_files: ChunkFilesOption = None,
+    memory_limit: MemoryLimitOption = None,
+    temp_dir: TempDirOption = None,
+    keep_runs: KeepRunsOption = RAW_KEEP_RUNS,
+):
+    """Extract, transform and load.
+
+    With --in-memory the transform always runs (its input is the scan), so
+    --force only applies to the load; the options of a transform from raw
+    files (--recent-days, --chunk-files) can't be combined with it.
+    """
+    if in_memory and recent_days is not None:
+        raise typer.BadParameter("--recent-days can't be combined with --in-memory", param_hint="--recent-days")
+    if in_memory and chunk_files is not None:
+        raise typer.BadParameter("--chunk-files can't be combined with --in-memory", param_hint="--chunk-files")
+    if archive_raw and not in_memory:
+        raise typer.BadParameter("--archive-raw only applies to --in-memory", param_hint="--archive-raw")
+    with run_lock(LOCK_PATH) as locked:
+        if not locked:
+            print(f"Another run holds {LOCK_PATH}, not starting")
+            raise typer.Exit(code=1)
+        if in_memory:
+            in_memory_etl(
+                incremental=incremental, raw_format=raw_format, max_workers=max_workers, read_capacity=read_capacity,
+                explain=explain, export=export, archive_raw=archive_raw, memory_limit=memory_limit, temp_dir=temp_dir,
+                keep_runs=keep_runs,
+            )
+            load(mode=load_mode, explain=explain, force=force)
+            return
+        extract(
+            incremental=incremental, raw_format=raw_format, max_workers=max_workers, read_capacity=read_capacity,
+            recent_days=recent_days, keep_runs=keep_runs,
+        )
+        # A recent window is a delta, merged like an incremental extract's
+        transform(
+            incremental=incremental or recent_days is not None, explain=explain, export=export, force=force,
+            chunk_files=chunk_files, memory_limit=memory_limit, temp_dir=temp_dir,
+        )
+        load(mode=load_mode, explain=explain, force=force)
+
+
+def in_memory_etl(
+    incremental: bool, raw_format: RawFormat, max_workers: int, read_capacity: float | None, explain: bool,
+    export: ExportMode, archive_raw: bool, memory_limit: str | None = None, temp_dir: str | None = None,
+    keep_runs: int = RAW_KEEP_RUNS,
+):
+    """Extract and transform in one go, the scan pages going straight into DuckDB (see `extract_to_duckdb`).
+
+    An archived full extract is published like `extract`'s once the transform
+    is done, and recorded as the transform's input, so a `transform` of the
+    same raw files is skipped. Without the archive a later `transform` always
+    runs, as DuckDB no longer matches the raw files.
+    """
+    watermarks = load_watermarks(WATERMARKS_PATH) if incremental else None
+    if incremental:
+        raw_data_dir = DELTA_DATA_DIR
+        clear_raw_batches(raw_data_dir)
+    else:
+        raw_data_dir = new_raw_run(RAW_DATA_DIR) if archive_raw else RAW_DATA_DIR
+
+    print(f"Extracting data from {len(dynamo_tables)} tables straight into {DUCKDB_PATH}...")
+    forget_stage_fingerprint(STAGE_CACHE_PATH, "transform")
+    changes = run_sql_transforms(
+        duckdb_path=DUCKDB_PATH, incremental=incremental, changes_dir=CHANGES_DATA_DIR, explain=explain,
+        profile_dir=PROFILE_DIR, export_mode=export.value, lake_dir=LAKE_DATA_DIR, memory_limit=memory_limit,
+        temp_dir=temp_dir, load_raw=lambda conn, profiler: extract_to_duckdb(
+            conn, dynamo_tables, raw_data_dir, archive=archive_raw, raw_format=raw_format.value, profiler=profiler,
+            max_workers=max_workers, since=watermarks, read_capacity=read_capacity,
+        ),
+    )
+    if incremental:
+        commit_watermarks(DELTA_DATA_DIR, WATERMARKS_PATH)
+    elif archive_raw:
+        publish_raw_run(RAW_DATA_DIR, raw_data_dir)
+        prune_raw_runs(RAW_DATA_DIR, keep_runs)
+
+    if archive_raw:
+        stage_fingerprint = transform_fingerprint(
+            DELTA_DATA_DIR if incremental else RAW_DATA_DIR, incremental=incremental, export=export.value,
+        )
+    else:
+        stage_fingerprint = fingerprint({"in_memory": time(), "incremental": incremental, "export": export.value})
+    save_stage_fingerprint(STAGE_CACHE_PATH, "transform", stage_fingerprint)
+    return changes
+
+
+def save_watch_status(status: dict):
+    os.makedirs(os.path.dirname(WATCH_STATUS_PATH), exist_ok=True)
+    with open(f"{WATCH_STATUS_PATH}.tmp", "w") as f:
+        json.dump(status, f, indent=2)
+    os.replace(f"{WATCH_STATUS_PATH}.tmp", WATCH_STATUS_PATH)
+
+
+def watch_run(stages: dict, retries: int, retry_stages: dict | None = None) -> dict:
+    """Run the etl stages in order, each retried with backoff, and report how each went.
+
+    A stage in `retry_stages` is retried with that instead (see `run_with_retries`).
+    """
+    run = {"started_at": time(), "status": "running", "stages": {}, "changed_rows": 0}
+    for name, stage in stages.items():
+        start = monotonic()
+        try:
+            result, attempts = run_with_retries(name, stage, retries, retry_stage=(retry_stages or {}).get(name))
+        except Exception as e:
+            run["stages"][name] = {"seconds": monotonic() - start, "attempts": retries, "error": str(e)}
+            run["status"] = "failed"
+            print(f"{name} failed {retries} times, giving up on this run: {e}")
+            break
+
+        if name == "extract":
+            rows = sum(result.values())
         else:
-            print(f"Load SQL file not found: {load_sql_path}")
-    except Exception as e:
-        print(f"Load failed: {e}")
-        raise
-    finally:
-        conn.close()
+            rows = profile_rows(PROFILE_DIR, name)
+        if name == "transform":
+            run["changed_rows"] = sum(sum(counts.values()) for counts in result.values())
+        run["stages"][name] = {"seconds": monotonic() - start, "attempts": attempts, "rows": rows}
+    else:
+        run["status"] = "done"
+    run["finished_at"] = time()
+    run["seconds"] = run["finished_at"] - run["started_at"]
+    return run
+
 
 @app.command()
-def etl():
-    extract()
-    transform()
-    load()
+def watch(
+    incremental: IncrementalOption = False,
+    raw_format: RawFormatOption = RawFormat.ndjson,
+    max_workers: MaxWorkersOption = 8,
+    read_capacity: ReadCapacityOption = None,
+    load_mode: LoadModeOption = LoadMode.replace,
+    export: ExportModeOption = ExportMode.files,
+    interval: Annotated[float, typer.Option(help="Minutes between the starts of two runs")] = 60.0,
+    min_interval: Annotated[float, typer.Option(help="Shortest interval in minutes a large delta can bring it down to")] = 10.0,
+    large_delta: Annotated[int, typer.Option(help="Changed rows in a run above which the interval shrinks")] = 10_000,
+    retries: Annotated[int, typer.Option(help="Attempts per stage before a run is given up")] = STAGE_RETRIES,
+    recent_days: RecentDaysOption = None,
+    full_scan_hours: Annotated[
+        float, typer.Option(help="Hours between the full scans catching what the --recent-days windows miss")
+    ] = 24.0,
+    keep_runs: KeepRunsOption = RAW_KEEP_RUNS,
+):
+    """Run etl on a fixed cadence, more often while the deltas are large.
+
+    Runs start every --interval minutes however long they take; starts a run
+    overran are skipped. A run after a delta of more than --large-delta
+    changed rows comes sooner, down to --min-interval. Each stage is retried
+    with backoff (a scan resuming from its checkpoint), a run is skipped
+    while another process holds the etl lock, and the last run is reported
+    in data/watch_status.json.
+
+    With --recent-days runs only query the recent tasks, apart from a scan
+    (full, or incremental with --incremental) every --full-scan-hours.
+    """
+    recent = False
+    stages = {
+        "extract": lambda: extract(
+            incremental=incremental, raw_format=raw_format, max_workers=max_workers, read_capacity=read_capacity,
+            recent_days=recent_days if recent else None, keep_runs=keep_runs,
+        ),
+        "transform": lambda: transform(incremental=incremental or recent, export=export),
+        "load": lambda: load(mode=load_mode),
+    }
+    # A failed scan carries on from its checkpoint rather than starting over
+    # (a recent window has no checkpoint, so it's queried again)
+    retry_stages = {
+        "extract": lambda: extract(
+            incremental=incremental, raw_format=raw_format, max_workers=max_workers, read_capacity=read_capacity,
+            resume=True, keep_runs=keep_runs,
+        ),
+    }
+    status = {"pid": os.getpid(), "interval_seconds": interval * 60, "last_run": None}
+    last_full_scan = None
+    next_run = monotonic()
+    while True:
+        status["state"] = "waiting"
+        status["next_run_at"] = time() + max(next_run - monotonic(), 0)
+        save_watch_status(status)
+        sleep(max(next_run - monotonic(), 0))
+
+        scheduled = next_run
+        with run_lock(LOCK_PATH) as locked:
+            if locked:
+                recent = recent_days is not None and last_full_scan is not None and (
+                    monotonic() - last_full_scan < full_scan_hours * 60 * 60
+                )
+                status["state"] = "running"
+                save_watch_status(status)
+                status["last_run"] = watch_run(stages, retries, {} if recent else retry_stages)
+                status["last_run"]["extract"] = "recent" if recent else "scan"
+                if not recent and status["last_run"]["status"] == "done":
+                    last_full_scan = scheduled
+            else:
+                print(f"Another run holds {LOCK_PATH}, skipping this one")
+
+        run = status["last_run"]
+        if locked and run["status"] == "done" and run["changed_rows"] > large_delta:
+            status["interval_seconds"] = max(min_interval, interval * large_delta / run["changed_rows"]) * 60
+        elif locked and run["status"] == "done":
+            status["interval_seconds"] = interval * 60
+        if locked:
+            stages_summary = ", ".join(
+                f"{name} {stage['seconds']:.0f}s/{stage.get('rows') or 0:,} rows" for name, stage in run["stages"].items()
+            )
+            print(
+                f"Run ({run['extract']}) {run['status']} in {run['seconds']:.0f}s ({stages_summary}), "
+                f"next in {status['interval_seconds'] / 60:.0f} min"
+            )
+
+        next_run = scheduled + status["interval_seconds"]
+        skipped = 0
+        while next_run < monotonic():
+            next_run += status["interval_seconds"]
+            skipped += 1
+        if skipped:
+            print(f"The run overran, skipped {skipped} scheduled start(s)")
+
 
 @app.command()
-def watch():
-    WAIT_TIME = 1 * 60 * 60
+def stream(
+    batch_records: Annotated[int, typer.Option(help="Stream records per micro-batch at most")] = 1000,
+    batch_seconds: Annotated[float, typer.Option(help="Seconds to gather a micro-batch for at most")] = 5.0,
+    reconcile_hours: Annotated[
+        float, typer.Option(help="Hours between full etl runs catching anything the streams missed")
+    ] = 24.0,
+    load_mode: LoadModeOption = LoadMode.upsert,
+):
+    """Sync changes from the tables' DynamoDB Streams within seconds, with a periodic full etl to reconcile.
+
+    Each micro-batch is applied under the etl lock. While another run (e.g.
+    watch) holds it, or if applying the batch fails, the same batch is tried
+    again and nothing more is read from the streams. A failed reconcile is
+    retried with backoff like a `watch` stage, the streams carrying on
+    meanwhile.
+    """
+    consumer = StreamConsumer(dynamo_tables, STREAM_CHECKPOINT_PATH)
+    # Start from a full run unless a previous consumer left a checkpoint
+    next_reconcile = monotonic() + (reconcile_hours * 60 * 60 if consumer.checkpoint.tables else 0)
+    reconcile_failures = 0
+    records = []
     while True:
-        etl()
-        sleep(WAIT_TIME)
+        if monotonic() >= next_reconcile:
+            try:
+                etl(load_mode=load_mode)
+                reconcile_failures = 0
+                next_reconcile = monotonic() + reconcile_hours * 60 * 60
+            except typer.Exit:
+                print("Skipped reconciling, another run (e.g. watch) is doing it")
+                next_reconcile = monotonic() + reconcile_hours * 60 * 60
+            except Exception as e:
+                reconcile_failures += 1
+                delay = min(STAGE_BACKOFF_BASE * 2 ** (reconcile_failures - 1), STAGE_BACKOFF_MAX)
+                print(f"Reconciling failed ({e}), attempt {reconcile_failures}, retrying in {delay:.0f}s")
+                next_reconcile = monotonic() + delay
+
+        # A batch that couldn't be applied is kept, the shards only move on once it has been
+        if not records:
+            records = consumer.poll(max_records=batch_records, max_seconds=batch_seconds)
+        if records:
+            applied = False
+            with run_lock(LOCK_PATH) as locked:
+                if not locked:
+                    print(f"Another run holds {LOCK_PATH}, holding {len(records)} stream records until it's done")
+                else:
+                    try:
+                        apply_stream_records(
+                            records, STREAM_DATA_DIR, DUCKDB_PATH, load_mode=load_mode.value,
+                            changes_dir=CHANGES_DATA_DIR, profile_dir=PROFILE_DIR,
+                        )
+                        applied = True
+                    except Exception as e:
+                        print(f"Applying {len(records)} stream records failed, retrying in {STREAM_RETRY_INTERVAL:.0f}s: {e}")
+            if not applied:
+                sleep(STREAM_RETRY_INTERVAL)
+                continue
+        consumer.commit()
+        records = []
 
 
 @app.command()
@@ -84,5 +569,13 @@ def indexes():
     print_table_indexes(dynamo_tables)
 
 
+@app.command()
+def drift(incremental: IncrementalOption = False):
+    """Check every raw file against models/raw.sql; exits 1 if anything new or changed turns up."""
+    report = report_schema_drift(DELTA_DATA_DIR if incremental else RAW_DATA_DIR)
+    if any(report.values()):
+        raise typer.Exit(code=1)
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,28 @@
+import pytest
+
+import dynamo_utils
+import main
+from bench import LocalDynamoDB
+
+
+TASKS_TABLE = "GforceTasks-notow4pikzczbpjg42gytvbuci-production"
+
+
+@pytest.fixture
+def local_dynamodb(monkeypatch):
+    """The bench's DynamoDB stand-in serving `tasks` synthetic tasks (and a few stores and call cycles)."""
+    def serve(tasks: int = 200) -> LocalDynamoDB:
+        counts = dict(zip(dynamo_utils.RAW_TABLE_VIEWS, [50, tasks, 10]))
+        stand_in = LocalDynamoDB(counts)
+        monkeypatch.setattr(dynamo_utils, "dynamodb_client", lambda: stand_in)
+        return stand_in
+    return serve
+
+
+@pytest.fixture
+def data_dir(monkeypatch, tmp_path):
+    """Point every path of `main` under data/ at a temporary directory instead."""
+    for name, value in vars(main).copy().items():
+        if name.endswith(("_DIR", "_PATH")) and isinstance(value, str) and value.startswith("data/"):
+            monkeypatch.setattr(main, name, str(tmp_path / value))
+    return tmp_path / "data"
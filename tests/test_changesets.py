@@ -0,0 +1,41 @@
+import duckdb
+
+from dynamo_utils import commit_row_hashes, compute_changesets
+
+
+def test_compute_changesets(tmp_path):
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE tasks AS SELECT * FROM (VALUES ('t1', 'open'), ('t2', 'open'), ('t3', 'open')) AS t(id, status)")
+    conn.execute("CREATE TABLE task_photos AS SELECT * FROM (VALUES ('t1', 'a.jpg', 1), ('t1', 'b.jpg', 2)) AS t(task_uuid, photo_name, size)")
+
+    # Nothing loaded yet, so everything is an insert, only for the tables there are
+    assert compute_changesets(conn, changes_dir=None) == {
+        "task_photos": {"insert": 2, "update": 0, "delete": 0},
+        "tasks": {"insert": 3, "update": 0, "delete": 0},
+    }
+    commit_row_hashes(conn)
+    assert compute_changesets(conn, changes_dir=None)["tasks"] == {"insert": 0, "update": 0, "delete": 0}
+
+    conn.execute("UPDATE tasks SET status = 'done' WHERE id = 't1'")
+    conn.execute("DELETE FROM tasks WHERE id = 't2'")
+    conn.execute("INSERT INTO tasks VALUES ('t4', 'open')")
+    conn.execute("UPDATE task_photos SET size = 3 WHERE photo_name = 'b.jpg'")
+    changes_dir = tmp_path / "changes"
+    changes = compute_changesets(conn, changes_dir=str(changes_dir))
+    assert changes == {
+        "task_photos": {"insert": 0, "update": 1, "delete": 0},
+        "tasks": {"insert": 1, "update": 1, "delete": 1},
+    }
+    assert conn.execute(f"SELECT * FROM '{changes_dir}/tasks.parquet' ORDER BY id").fetchall() == [
+        ("t1", "update", "done"),
+        ("t2", "delete", None),
+        ("t4", "insert", "open"),
+    ]
+    assert conn.execute(f"SELECT * FROM '{changes_dir}/task_photos.parquet'").fetchall() == [
+        ("t1", "b.jpg", "update", 3),
+    ]
+
+    # A load that failed before committing gets the same changes again
+    assert compute_changesets(conn, changes_dir=None) == changes
+    commit_row_hashes(conn)
+    assert compute_changesets(conn, changes_dir=None)["tasks"] == {"insert": 0, "update": 0, "delete": 0}
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import dynamo_utils
+from conftest import TASKS_TABLE
+
+
+def raw_ids(output_dir):
+    ids = []
+    for path in dynamo_utils.glob_raw_files(str(output_dir), TASKS_TABLE):
+        with open(path) as f:
+            ids.extend(json.loads(line)["id"] for line in f)
+    return ids
+
+
+def test_resume_carries_on_from_the_checkpoint(local_dynamodb, monkeypatch, tmp_path):
+    # 500 tasks are 4 pages of a single segment, each page its own batch
+    stand_in = local_dynamodb(tasks=500)
+    scan = stand_in.scan
+    starts, fail = [], [True]
+
+    def failing_scan(**kwargs):
+        starts.append(kwargs.get("ExclusiveStartKey"))
+        if fail[0] and len(starts) == 3:
+            raise ValueError("connection reset")
+        return scan(**kwargs)
+    monkeypatch.setattr(stand_in, "scan", failing_scan)
+
+    with pytest.raises(RuntimeError, match="--resume"):
+        dynamo_utils.dump_tables_data([TASKS_TABLE], batch_size=100, output_dir=str(tmp_path))
+    checkpoint = json.loads((tmp_path / "checkpoint.json").read_text())["tables"][TASKS_TABLE]
+    segment = checkpoint["segment_state"]["0"]
+    # Two pages were written before the third failed, and the segment stops after the last of them
+    assert len(checkpoint["batches"]) == 2
+    assert segment["done"] is False
+    assert segment["last_key"] == {"position": {"N": str(segment["items"] - 1)}}
+
+    starts.clear()
+    fail[0] = False
+    items = dynamo_utils.dump_tables_data([TASKS_TABLE], batch_size=100, output_dir=str(tmp_path), resume=True)
+    # Only the pages after the checkpoint were read again, and every task is on disk once
+    assert starts[0] == segment["last_key"]
+    assert len(starts) == 2
+    assert items == {TASKS_TABLE: 500}
+    ids = raw_ids(tmp_path)
+    assert len(ids) == len(set(ids)) == 500
@@ -0,0 +1,33 @@
+import duckdb
+
+from dynamo_utils import RAW_TABLE_VIEWS, dump_tables_data, raw_file_chunks
+from test_in_memory import transform
+
+
+def test_raw_file_chunks(tmp_path):
+    for table_pattern, batches in zip(RAW_TABLE_VIEWS, [1, 5, 1]):
+        for number in range(batches):
+            (tmp_path / f"{table_pattern}_batch_{number:04d}.ndjson").write_text("{}\n")
+    chunks = raw_file_chunks(str(tmp_path), 2)
+    assert [{table_pattern: len(files) for table_pattern, files in chunk.items()} for chunk in chunks] == [
+        dict(zip(RAW_TABLE_VIEWS, [1, 2, 1])),
+        dict(zip(RAW_TABLE_VIEWS, [0, 2, 0])),
+        dict(zip(RAW_TABLE_VIEWS, [0, 1, 0])),
+    ]
+
+
+def test_chunked_transform_matches_full(tmp_path, local_dynamodb):
+    raw_dir = str(tmp_path / "raw")
+    # A batch is written at the end of the first page (1 MB, ~140 tasks) past `batch_size`
+    dump_tables_data(list(local_dynamodb(tasks=300).item_counts), batch_size=40, output_dir=raw_dir, raw_format="ndjson")
+    assert len(raw_file_chunks(raw_dir, 2)) > 1
+    full = transform(tmp_path, "full", raw_data_dir=raw_dir)
+    assert all(rows for rows, _ in full.values())
+
+    chunked = transform(
+        tmp_path, "chunked", raw_data_dir=raw_dir, chunk_files=2, memory_limit="256MB", temp_dir=str(tmp_path / "spill"),
+    )
+    assert chunked == full
+    with duckdb.connect(str(tmp_path / "chunked.duckdb"), read_only=True) as conn:
+        # The raw table only ever held the last chunk
+        assert conn.execute("SELECT count(*) FROM tasks_raw").fetchone()[0] < 300
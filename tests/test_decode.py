@@ -0,0 +1,63 @@
+from decimal import Decimal
+
+import pytest
+
+from dynamo_utils import decode_attribute, decode_item, deserialize_item
+
+
+ITEM = {
+    "id": {"S": "b0c5a9a4-1f7e-4b8e-9a51-6d3c1a2b3c4d"},
+    "_version": {"N": "3"},
+    "_lastChangedAt": {"N": "1700000000123"},
+    "_deleted": {"NULL": True},
+    "isComplete": {"BOOL": False},
+    "rating": {"N": "4.5"},
+    "tags": {"SS": ["a", "b"]},
+    "scores": {"NS": ["1", "2.5"]},
+    "blob": {"B": b"\x00\x01"},
+    "blobs": {"BS": [b"\x00", b"\x01"]},
+    "questions": {"L": [
+        {"M": {"question": {"S": "Stocked?"}, "answers": {"L": [{"S": "yes"}, {"NULL": True}]}}},
+    ]},
+    "store": {"M": {}},
+}
+
+
+def test_decode_item_plain_json_types():
+    assert decode_item(ITEM) == {
+        "id": "b0c5a9a4-1f7e-4b8e-9a51-6d3c1a2b3c4d",
+        "_version": 3.0,
+        "_lastChangedAt": 1700000000123.0,
+        "_deleted": None,
+        "isComplete": False,
+        "rating": 4.5,
+        "tags": ["a", "b"],
+        "scores": [1.0, 2.5],
+        "blob": "AAE=",
+        "blobs": ["AA==", "AQ=="],
+        "questions": [{"question": "Stocked?", "answers": ["yes", None]}],
+        "store": {},
+    }
+
+
+def test_decode_item_matches_boto3_deserializer():
+    # Same values, only the number and set types differ
+    def plain(value):
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, set):
+            return sorted(plain(element) for element in value)
+        if isinstance(value, list):
+            return [plain(element) for element in value]
+        if isinstance(value, dict):
+            return {key: plain(element) for key, element in value.items()}
+        return value
+
+    expected = plain({key: value for key, value in deserialize_item(ITEM).items() if key not in ("blob", "blobs")})
+    decoded = {key: value for key, value in decode_item(ITEM).items() if key not in ("blob", "blobs")}
+    assert decoded == expected
+
+
+def test_decode_attribute_unknown_type():
+    with pytest.raises(ValueError, match="Unknown DynamoDB attribute type"):
+        decode_attribute({"X": "?"})
@@ -0,0 +1,53 @@
+import duckdb
+import pytest
+from typer.testing import CliRunner
+
+import main
+from dynamo_utils import POSTGRES_PRIMARY_KEYS, dump_tables_data, extract_to_duckdb, run_sql_transforms
+
+
+def table_hashes(duckdb_path):
+    with duckdb.connect(duckdb_path, read_only=True) as conn:
+        return {
+            table_name: conn.execute(
+                f"SELECT count(*), bit_xor(row_hash)::VARCHAR FROM sync.{table_name}_pending"
+            ).fetchone()
+            for table_name in POSTGRES_PRIMARY_KEYS
+        }
+
+
+def transform(tmp_path, name, **options):
+    duckdb_path = str(tmp_path / f"{name}.duckdb")
+    run_sql_transforms(duckdb_path=duckdb_path, output_dir=None, changes_dir=None, profile_dir=None, **options)
+    return table_hashes(duckdb_path)
+
+
+def test_in_memory_matches_file_ingest(tmp_path, local_dynamodb):
+    pytest.importorskip("pyarrow")
+    table_names = list(local_dynamodb().item_counts)
+    dump_tables_data(table_names, output_dir=str(tmp_path / "raw"), raw_format="ndjson")
+    from_files = transform(tmp_path, "files", raw_data_dir=str(tmp_path / "raw"))
+    assert all(rows for rows, _ in from_files.values())
+
+    in_memory = transform(tmp_path, "memory", load_raw=lambda conn, profiler: extract_to_duckdb(
+        conn, table_names, profiler=profiler, raw_format="ndjson",
+    ))
+    assert in_memory == from_files
+
+    # The archived batches are the same raw files
+    archived = transform(tmp_path, "archived", load_raw=lambda conn, profiler: extract_to_duckdb(
+        conn, table_names, str(tmp_path / "archive"), archive=True, raw_format="ndjson", profiler=profiler,
+    ))
+    assert archived == from_files
+    assert transform(tmp_path, "from_archive", raw_data_dir=str(tmp_path / "archive")) == from_files
+
+
+@pytest.mark.parametrize("args", [
+    ["--in-memory", "--recent-days", "7"],
+    ["--in-memory", "--chunk-files", "10"],
+    ["--archive-raw"],
+])
+def test_etl_rejects_flags_in_memory_ignores(args):
+    result = CliRunner().invoke(main.app, ["etl", *args])
+    assert result.exit_code == 2
+    assert "Invalid value" in result.output
@@ -0,0 +1,75 @@
+import json
+import time
+
+import duckdb
+from typer.testing import CliRunner
+
+import dynamo_utils
+import main
+from conftest import TASKS_TABLE
+
+
+def run(*args):
+    result = CliRunner().invoke(main.app, list(args))
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def watermarks(data_dir):
+    with open(data_dir / "watermarks.json") as f:
+        return json.load(f)
+
+
+def full_etl(local_dynamodb):
+    stand_in = local_dynamodb()
+    run("extract", "--raw-format", "ndjson")
+    run("transform")
+    return stand_in
+
+
+def test_incremental_round_trip(data_dir, local_dynamodb):
+    stand_in = full_etl(local_dynamodb)
+
+    # No watermark yet, so the first incremental run takes everything
+    started = time.time() * 1000
+    run("extract", "--incremental", "--raw-format", "ndjson")
+    run("transform", "--incremental")
+    assert set(watermarks(data_dir)) == set(main.dynamo_tables)
+    for watermark in watermarks(data_dir).values():
+        assert started - dynamo_utils.WATERMARK_OVERLAP - 1000 < watermark <= time.time() * 1000 - dynamo_utils.WATERMARK_OVERLAP
+
+    stand_in.update(TASKS_TABLE, 3, {"task_status": {"S": "completed"}})
+    run("extract", "--incremental", "--raw-format", "ndjson")
+    with duckdb.connect() as conn:
+        delta = conn.execute(
+            f"SELECT CAST(id AS VARCHAR), task_status FROM read_json_auto('{data_dir}/delta/{TASKS_TABLE}_batch_*.ndjson')"
+        ).fetchall()
+    assert delta == [(stand_in.item(TASKS_TABLE, 3)["id"]["S"], "completed")]
+    run("transform", "--incremental")
+    with duckdb.connect(main.DUCKDB_PATH, read_only=True) as conn:
+        assert conn.execute("SELECT count(*) FROM tasks").fetchone()[0] == stand_in.item_counts[TASKS_TABLE]
+        assert conn.execute("SELECT CAST(id AS VARCHAR) FROM tasks WHERE task_status = 'completed'").fetchall() == [
+            (stand_in.item(TASKS_TABLE, 3)["id"]["S"],),
+        ]
+
+
+def test_failed_transform_keeps_the_watermarks(data_dir, local_dynamodb, monkeypatch):
+    stand_in = full_etl(local_dynamodb)
+    run("extract", "--incremental", "--raw-format", "ndjson")
+    run("transform", "--incremental")
+    committed = watermarks(data_dir)
+
+    stand_in.update(TASKS_TABLE, 3, {"task_status": {"S": "completed"}})
+    run("extract", "--incremental", "--raw-format", "ndjson")
+    with monkeypatch.context() as broken:
+        broken.setattr(dynamo_utils, "changed_parent_deletes", lambda view_name: ["DELETE FROM missing_table"])
+        result = CliRunner().invoke(main.app, ["transform", "--incremental"])
+    assert result.exit_code != 0
+    assert "transform statements failed or were skipped" in str(result.exception)
+    assert watermarks(data_dir) == committed
+
+    # The same delta goes through once the transform works again
+    run("transform", "--incremental")
+    assert watermarks(data_dir) != committed
+    with duckdb.connect(main.DUCKDB_PATH, read_only=True) as conn:
+        assert conn.execute("SELECT count(*) FROM tasks WHERE task_status = 'completed'").fetchone()[0] == 1
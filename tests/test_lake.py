@@ -0,0 +1,57 @@
+import json
+
+import duckdb
+
+from dynamo_utils import export_lake
+
+
+def partitions(lake_dir, table_name):
+    manifest = json.loads((lake_dir / "manifest.json").read_text())
+    return manifest["tables"][table_name]["partitions"]
+
+
+def lake_rows(conn, lake_dir):
+    return conn.execute(f"""
+        SELECT id, status, month FROM read_parquet('{lake_dir}/tasks/*/*.parquet', hive_partitioning = true)
+        ORDER BY id
+    """).fetchall()
+
+
+def test_export_lake_rewrites_only_changed_partitions(tmp_path):
+    lake_dir = tmp_path / "lake"
+    conn = duckdb.connect()
+    conn.execute("""
+        CREATE TABLE tasks AS SELECT * FROM (VALUES
+            ('t1', DATE '2025-01-05', 'open'),
+            ('t2', DATE '2025-01-20', 'open'),
+            ('t3', DATE '2025-02-03', 'open'),
+            ('t4', DATE '2025-03-10', 'open')
+        ) AS t(id, taskDate, status)
+    """)
+    conn.execute("CREATE TABLE stores AS SELECT 's1' AS id")
+
+    export_lake(conn, str(lake_dir))
+    first = partitions(lake_dir, "tasks")
+    assert sorted(first) == ["2025-01", "2025-02", "2025-03"]
+    assert [row[0] for row in lake_rows(conn, lake_dir)] == ["t1", "t2", "t3", "t4"]
+    assert (lake_dir / "stores" / "data_0.parquet").exists()
+
+    # An update, a move into a new month and the only row of a month deleted
+    conn.execute("UPDATE tasks SET status = 'done' WHERE id = 't1'")
+    conn.execute("UPDATE tasks SET taskDate = DATE '2025-04-01' WHERE id = 't3'")
+    conn.execute("DELETE FROM tasks WHERE id = 't4'")
+    export_lake(conn, str(lake_dir))
+
+    second = partitions(lake_dir, "tasks")
+    assert sorted(second) == ["2025-01", "2025-04"]
+    assert second["2025-01"]["written_at"] > first["2025-01"]["written_at"]
+    assert not (lake_dir / "tasks" / "month=2025-02").exists()
+    assert not (lake_dir / "tasks" / "month=2025-03").exists()
+    assert lake_rows(conn, lake_dir) == [("t1", "done", "2025-01"), ("t2", "open", "2025-01"), ("t3", "open", "2025-04")]
+
+    # Nothing changed, nothing is written, and a table that's gone is pruned
+    conn.execute("DROP TABLE stores")
+    export_lake(conn, str(lake_dir))
+    assert partitions(lake_dir, "tasks") == second
+    assert not (lake_dir / "stores").exists()
+    assert not (lake_dir / ".staging").exists()
@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from conftest import TASKS_TABLE
+from dynamo_utils import (
+    new_raw_run, prune_raw_runs, publish_raw_run, raw_batch_files, raw_runs, unpublished_raw_run,
+)
+
+
+def write_batch(directory, batch_num=0):
+    path = os.path.join(directory, f"{TASKS_TABLE}_batch_{batch_num:04d}.ndjson")
+    with open(path, "w") as f:
+        f.write('{"id": "t1"}\n')
+    return path
+
+
+def test_publish_raw_run(tmp_path):
+    raw_dir = str(tmp_path)
+    stray = write_batch(raw_dir)
+    # Until a run is published the directory is globbed
+    assert raw_batch_files(raw_dir, TASKS_TABLE) == [stray]
+
+    run_dir = new_raw_run(raw_dir)
+    batch = write_batch(run_dir)
+    # A run still being written isn't read
+    assert raw_batch_files(raw_dir, TASKS_TABLE) == [stray]
+    assert unpublished_raw_run(raw_dir) == run_dir
+
+    manifest = publish_raw_run(raw_dir, run_dir, {TASKS_TABLE: 1})
+    assert manifest["tables"][TASKS_TABLE] == {"files": [os.path.relpath(batch, raw_dir)], "items": 1}
+    assert raw_batch_files(raw_dir, TASKS_TABLE) == [batch]
+    with pytest.raises(FileNotFoundError):
+        unpublished_raw_run(raw_dir)
+
+
+def test_prune_raw_runs(tmp_path):
+    raw_dir = str(tmp_path)
+    assert prune_raw_runs(raw_dir, keep=2) == []
+
+    first = new_raw_run(raw_dir)
+    publish_raw_run(raw_dir, first)
+    abandoned = new_raw_run(raw_dir)
+    second = new_raw_run(raw_dir)
+    publish_raw_run(raw_dir, second)
+    third = new_raw_run(raw_dir)
+    publish_raw_run(raw_dir, third)
+    running = new_raw_run(raw_dir)
+
+    # The oldest published run and the unfinished one before the latest publish go,
+    # the run still being written after it stays
+    pruned = prune_raw_runs(raw_dir, keep=2)
+    assert pruned == [os.path.basename(first), os.path.basename(abandoned)]
+    assert raw_runs(raw_dir) == [os.path.basename(run) for run in (second, third, running)]
+    assert unpublished_raw_run(raw_dir) == running
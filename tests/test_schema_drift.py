@@ -0,0 +1,82 @@
+import json
+
+import duckdb
+
+from dynamo_utils import check_schema_drift, report_schema_drift, schema_drift
+
+
+DECLARED = """
+    CREATE TABLE declared (
+        id UUID,
+        name VARCHAR,
+        _version BIGINT,
+        _lastChangedAt DOUBLE,
+        store STRUCT(store_id VARCHAR, visits BIGINT),
+        questions STRUCT(question VARCHAR, score DOUBLE)[]
+    )
+"""
+
+
+def declared_types(conn):
+    conn.execute(DECLARED)
+    relation = conn.table("declared")
+    return dict(zip(relation.columns, relation.types))
+
+
+def write_ndjson(path, items):
+    with open(path, "w") as f:
+        for item in items:
+            f.write(json.dumps(item) + "\n")
+
+
+def test_schema_drift_fits(tmp_path):
+    conn = duckdb.connect()
+    write_ndjson(tmp_path / "batch.ndjson", [{
+        "id": "b0c5a9a4-1f7e-4b8e-9a51-6d3c1a2b3c4d",
+        "name": 12,  # any scalar fits VARCHAR
+        "_version": 3,
+        "_lastChangedAt": 1700000000123,  # BIGINT casts implicitly to DOUBLE
+        "store": {},  # only empty objects, inferred as a MAP
+        "questions": [{"question": "Stocked?", "score": None}],
+    }])
+    assert check_schema_drift(conn, [str(tmp_path / "batch.ndjson")], declared_types(conn)) == []
+
+
+def test_schema_drift_new_and_changed(tmp_path):
+    conn = duckdb.connect()
+    write_ndjson(tmp_path / "batch.ndjson", [{
+        "id": "b0c5a9a4-1f7e-4b8e-9a51-6d3c1a2b3c4d",
+        "name": {"first": "Al"},
+        "_version": 3.5,
+        "store": {"store_id": "s1", "visits": 2, "region": "NSW"},
+        "questions": [{"question": "Stocked?", "score": "high"}],
+        "photos": ["a.jpg"],
+    }])
+    assert sorted(check_schema_drift(conn, [str(tmp_path / "batch.ndjson")], declared_types(conn))) == [
+        "changed _version BIGINT -> DOUBLE",
+        "changed name VARCHAR -> STRUCT(\"first\" VARCHAR)",
+        "changed questions.[].score DOUBLE -> VARCHAR",
+        "new photos VARCHAR[]",
+        "new store.region VARCHAR",
+    ]
+
+
+def test_schema_drift_nulls_are_not_drift():
+    conn = duckdb.connect()
+    relation = conn.sql("SELECT NULL AS _version, NULL::JSON AS store")
+    assert schema_drift(conn, declared_types(conn), dict(zip(relation.columns, relation.types))) == []
+
+
+def test_report_schema_drift(tmp_path):
+    schema_path = tmp_path / "raw.sql"
+    schema_path.write_text("CREATE TABLE stores_raw (id UUID, name VARCHAR);")
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    write_ndjson(raw_dir / "GforceStore-notow4pikzczbpjg42gytvbuci-production_batch_0000.ndjson", [
+        {"id": "b0c5a9a4-1f7e-4b8e-9a51-6d3c1a2b3c4d", "name": "IGA", "state": "NSW"},
+    ])
+    write_ndjson(raw_dir / "GforceTasks-notow4pikzczbpjg42gytvbuci-production_batch_0000.ndjson", [{"id": "t1"}])
+    assert report_schema_drift(str(raw_dir), str(schema_path)) == {
+        "stores_raw": ["new state VARCHAR"],
+        "tasks_raw": [f"not declared in {schema_path}"],
+    }
@@ -0,0 +1,48 @@
+import duckdb
+import pytest
+
+from dynamo_utils import swap_shadow_tables_sql
+
+
+def swap(conn, tables):
+    # postgres_execute runs the string as one transaction
+    conn.execute("BEGIN")
+    try:
+        conn.execute(swap_shadow_tables_sql(tables, []))
+    except duckdb.Error:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def test_swap_shadow_tables():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE tasks AS SELECT 'old' AS version")
+    conn.execute("CREATE TABLE tasks__shadow AS SELECT 'new' AS version")
+    # A table loaded for the first time has nothing to swap out
+    conn.execute("CREATE TABLE stores__shadow AS SELECT 'new' AS version")
+
+    swap(conn, ["tasks", "stores"])
+    assert conn.execute("SHOW TABLES").fetchall() == [("stores",), ("tasks",)]
+    assert conn.execute("SELECT version FROM tasks UNION ALL SELECT version FROM stores").fetchall() == [("new",), ("new",)]
+
+
+def test_failed_swap_leaves_the_live_tables():
+    conn = duckdb.connect()
+    conn.execute("CREATE TABLE tasks AS SELECT 'old' AS version")
+    conn.execute("CREATE TABLE tasks__shadow AS SELECT 'new' AS version")
+    conn.execute("CREATE TABLE stores AS SELECT 'old' AS version")
+
+    # stores has no shadow, so none of the tables are swapped
+    with pytest.raises(duckdb.CatalogException):
+        swap(conn, ["tasks", "stores"])
+    assert conn.execute("SHOW TABLES").fetchall() == [("stores",), ("tasks",), ("tasks__shadow",)]
+    assert conn.execute("SELECT version FROM tasks").fetchall() == [("old",)]
+
+
+def test_swap_renames_the_shadow_indexes():
+    sql = swap_shadow_tables_sql(["tasks"], ["tasks__shadow_pkey", "idx_tasks_date__shadow"])
+    assert sql.split(";\n")[-2:] == [
+        "ALTER INDEX tasks__shadow_pkey RENAME TO tasks_pkey",
+        "ALTER INDEX idx_tasks_date__shadow RENAME TO idx_tasks_date",
+    ]
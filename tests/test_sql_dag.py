@@ -0,0 +1,71 @@
+import duckdb
+import pytest
+
+from dynamo_utils import execute_sql_models, run_sql_dag, sql_statement
+
+
+def test_sql_statement_tables():
+    statement = sql_statement("""
+        -- reads from old_tasks in a comment only
+        CREATE OR REPLACE TABLE tasks AS
+        SELECT t.id, s.name FROM tasks_raw AS t LEFT JOIN main.stores AS s ON s.id = t.store_id
+    """, "normalize_tasks.sql #1")
+    assert statement["writes"] == {"tasks"}
+    assert statement["reads"] == {"tasks_raw", "main.stores"}
+
+
+def test_sql_statement_writes():
+    for sql, table in [
+        ("INSERT INTO task_photos SELECT * FROM photos", "task_photos"),
+        ("INSERT OR REPLACE INTO Tasks SELECT 1", "tasks"),
+        ("CREATE TEMP TABLE IF NOT EXISTS scratch (id INT)", "scratch"),
+        ("DELETE FROM tasks WHERE id IN (SELECT id FROM removed)", "tasks"),
+        ("UPDATE stores SET name = NULL", "stores"),
+        ("DROP TABLE IF EXISTS stores_old", "stores_old"),
+        ("ALTER TABLE stores ADD COLUMN x INT", "stores"),
+    ]:
+        assert sql_statement(sql, "")["writes"] == {table}, sql
+
+
+def statements(*sqls):
+    return [sql_statement(sql, f"#{number}") for number, sql in enumerate(sqls, start=1)]
+
+
+def test_run_sql_dag_dependencies():
+    conn = duckdb.connect()
+    done = run_sql_dag(conn, statements(
+        "CREATE TABLE a AS SELECT 1 AS x",
+        "CREATE TABLE b AS SELECT 2 AS x",
+        "CREATE TABLE c AS SELECT * FROM a JOIN b USING (x)",
+        "INSERT INTO a VALUES (3)",
+        "CREATE TABLE d AS SELECT count(*) AS n FROM a",
+    ))
+    assert [statement["depends_on"] for statement in done] == [set(), set(), {0, 1}, {0, 2}, {0, 3}]
+    assert [statement["status"] for statement in done] == ["done"] * 5
+    # The insert waited for c to read a, and d for the insert
+    assert conn.execute("SELECT count(*) FROM c").fetchone()[0] == 0
+    assert conn.execute("SELECT n FROM d").fetchone()[0] == 2
+
+
+def test_run_sql_dag_skips_dependents_of_a_failure():
+    conn = duckdb.connect()
+    done = run_sql_dag(conn, statements(
+        "CREATE TABLE a AS SELECT * FROM missing",
+        "CREATE TABLE b AS SELECT * FROM a",
+        "CREATE TABLE c AS SELECT 1 AS x",
+    ))
+    assert [statement["status"] for statement in done] == ["failed", "skipped", "done"]
+
+
+def test_execute_sql_models_raises_on_a_failed_statement(tmp_path):
+    models_dir, transform_dir = tmp_path / "models", tmp_path / "transform"
+    models_dir.mkdir()
+    transform_dir.mkdir()
+    (models_dir / "stores.sql").write_text("CREATE TABLE stores AS SELECT * FROM stores_raw;")
+    (models_dir / "tasks.sql").write_text("CREATE TABLE tasks AS SELECT 1 AS id;")
+    (transform_dir / "normalize_stores.sql").write_text("CREATE TABLE store_contacts AS SELECT * FROM stores;")
+    conn = duckdb.connect()
+    with pytest.raises(RuntimeError, match="2 transform statements failed or were skipped: stores.sql #1, normalize_stores.sql #1"):
+        execute_sql_models(conn, str(models_dir), str(transform_dir))
+    # Everything that didn't depend on the failure still ran
+    assert conn.execute("SELECT id FROM tasks").fetchall() == [(1,)]
@@ -0,0 +1,63 @@
+import json
+import os
+
+from typer.testing import CliRunner
+
+import dynamo_utils
+import main
+from dynamo_utils import (
+    forget_stage_fingerprint, save_stage_fingerprint, sql_file_statements, stage_unchanged, transform_fingerprint,
+)
+
+
+def test_stage_fingerprints(tmp_path):
+    cache_path = str(tmp_path / "stage_cache.json")
+    assert not stage_unchanged(cache_path, "transform", "abc")
+    save_stage_fingerprint(cache_path, "transform", "abc")
+    save_stage_fingerprint(cache_path, "load", "def")
+    assert stage_unchanged(cache_path, "transform", "abc")
+    assert not stage_unchanged(cache_path, "transform", "def")
+    assert not stage_unchanged(cache_path, "transform", None)
+
+    forget_stage_fingerprint(cache_path, "transform")
+    assert not stage_unchanged(cache_path, "transform", "abc")
+    assert stage_unchanged(cache_path, "load", "def")
+    # Nothing to resume from, so nothing is recorded
+    save_stage_fingerprint(cache_path, "transform", None)
+    with open(cache_path) as f:
+        assert list(json.load(f)) == ["load"]
+
+
+def test_transform_fingerprint(tmp_path):
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    batch = raw_dir / "GforceTasks-notow4pikzczbpjg42gytvbuci-production_batch_0000.ndjson"
+    batch.write_text('{"id": "t1"}\n')
+    first = transform_fingerprint(str(raw_dir), incremental=False)
+    assert transform_fingerprint(str(raw_dir), incremental=False) == first
+    assert transform_fingerprint(str(raw_dir), incremental=True) != first
+
+    batch.write_text('{"id": "t1"}\n{"id": "t2"}\n')
+    assert transform_fingerprint(str(raw_dir), incremental=False) != first
+
+
+def test_failed_transform_is_not_skipped(data_dir, local_dynamodb, monkeypatch):
+    local_dynamodb()
+    runner = CliRunner()
+    assert runner.invoke(main.app, ["extract", "--raw-format", "ndjson"]).exit_code == 0
+    assert runner.invoke(main.app, ["transform"]).exit_code == 0
+    assert "Skipped transform" in runner.invoke(main.app, ["transform"]).output
+
+    with monkeypatch.context() as broken:
+        broken.setattr(dynamo_utils, "sql_file_statements", lambda conn, sql_path: sql_file_statements(conn, sql_path) + [
+            dynamo_utils.sql_statement("INSERT INTO stores SELECT * FROM missing_table", "broken #1"),
+        ])
+        assert runner.invoke(main.app, ["transform", "--force"]).exit_code != 0
+    assert not stage_unchanged(main.STAGE_CACHE_PATH, "transform", transform_fingerprint(
+        main.RAW_DATA_DIR, incremental=False, export="files",
+    ))
+
+    result = runner.invoke(main.app, ["transform"])
+    assert result.exit_code == 0
+    assert "Skipped transform" not in result.output
+    assert os.path.exists(main.DUCKDB_PATH)
@@ -0,0 +1,64 @@
+import pytest
+
+import dynamo_utils
+import main
+from conftest import TASKS_TABLE
+
+
+class StopStream(Exception):
+    pass
+
+
+class FakeConsumer:
+    """Stands in for `StreamConsumer`, returning `batches` and then stopping the loop."""
+
+    def __init__(self, batches, checkpointed=False):
+        self.batches = list(batches)
+        self.checkpoint = type("Checkpoint", (), {"tables": {"table": {}} if checkpointed else {}})()
+        self.events = []
+
+    def poll(self, **kwargs):
+        if not self.batches:
+            raise StopStream
+        batch = self.batches.pop(0)
+        self.events.append(("poll", batch))
+        return batch
+
+    def commit(self):
+        self.events.append(("commit",))
+
+
+def test_stream_retries_a_failed_reconcile(data_dir, monkeypatch):
+    consumer = FakeConsumer([[], ["r1"], []])
+    monkeypatch.setattr(main, "StreamConsumer", lambda *args: consumer)
+    monkeypatch.setattr(main, "STAGE_BACKOFF_BASE", 0)
+    monkeypatch.setattr(main, "apply_stream_records", lambda records, *args, **kwargs: consumer.events.append(("apply", records)))
+
+    def etl(load_mode):
+        consumer.events.append(("etl",))
+        if consumer.events.count(("etl",)) == 1:
+            raise RuntimeError("scan failed")
+    monkeypatch.setattr(main, "etl", etl)
+
+    with pytest.raises(StopStream):
+        main.stream()
+    # The stream carried on after the failed reconcile, which was tried again and not after it succeeded
+    assert consumer.events == [
+        ("etl",), ("poll", []), ("commit",),
+        ("etl",), ("poll", ["r1"]), ("apply", ["r1"]), ("commit",),
+        ("poll", []), ("commit",),
+    ]
+
+
+def test_stream_needs_old_images(local_dynamodb, monkeypatch):
+    stand_in = local_dynamodb()
+    describe_table = stand_in.describe_table
+
+    def new_image_only(TableName):
+        table = describe_table(TableName)
+        table["Table"]["StreamSpecification"]["StreamViewType"] = "NEW_IMAGE"
+        return table
+    monkeypatch.setattr(stand_in, "describe_table", new_image_only)
+
+    with pytest.raises(RuntimeError, match="NEW_AND_OLD_IMAGES"):
+        dynamo_utils.StreamConsumer([TASKS_TABLE], "unused.json", client=object())
@@ -0,0 +1,27 @@
+from dynamo_utils import upsert_table_sql
+
+
+def statements(sql):
+    return [" ".join(statement.split()) for statement in sql.split(";") if statement.strip()]
+
+
+def test_upsert_table_sql():
+    sql = upsert_table_sql("task_questions", ["task_uuid", "question_id"], ["task_uuid", "question_id", "answer"])
+    insert, delete, drop = statements(sql)
+    # Only the non key columns are updated, and only rows that actually changed
+    assert insert == (
+        'INSERT INTO task_questions SELECT * FROM task_questions__stage '
+        'ON CONFLICT ("task_uuid", "question_id") DO UPDATE SET "answer" = EXCLUDED."answer" '
+        'WHERE (task_questions.*)::text IS DISTINCT FROM (EXCLUDED.*)::text'
+    )
+    assert delete == (
+        'DELETE FROM task_questions AS target USING task_questions__deleted AS deleted '
+        'WHERE deleted."task_uuid" = target."task_uuid" AND deleted."question_id" = target."question_id"'
+    )
+    assert drop == "DROP TABLE task_questions__stage, task_questions__deleted"
+
+
+def test_upsert_table_sql_with_only_key_columns():
+    # There is nothing to update, a staged row that's already there is left alone
+    insert, _, _ = statements(upsert_table_sql("task_photos", ["task_uuid", "photo_name"], ["task_uuid", "photo_name"]))
+    assert insert.endswith('ON CONFLICT ("task_uuid", "photo_name") DO NOTHING')
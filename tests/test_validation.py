@@ -0,0 +1,90 @@
+import json
+from datetime import date
+
+import duckdb
+import pytest
+
+from conftest import TASKS_TABLE
+from dynamo_utils import dump_tables_data, extract_to_duckdb, load_json_data
+
+
+SCHEMA = """
+    CREATE TABLE task_raw (
+        id UUID,
+        _lastChangedAt DOUBLE,
+        _version DOUBLE,
+        taskDateISO8601 DATE,
+        updatedAt VARCHAR,
+        notes VARCHAR
+    );
+"""
+
+ROWS = [
+    '{"id": "00000000-0000-0000-0000-000000000001", "_lastChangedAt": 1, "_version": 1, "taskDateISO8601": "2025-01-01", "updatedAt": "2025-01-01T00:00:00Z"}',
+    '{"id": "00000000-0000-0000-0000-000000000002", "_lastChangedAt": 1, "_version": "abc"}',
+    '{"id": "00000000-0000-0000-0000-000000000003", "_lastChangedAt": 1, "taskDateISO8601": "not a date"}',
+    '{"id": "00000000-0000-0000-0000-000000000004", "_lastChangedAt": 1, "updatedAt": "yesterday"}',
+    '{"id": "00000000-0000-0000-0000-000000000005", "notes": "no watermark"}',
+    '{"_lastChangedAt": 1, "notes": "no key"}',
+    'this is not json',
+]
+
+
+def test_validate_raw_rows(tmp_path):
+    schema_path = tmp_path / "raw.sql"
+    schema_path.write_text(SCHEMA)
+    raw_dir = tmp_path / "raw"
+    raw_dir.mkdir()
+    (raw_dir / f"{TASKS_TABLE}_batch_0000.ndjson").write_text("\n".join(ROWS) + "\n")
+
+    conn = duckdb.connect()
+    load_json_data(conn, str(raw_dir), schema_path=str(schema_path), drift_check=False)
+
+    assert conn.execute("SELECT id[-1:], reason, dropped FROM tasks_rejects ORDER BY ALL").fetchall() == [
+        ("2", "_version is not a DOUBLE", False),
+        ("3", "taskDateISO8601 is not a DATE", False),
+        ("4", "updatedAt is not a TIMESTAMP", False),
+        ("5", "missing _lastChangedAt", False),
+        (None, "missing id", True),
+        (None, "not a JSON object", True),
+    ]
+    assert json.loads(conn.execute("SELECT item FROM tasks_rejects WHERE reason = 'missing id'").fetchone()[0])["notes"] == "no key"
+    # Only the keyless rows are gone, the rest are kept with their bad values NULL
+    assert conn.execute("SELECT CAST(id AS VARCHAR)[-1:], _version, taskDateISO8601, updatedAt FROM tasks_raw ORDER BY id").fetchall() == [
+        ("1", 1.0, date(2025, 1, 1), "2025-01-01T00:00:00Z"),
+        ("2", None, None, None),
+        ("3", None, None, None),
+        ("4", None, None, None),
+        ("5", None, None, None),
+    ]
+
+
+def test_in_memory_rejects_match_file_ingest(tmp_path, local_dynamodb):
+    pytest.importorskip("pyarrow")
+    stand_in = local_dynamodb()
+    templates = stand_in.templates[TASKS_TABLE]
+    templates[0]["_version"] = {"S": "abc"}
+    templates[1]["taskDateISO8601"] = {"S": "not a date"}
+    templates[2]["updatedAt"] = {"S": "yesterday"}
+    del templates[3]["id"]
+    del templates[4]["_lastChangedAt"]
+
+    def rejects(conn):
+        return conn.execute("SELECT id, reason, dropped FROM tasks_rejects ORDER BY ALL").fetchall()
+
+    files_conn = duckdb.connect()
+    dump_tables_data(list(stand_in.item_counts), output_dir=str(tmp_path), raw_format="ndjson")
+    load_json_data(files_conn, str(tmp_path), drift_check=False)
+    memory_conn = duckdb.connect()
+    extract_to_duckdb(memory_conn, list(stand_in.item_counts), raw_format="ndjson")
+
+    assert rejects(memory_conn) == rejects(files_conn)
+    assert sorted(reason for _, reason, _ in rejects(files_conn)) == [
+        "_version is not a DOUBLE",
+        "missing _lastChangedAt",
+        "missing id",
+        "taskDateISO8601 is not a DATE",
+        "updatedAt is not a TIMESTAMP",
+    ]
+    for conn in (files_conn, memory_conn):
+        assert conn.execute("SELECT count(*) FROM tasks_raw").fetchone()[0] == 199
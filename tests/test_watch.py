@@ -0,0 +1,92 @@
+import pytest
+
+import dynamo_utils
+import main
+from dynamo_utils import run_lock, run_with_retries
+
+
+class StopWatch(Exception):
+    pass
+
+
+def flaky(failures, result="ok"):
+    """A stage that fails `failures` times before returning `result`, recording each call."""
+    calls = []
+
+    def stage():
+        calls.append(stage)
+        if len(calls) <= failures:
+            raise RuntimeError(f"attempt {len(calls)} failed")
+        return result
+    stage.calls = calls
+    return stage
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    slept = []
+    monkeypatch.setattr(dynamo_utils.time, "sleep", slept.append)
+    return slept
+
+
+def test_run_lock(tmp_path):
+    lock_path = str(tmp_path / "data" / "etl.lock")
+    with run_lock(lock_path) as locked:
+        assert locked
+        with run_lock(lock_path) as other:
+            assert not other
+    with run_lock(lock_path) as locked:
+        assert locked
+
+
+def test_run_with_retries(delays):
+    stage = flaky(2)
+    assert run_with_retries("extract", stage, retries=3, backoff_base=10, backoff_max=15) == ("ok", 3)
+    assert delays == [10, 15]
+
+    stage = flaky(3)
+    with pytest.raises(RuntimeError, match="attempt 3 failed"):
+        run_with_retries("extract", stage, retries=3)
+    assert len(stage.calls) == 3
+
+
+def test_run_with_retries_resumes_with_retry_stage(delays):
+    stage, resume = flaky(1), flaky(0, "resumed")
+    assert run_with_retries("extract", stage, retries=3, retry_stage=resume) == ("resumed", 2)
+    assert len(stage.calls) == len(resume.calls) == 1
+
+
+def test_watch_run(data_dir, delays):
+    load = flaky(0)
+    run = main.watch_run(
+        {"extract": flaky(1, {"table": 5}), "transform": flaky(0, {"tasks": {"insert": 2}}), "load": load},
+        retries=2, retry_stages={"extract": flaky(0, {"table": 7})},
+    )
+    assert run["status"] == "done"
+    assert run["changed_rows"] == 2
+    assert {name: stage["attempts"] for name, stage in run["stages"].items()} == {"extract": 2, "transform": 1, "load": 1}
+    assert run["stages"]["extract"]["rows"] == 7
+
+    # A stage out of retries fails the run, and the later stages don't run
+    load = flaky(0)
+    run = main.watch_run({"extract": flaky(0, {}), "transform": flaky(2), "load": load}, retries=2)
+    assert run["status"] == "failed"
+    assert run["stages"]["transform"] == {"seconds": pytest.approx(0, abs=1), "attempts": 2, "error": "attempt 2 failed"}
+    assert "load" not in run["stages"] and not load.calls
+
+
+def test_watch_skips_a_run_while_the_lock_is_held(data_dir, monkeypatch):
+    runs = []
+    monkeypatch.setattr(main, "watch_run", lambda *args: runs.append(args))
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) > 1:
+            raise StopWatch
+    monkeypatch.setattr(main, "sleep", sleep)
+
+    with run_lock(main.LOCK_PATH):
+        with pytest.raises(StopWatch):
+            main.watch()
+    assert runs == []